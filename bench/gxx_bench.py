@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""Start-up benchmark of gxx_qsub
+
+Generates synthetic configuration files (`gxxconfig.ini`, `hpcnodes.ini`)
+of arbitrary size and measures the start-up cost of `gxx_qsub.py`:
+
+- import time of the module (in a fresh interpreter)
+- parsing of the HPC nodes (`parse_ini`, `list_queues_nodes`)
+- parsing of the Gaussian installations and workings
+- generation of the help texts
+- full configuration with and without the compiled cache
+- peak memory while building the full configuration
+
+Results are appended to a JSON-lines file, together with the current git
+commit, so that runs on different commits can be compared.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+try:
+    import typing
+except ModuleNotFoundError:
+    print('ERROR: Python 3.5 or later needed.')
+    sys.exit()
+
+# ==============
+#   PARAMETERS
+# ==============
+
+ROOTDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIBDIR = os.path.join(ROOTDIR, 'hpctools')
+RESULTS = os.path.join(ROOTDIR, 'bench', 'results.jsonl')
+# Relative change above which a metric is flagged as a regression
+THRESHOLD = .10
+
+PROGNAME = os.path.basename(sys.argv[0])
+
+
+# =======================
+#   CONFIGURATION FILES
+# =======================
+def write_gxx_ini(fname: str,
+                  num_workings: int,
+                  num_versions: int,
+                  seed: int = 0) -> None:
+    """Writes a synthetic Gaussian configuration file.
+
+    The default version of gxx_qsub (g16.c01) is always present.
+
+    Parameters
+    ----------
+    fname : str
+        Output file.
+    num_workings : int
+        Number of working trees (as `tag.gxx.rev`).
+    num_versions : int
+        Number of Gaussian installations (as `gXX.rev`).
+    seed : int
+        Seed of the random generator.
+    """
+    rng = random.Random(seed)
+    versions = [('16', 'c01')]
+    majors = ('09', '16', '21')
+    index = 0
+    while len(versions) < num_versions:
+        major = majors[index % len(majors)]
+        rev = '{}{:02d}'.format(chr(ord('a') + (index//99) % 26),
+                                index % 99 + 1)
+        if (major, rev) not in versions:
+            versions.append((major, rev))
+        index += 1
+    # Each working must have a unique (tag, version) pair
+    num_tags = max(1, num_workings//4, -(-num_workings//len(versions)))
+    tags = ['t{:03d}'.format(i) for i in range(num_tags)]
+    lines = ['[DEFAULT]', 'RootPath = /share/gaussian',
+             'WorkPath = ' + ', '.join('{0}:/home/{0}/worktree'.format(tag)
+                                       for tag in tags),
+             'WorkInfo = ' + ', '.join('{0}:User {0}:{0}@example.com'.format(
+                 tag) for tag in tags),
+             'Machs = intel64-sandybridge, intel64-nehalem', '']
+    for major, rev in versions:
+        lines.extend([
+            '[g{}.{}]'.format(major, rev),
+            'Gaussian = Gaussian {}'.format(major),
+            'Revision = {}.{}'.format(rev[0].upper(), rev[1:]),
+            'Date = 20{}/01/01'.format(major),
+            'BaseDir = g{}.{}'.format(major, rev),
+            'Workings = {}'.format(', '.join(rng.sample(tags,
+                                                        min(3, len(tags))))),
+            'Shared = all',
+            ''])
+    for i in range(num_workings):
+        tag = tags[i % num_tags]
+        major, rev = versions[i//num_tags]
+        lines.extend([
+            '[{}.g{}.{}]'.format(tag, major, rev),
+            'Gaussian = Gaussian {}'.format(major),
+            'Revision = {}.{}'.format(rev[0].upper(), rev[1:]),
+            'Version = 1.{}'.format(i),
+            'Date = 2020/01/01',
+            'BaseDir = g{}.{}.w{}'.format(major, rev, i),
+            'Changelog = {fullpath}/doc/changelog.adoc:ADOC,.html:HTML',
+            'Docs = REFCARD717:{fullpath}/doc/qref_l717.pdf:PDF',
+            '    REFCARD718:{fullpath}/doc/qref_l718.pdf:PDF',
+            '    Guide:{fullpath}/doc/guide.txt:TXT,.htm:HTML',
+            ''])
+    with open(fname, 'w') as fobj:
+        fobj.write('\n'.join(lines))
+
+
+def write_hpc_ini(fname: str,
+                  num_families: int,
+                  seed: int = 0) -> None:
+    """Writes a synthetic HPC nodes configuration file.
+
+    Parameters
+    ----------
+    fname : str
+        Output file.
+    num_families : int
+        Number of node families (as `family.*`).
+    seed : int
+        Seed of the random generator.
+    """
+    rng = random.Random(seed)
+    archs = ('Westmere', 'SandyBridge', 'IvyBridge', 'Skylake', 'Nehalem')
+    qtypes = ('02', '07', '14', '28')
+    lines = ['[general]', 'QueueFormat = q{qtype:02d}{qname}',
+             'QueueType = ' + ', '.join(qtypes), '']
+    for i in range(num_families):
+        rules = ['+{:02d}'.format(rng.randint(29, 99)),
+                 '-' + rng.choice(qtypes)]
+        lines.extend([
+            '[family.f{:03d}]'.format(i),
+            'Name = Fam{:03d}'.format(i),
+            'NodeCount = {}'.format(rng.randint(1, 64)),
+            'QueueName = fam{:03d}'.format(i),
+            'QueueType = {}'.format(', '.join(rules)),
+            'QueueList = q100fam{:03d}'.format(i),
+            'CPUCount = {}'.format(rng.choice((1, 2, 4))),
+            'CoreCount = {}'.format(rng.choice((6, 8, 12, 16, 32))),
+            'CoreLogical = {}'.format(rng.choice(('True', 'False'))),
+            'RAM = {}GB'.format(rng.choice((24, 64, 128, 256))),
+            'Storage = {}GB'.format(rng.choice((100, 500, 2000))),
+            'CPUModel = Intel Xeon',
+            'CPUMaker = Intel',
+            'CPUArch = {}'.format(rng.choice(archs)),
+            'CPUSoftLimit = 16',
+            'MemSoftLimit = 20GB',
+            'PathTemp = /local/scratch/{username}',
+            ''])
+    with open(fname, 'w') as fobj:
+        fobj.write('\n'.join(lines))
+
+
+# ================
+#   MEASUREMENTS
+# ================
+def timeit(func: typing.Callable[[], typing.Any],
+           repeat: int) -> float:
+    """Returns the median execution time of a function (in s).
+
+    Parameters
+    ----------
+    func : function
+        Function to time (without argument).
+    repeat : int
+        Number of executions.
+
+    Returns
+    -------
+    float
+        Median time in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def time_import(homedir: str, repeat: int) -> float:
+    """Returns the median time to import gxx_qsub in a new interpreter.
+
+    Parameters
+    ----------
+    homedir : str
+        Directory used as HOME, containing the configuration files.
+    repeat : int
+        Number of executions.
+
+    Returns
+    -------
+    float
+        Median time in seconds.
+    """
+    code = 'import time; t = time.perf_counter(); import gxx_qsub; ' \
+        + 'print(time.perf_counter() - t)'
+    env = dict(os.environ, HOME=homedir,
+               PYTHONPATH=os.pathsep.join([LIBDIR, ROOTDIR]))
+    times = []
+    for _ in range(repeat):
+        res = subprocess.run([sys.executable, '-c', code], env=env,
+                             cwd=homedir, stdout=subprocess.PIPE, check=True)
+        times.append(float(res.stdout.decode().split()[-1]))
+    return statistics.median(times)
+
+
+def run_benchmark(homedir: str, repeat: int) -> typing.Dict[str, float]:
+    """Runs the benchmark on the configuration files in homedir.
+
+    Parameters
+    ----------
+    homedir : str
+        Directory used as HOME, containing the configuration files.
+    repeat : int
+        Number of executions of each measurement.
+
+    Returns
+    -------
+    dict
+        Measured quantities (times in s, memory in kiB).
+    """
+    os.environ['HOME'] = homedir
+    sys.path[:0] = [LIBDIR, ROOTDIR]
+    import gxx_qsub as gxx
+    hpc = gxx.hpc
+    hpc_file = os.path.join(homedir, 'hpcnodes.ini')
+    gxx_file = os.path.join(homedir, 'gxxconfig.ini')
+    cachedir = os.path.join(homedir, 'cache')
+
+    def build_context(help: bool) -> None:
+        ctx = gxx.ClusterContext(hpc_file, [gxx_file])
+        ctx.hpcqueues
+        ctx.workings
+        ctx.gxx_alias
+        if help:
+            ctx.help_queues
+            ctx.help_gxx
+
+    nodes = hpc.parse_ini(hpc_file)
+    gversions, workings = gxx.parse_gxx_ini([gxx_file], docs=True)
+    aliases = gxx.build_gxx_alias(gversions)
+    results = {
+        'num_queues': len(hpc.list_queues_nodes(nodes)),
+        'import_s': time_import(homedir, repeat),
+        'parse_ini_s': timeit(lambda: hpc.parse_ini(hpc_file), repeat),
+        'list_queues_s': timeit(lambda: hpc.list_queues_nodes(nodes),
+                                repeat),
+        'workings_s': timeit(lambda: gxx.parse_gxx_ini([gxx_file]), repeat),
+        'workings_docs_s': timeit(
+            lambda: gxx.parse_gxx_ini([gxx_file], docs=True), repeat),
+        'help_gxx_s': timeit(
+            lambda: gxx.build_help_gxx(gversions, aliases, workings), repeat),
+    }
+    gxx.CACHEDIR = None
+    results['context_nocache_s'] = timeit(lambda: build_context(False),
+                                          repeat)
+    results['context_help_nocache_s'] = timeit(lambda: build_context(True),
+                                               repeat)
+    gxx.CACHEDIR = cachedir
+    build_context(True)
+    results['context_cached_s'] = timeit(lambda: build_context(False),
+                                         repeat)
+    results['context_help_cached_s'] = timeit(lambda: build_context(True),
+                                              repeat)
+    gxx.CACHEDIR = None
+    tracemalloc.start()
+    build_context(True)
+    results['peak_mem_kib'] = tracemalloc.get_traced_memory()[1]/1024
+    tracemalloc.stop()
+    return results
+
+
+# ===========
+#   RESULTS
+# ===========
+def git_commit() -> typing.Optional[str]:
+    """Returns the current git commit of the repository, if available."""
+    try:
+        res = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                             cwd=ROOTDIR, stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return res.stdout.decode().strip()
+
+
+def load_results(fname: str) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Loads the results stored in a JSON-lines file.
+
+    Parameters
+    ----------
+    fname : str
+        Results file.
+
+    Returns
+    -------
+    list
+        List of stored benchmark runs.
+    """
+    runs = []
+    if os.path.exists(fname):
+        with open(fname, 'r') as fobj:
+            for line in fobj:
+                if line.strip():
+                    runs.append(json.loads(line))
+    return runs
+
+
+def compare(ref: typing.Dict[str, typing.Any],
+            new: typing.Dict[str, typing.Any],
+            threshold: float = THRESHOLD) -> int:
+    """Prints a comparison between two benchmark runs.
+
+    Parameters
+    ----------
+    ref : dict
+        Reference run.
+    new : dict
+        New run.
+    threshold : float
+        Relative increase above which a metric is flagged.
+
+    Returns
+    -------
+    int
+        Number of metrics flagged as regressions.
+    """
+    fmt = '{:24s} {:>12s} {:>12s} {:>8s} {}'
+    print(fmt.format('Metric', ref['commit'] or 'N/A',
+                     new['commit'] or 'N/A', 'Change', ''))
+    num_regress = 0
+    for key, value in new['results'].items():
+        if key not in ref['results'] or key.startswith('num_'):
+            continue
+        old = ref['results'][key]
+        change = (value - old)/old if old else 0.
+        if change > threshold:
+            flag = 'REGRESSION'
+            num_regress += 1
+        elif change < -threshold:
+            flag = 'improvement'
+        else:
+            flag = ''
+        print(fmt.format(key, '{:.4g}'.format(old), '{:.4g}'.format(value),
+                         '{:+.1%}'.format(change), flag))
+    return num_regress
+
+
+# ====================
+#   PARSER DEFINITON
+# ====================
+def build_parser() -> argparse.ArgumentParser:
+    """Builds options parser.
+
+    Returns
+    -------
+    :obj:`ArgumentParser`
+        `ArgumentParser` object
+    """
+    parser = argparse.ArgumentParser(
+        prog=PROGNAME,
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+        '-w', '--workings', type=int, default=300,
+        help='Number of working trees (default: %(default)s)')
+    parser.add_argument(
+        '-v', '--versions', type=int, default=30,
+        help='Number of Gaussian installations (default: %(default)s)')
+    parser.add_argument(
+        '-f', '--families', type=int, default=40,
+        help='Number of node families (default: %(default)s)')
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=5,
+        help='Number of repetitions of each measure (default: %(default)s)')
+    parser.add_argument(
+        '-o', '--output', default=RESULTS,
+        help='File where results are stored (default: %(default)s)')
+    parser.add_argument(
+        '-c', '--compare', nargs='?', const='', metavar='COMMIT',
+        help='''\
+Compares with a previous run with the same parameters.
+By default, the latest run on a different commit.''')
+    parser.add_argument(
+        '-g', '--generate', metavar='DIR',
+        help='Only generates the configuration files in DIR')
+    parser.add_argument(
+        '--nosave', action='store_true',
+        help='Do not store the results')
+    return parser
+
+
+# ================
+#   MAIN PROGRAM
+# ================
+
+if __name__ == '__main__':
+    opts = build_parser().parse_args()
+    params = {'workings': opts.workings, 'versions': opts.versions,
+              'families': opts.families}
+    if opts.generate:
+        os.makedirs(opts.generate, exist_ok=True)
+        write_gxx_ini(os.path.join(opts.generate, 'gxxconfig.ini'),
+                      opts.workings, opts.versions)
+        write_hpc_ini(os.path.join(opts.generate, 'hpcnodes.ini'),
+                      opts.families)
+        sys.exit()
+    with tempfile.TemporaryDirectory() as homedir:
+        write_gxx_ini(os.path.join(homedir, 'gxxconfig.ini'),
+                      opts.workings, opts.versions)
+        write_hpc_ini(os.path.join(homedir, 'hpcnodes.ini'), opts.families)
+        results = run_benchmark(homedir, opts.repeat)
+    run = {'commit': git_commit(), 'date': time.strftime('%Y-%m-%d %H:%M'),
+           'python': sys.version.split()[0], 'params': params,
+           'results': results}
+    fmt = '{:24s} {:.4g}'
+    print('Parameters: {workings} workings, {versions} versions, '
+          '{families} families'.format(**params))
+    for key, value in results.items():
+        print(fmt.format(key, value))
+    status = 0
+    if opts.compare is not None:
+        refs = [item for item in load_results(opts.output)
+                if item['params'] == params]
+        if opts.compare:
+            refs = [item for item in refs
+                    if (item['commit'] or '').startswith(opts.compare)]
+        else:
+            refs = [item for item in refs if item['commit'] != run['commit']]
+        if refs:
+            print()
+            status = int(compare(refs[-1], run) > 0)
+        else:
+            print('WARNING: No previous run to compare with.')
+    if not opts.nosave:
+        dname = os.path.dirname(opts.output)
+        if dname:
+            os.makedirs(dname, exist_ok=True)
+        with open(opts.output, 'a') as fobj:
+            fobj.write(json.dumps(run) + '\n')
+    sys.exit(status)
+
+# vim: ft=python foldmethod=indent
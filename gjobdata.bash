@@ -13,7 +13,8 @@ GJOB_HEADER="#  ID   ${FMT_SEP} STATUS ${FMT_SEP}  JOBID  ${FMT_SEP} STARTDATE\
 
 fmt_index="%06d"
 fmt_jobstat="%4s"
-fmt_jobid="%7d"
+# Job IDs are strings to support sub-jobs of arrays (ex: 1234[5])
+fmt_jobid="%7s"
 fmt_date="%08d"
 
 GJOB_DATAFMT=" ${fmt_index} ${FMT_SEP}  ${fmt_jobstat}  ${FMT_SEP}\
@@ -32,10 +33,10 @@ function print_entry () {
         ${status}
     if [[ ${status} != "WAIT" ]]; then
         fmt="\
-    Submitted wih queue ID %d on queue %s (node: %s)\n\
+    Submitted wih queue ID %s on queue %s (node: %s)\n\
     Starting date: %s\n"
         stardate=$(date -d "${gjfields[3]}" +"%B %-d, %Y")
-        printf "${fmt}" $((10#${gjfields[2]}+0)) ${gjfields[5]} ${gjfields[6]}\
+        printf "${fmt}" ${gjfields[2]} ${gjfields[5]} ${gjfields[6]}\
             ${startdate}
         if [[ ${status} == "GOOD" || ${status} == "FAIL" ]]; then
             printf "    End date: %s\n" $(date -d "${gjfields[4]}" +"%B %-d, %Y")
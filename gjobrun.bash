@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Needed for the checkpoint copies of array jobs
+shopt -s extglob
+
 #  Include parameters files
 # --------------------------
 source gjobdata.bash
@@ -8,6 +11,8 @@ source gjobdata.bash
 # -------
 if [[ $# -eq 0 ]]; then
     echo "Usage: gjobrun.bash id [ gver [ copychk ] ]"
+    echo "       id can be a range (first-last): the waiting jobs in the range"
+    echo "         are submitted as a single PBS array job (same queue needed)"
     echo "       copychk should be 0 (no), auto (default) or 1 (yes)"
     echo "       -> See gxxrun.bash for details"
     echo "       gver: version of gaussian, as gxxrev"
@@ -27,8 +32,71 @@ fi
 # Check id
 if [[ $myid =~ ^[0-9]+$ ]]; then
     fullid=$(printf "${fmt_index}" $myid)
+elif [[ $myid =~ ^([0-9]+)-([0-9]+)$ ]]; then
+    firstid=$((10#${BASH_REMATCH[1]}))
+    lastid=$((10#${BASH_REMATCH[2]}))
 else
-    echo "ERROR: Expected integer as job id"
+    echo "ERROR: Expected integer or range as job id"
+    exit
+fi
+
+#  Array job
+# -----------
+if [[ -n $lastid ]]; then
+    ids=()
+    inputs=()
+    queue=""
+    for ((i=firstid; i<=lastid; i++)); do
+        fullid=$(printf "${fmt_index}" $i)
+        line=$(grep -E "^\s+$fullid " ${GJOB_FILE})
+        [[ -z $line ]] && continue
+        parse_jobline "$line"
+        if [[ ${gjfields[1]} != "WAIT" ]]; then
+            echo "Job ${fullid} not waiting (${gjfields[1]}). Skipped."
+            continue
+        fi
+        if [[ -z $queue ]]; then
+            queue=${gjfields[5]}
+            job=${gjfields[7]}
+        elif [[ ${gjfields[5]} != $queue ]]; then
+            echo "ERROR: Jobs of an array must use the same queue"
+            exit
+        fi
+        # Same checkpoint copies as gxxrun.bash
+        mygjf=${gjfields[9]}/${gjfields[8]}
+        copy=$cpchk
+        if [[ $copy == "auto" ]]; then
+            p=".*\.(frq|anh)\..*"
+            [[ ${gjfields[8]} =~ $p ]] && copy=1 || copy=0
+        fi
+        if [[ $copy == 1 ]]; then
+            chkf=${mygjf/${mygjf##*.}/chk}
+            cp ${chkf/@(frq|anh)/opt} $chkf
+        fi
+        ids+=($fullid)
+        inputs+=("$mygjf")
+    done
+    if [[ ${#ids[@]} -lt 2 ]]; then
+        echo "ERROR: At least 2 waiting jobs needed for an array job"
+        exit
+    fi
+    res=$(${GXX_QSUB:-gxx_qsub.py} -m --array -q $queue -g $gxx -j "$job" \
+        "${inputs[@]}" | tail -n 1 | awk '{print $4}' | sed 's/"//g')
+    if [[ ! $res =~ ^[0-9]+\[\] ]]; then
+        echo "ERROR: Submission of the array job failed"
+        exit
+    fi
+    # Each job is tracked as a sub-job of the array (ex: 1234[5])
+    for k in ${!ids[@]}; do
+        fullid=${ids[$k]}
+        parse_jobline "$(grep -E "^\s+$fullid " ${GJOB_FILE})"
+        qid=$(printf ${fmt_jobid} "${res%%[*}[$((k+1))]")
+        newline=$(printf "${GJOB_DATAFMT}" $((10#${fullid}+0)) "QSUB" \
+            "${qid}" 0 0 "${gjfields[5]}" "${gjfields[6]}" "${gjfields[7]}" \
+            "${gjfields[8]}" "${gjfields[9]}")
+        sed -r -i "s#^\s+${fullid}.*#${newline}#" "${GJOB_FILE}"
+    done
+    echo "Array job ${res%%.*}: ${#ids[@]} jobs"
     exit
 fi
 
@@ -28,7 +28,8 @@ if os.path.exists(GJOBDATA_FILE):
                 gjob_fmts[key] = value.strip("\"'\n")
             elif line.startswith('fmt_'):
                 key, value = line.split('=')
-                gjob_fmts[key] = value.strip("\"'\n").replace('%', '{:') + '}'
+                # Right-aligned, as with printf
+                gjob_fmts[key] = value.strip("\"'\n").replace('%', '{:>') + '}'
             elif line.startswith('GJOB_DATAFMT'):
                 fmt_data = line.split('=')[1].strip("\"'\\\n")
                 while line.strip().endswith('\\'):
@@ -44,7 +45,8 @@ DELTA_CHK = (30+1)*60
 NOW = time.time()
 last_chk = NOW - DELTA_CHK
 
-qstat_fmt = "qstat -n -1 | grep -E '^\\s\\+{}'"
+# Job IDs can be sub-jobs of arrays (ex: 1234[5])
+qstat_fmt = "qstat -n -1 '{}' 2> /dev/null | tail -n 1"
 
 mbox = mailbox.mbox(MBOXFILE)
 
@@ -114,7 +116,7 @@ for key, message in mbox.iteritems():
                             data[1] = 'GOOD'
                             data[4] = edate
                         newline = gjob_fmts['fmt_data'].format(
-                                int(data[0]), data[1].strip(), int(jobid),
+                                int(data[0]), data[1].strip(), jobid,
                                 int(data[3]), int(data[4]), data[5].strip(),
                                 data[6].strip(), data[7].strip(),
                                 data[8].strip(), data[9].strip())
@@ -3,9 +3,19 @@
 import os
 import sys
 import re
+import io
+import json
+import time
+import hashlib
+import mmap
 import argparse
+import pickle
+import locale
 from configparser import ConfigParser
-from math import inf
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout, redirect_stderr
+from math import ceil, inf
+from shlex import quote
 import socket  # module for the fully qualified named of the headnode
 from subprocess import Popen, PIPE
 try:
@@ -41,6 +51,11 @@ GXX_ARCHS = {
 # From early tests, best to use only physical cores
 # Anyway, this can be changed depending on preferences
 USE_LOGICAL_CORE = False
+# Pins the processes of parallel multi-jobs to disjoint sets of cores,
+#   aligned to the sockets (%CPU instead of %NProcShared).
+# Cores are assumed numbered socket by socket, the logical cores following
+#   all the physical ones, as usually done by Linux.
+PIN_PARALLEL = True
 # Maximum occupation of the total memory on a given node
 # By default, Gaussian does a very good job in managing the memory, but there
 #   is some memory set statically, so besides %Mem
@@ -56,6 +71,51 @@ GXX_ALIAS = None
 # Default version of Gaussian to run (must be a keyword)
 GDEFAULT = 'g16c01'
 
+#  Input analysis
+# ---------------
+# Maximum number of processes used to analyse the input files of multi-job
+#   submissions (1 to deactivate the parallel analysis).
+# This should be adapted to the load acceptable on the submission node.
+ANALYSIS_WORKERS = 4
+# Minimum number of input files to start a parallel analysis
+ANALYSIS_MIN_INPUTS = 8
+# Maximum number of qsub commands run concurrently by batch submissions
+#   (see submit_many).
+QSUB_WORKERS = 8
+# Automatic sizing of the resources (--auto-size)
+# Target wall time (in s): the number of cores is increased until the
+#   estimated wall time falls below this value.
+AUTOSIZE_WALLTIME = 4*3600
+# Parallel efficiency assumed for the estimation of the wall time
+AUTOSIZE_EFFICIENCY = .8
+
+#  File transfers
+# ---------------
+# Default maximum number of files copied concurrently between the storage
+#   and the scratch directory by each job (see MaxTransfers in hpcnodes.ini).
+STAGE_TRANSFERS = 4
+# Periodic copy of the checkpoint files during the job (--chksync).
+# Default interval (in minutes) between two synchronizations.
+CHKSYNC_INTERVAL = 30
+# Minimum time (in s) without modification before a checkpoint file is
+#   copied, to avoid copying a file being written by Gaussian.
+CHKSYNC_QUIET = 120
+# Checks the free space on the local disks before starting Gaussian, from
+#   the size of the files to stage in and the scratch given by the user
+#   (--scratch): 'warn' only prints a warning, 'stop' also stops the job.
+#   None deactivates the check.
+SCRATCH_PREFLIGHT = 'warn'
+
+#  Pilot jobs
+# ------------
+# Spool of the tasks run by pilot jobs (--pilot), with one subdirectory per
+#   queue.  It must be on a file system shared with the computing nodes.
+PILOT_SPOOL = os.path.join(os.getenv('HOME'), 'gxx_spool')
+# Default number of Gaussian processes run concurrently by a pilot job
+PILOT_SLOTS = 4
+# Time (in s) kept free at the end of the wall time budget (--budget)
+PILOT_MARGIN = 600
+
 # Basic Paths
 # -----------
 # By default, many path are built, but they can be overridden below
@@ -66,6 +126,20 @@ LIBPATH = os.path.join(INIPATH, 'lib')  # Library path for HPC modules
 #   file, Gxx-QSub creates a directory in HOME based on the PID.
 # {pid} refers to the job PID, dirs can be added too.
 TMPDIR = 'scratch-{pid}'
+# Directory storing the compiled configuration (parsed ini files).
+# The cache is automatically rebuilt when any of the ini files changes.
+# It can be deactivated by setting CACHEDIR to None.
+CACHEDIR = os.path.join(os.getenv('HOME'), '.cache', 'gxx_qsub')
+# Maximum size (in bytes) of the cache of input analyses, stored in CACHEDIR.
+# The least recently used analyses are removed first.
+# It can be deactivated by setting INPUT_CACHE_SIZE to None.
+INPUT_CACHE_SIZE = 64*1024**2
+# Input files larger than MMAP_THRESHOLD (in bytes) are memory-mapped and
+#   written directly, without going through the cache of analyses.
+MMAP_THRESHOLD = 4*1024**2
+# Encoding of the input files and job scripts (same as text files).
+# Undecodable bytes are kept unchanged in the new input files.
+GJF_ENCODING = locale.getpreferredencoding(False)
 
 # Config File Names
 # -----------------
@@ -74,12 +148,21 @@ TMPDIR = 'scratch-{pid}'
 #   `None` and setting the full paths for HPCINIPATH and GXXINIPATH
 HPCINIFILE = 'hpcnodes.ini'
 GXXINIFILE = 'gxxconfig.ini'
+# Manifest of the Gaussian installations and working trees (see --mkmanifest)
+# The manifest is used instead of the file system to check the trees.
+# It is deactivated by setting MANIFESTFILE to None and MANIFESTPATH to None
+MANIFESTFILE = 'gxxmanifest.json'
+# Calibration of the resource cost model (see --calibrate)
+# The user's file takes precedence over the system one.
+COSTMODELFILE = 'gxxcost.json'
 
 # Full Paths
 # ----------
 # Full paths, normally created but can be hardcoded
 HPCINIPATH = os.path.join(INIPATH, HPCINIFILE)
 GXXINIPATH = os.path.join(INIPATH, GXXINIFILE)
+MANIFESTPATH = os.path.join(INIPATH, 'gxxmanifest.json')
+COSTMODELPATH = os.path.join(INIPATH, 'gxxcost.json')
 HPCMODPATH = LIBPATH
 
 # ================
@@ -90,6 +173,8 @@ DEFAULT_PATHS = {
     'hpc_inifile': HPCINIPATH,
     'hpc_modpath': HPCMODPATH,
     'gxx_inifile': HPCMODPATH,
+    'manifest': MANIFESTPATH,
+    'costmodel': COSTMODELPATH,
 }
 sys.path.insert(0, DEFAULT_PATHS['hpc_modpath'])
 
@@ -101,6 +186,9 @@ import hpcnodes as hpc  # NOQA
 
 AUTHOR = "Julien Bloino (julien.bloino@sns.it)"
 VERSION = "2020.08.16"
+# Format of the cached analyses of input files, to change with the content
+#   returned by parse_gjf.
+INPUT_CACHE_FORMAT = 2
 # Program name is generated from commandline
 PROGNAME = os.path.basename(sys.argv[0])
 
@@ -110,318 +198,398 @@ PROGNAME = os.path.basename(sys.argv[0])
 
 #  Environment variables
 # ------------------------
-jobPID = str(os.getpid())
-USERNAME = os.getenv('USER')
-DEFAULTDIR = os.path.join(os.getenv('HOME'), TMPDIR.format(pid=jobPID))
-STARTDIR = os.getcwd()
-# We only support one file for HPC ini data, otherwise it would risk
-#   creating confusion in case of inconsistent data.
-if HPCINIFILE is not None:
-    res = os.path.join(os.getenv('HOME'), HPCINIFILE)
-    if os.path.exists(res):
-        HPCFile = res
-else:
-    HPCFile = DEFAULT_PATHS['hpc_inifile']
+def init_environment(pid: typing.Optional[typing.Union[int, str]] = None
+                     ) -> None:
+    """Initializes the job-specific environment variables.
 
-#  Queue definitions
-# -------------------
-if not os.path.exists(HPCFile):
-    print('ERROR: Incorrect path to HPC nodes specification files.')
-    sys.exit()
+    Sets the job PID, user name, default directory and starting
+    directory from the current process.
+    This is done at import but must be repeated by long-lived processes
+    submitting on behalf of other processes.
 
-HPCNODES = hpc.parse_ini(HPCFile)
-HPCQUEUES = hpc.list_queues_nodes(HPCNODES)
+    Parameters
+    ----------
+    pid : int or str, optional
+        Process ID used to label the job files (default: current PID).
+    """
+    global jobPID, USERNAME, DEFAULTDIR, STARTDIR
+    jobPID = str(pid or os.getpid())
+    USERNAME = os.getenv('USER')
+    DEFAULTDIR = os.path.join(os.getenv('HOME'), TMPDIR.format(pid=jobPID))
+    STARTDIR = os.getcwd()
 
-HELP_QUEUES = """Sets the queues.
-Available queues:
-{}
 
-Virtual queues defined as:
-<queue>[:[nprocs][:nodeid]]
-with:
-    <queue>: one of the queues above
-    nprocs: choice for number of processing units
-        - "H" : uses half of the cores of a single CPU
-        - "S" : uses a single core
-        - "0" : auto (same as empty)
-        - positive integer: total number of cores to use.
-        - negative integer: number of CPUs to use
-""".format(', '.join(sorted(HPCQUEUES.keys())))
+init_environment()
 
 
-#  Gaussian-related definitions
-# -----------------------------
-GXX_FORMAT = re.compile(r'g(dv|\d{2})\.?\w\d{2}[p+]?')
-# Sets the Gaussian ini files.
-# The user can set their own file to override what the system is providing
-GxxFiles = []
-if GXXINIFILE is not None:
-    res = os.path.join(os.getenv('HOME'), GXXINIFILE)
-    if os.path.exists(res):
-        GxxFiles.append(res)
-GxxFiles.append(DEFAULT_PATHS['gxx_inifile'])
-
-# Get Gaussian data file
-gconf = ConfigParser()
-gconf.read(GxxFiles)
-defvals = gconf.defaults()
-WorkTags = []
-
-if 'workinfo' in defvals:
-    WorkInfo = {}
-    for info in defvals['workinfo'].split(','):
-        res = [item.strip() for item in info.split(':', maxsplit=3)]
-        if len(res) == 3:
-            key = res[0] or 'def'
-            name = res[1] or 'System'
-            mail = res[2] or 'N/A'
-        else:
-            print('ERROR: WorkInfo format must contain 2 ":"')
-            sys.exit(1)
-        if key in WorkTags:
-            print('ERROR: Duplicate tags "{}"'.format(key))
-            sys.exit(1)
-        WorkTags.append(key)
-        WorkInfo[key] = (name, mail)
-else:
-    WorkInfo = {'def': ('System', 'N/A')}
-
-if 'workpath' in defvals:
-    WorkRoots = {0: defvals['workpath']}
-    for info in defvals['workpath'].split(','):
-        res = [item.strip() for item in info.split(':', maxsplit=1)]
-        if len(res) == 2:
-            key = res[0] or 'def'
-            path = res[1]
-        else:
-            print('ERROR: WorkPath format must contain 1 ":"')
-            sys.exit(1)
-        if key in WorkRoots:
-            print('ERROR: Duplicate tag in WorkPath')
-            sys.exit(1)
-        WorkRoots[key] = path
-else:
-    WorkRoots = None
-
-# Extract Gaussian Installation Versions
-# ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Supported formax gXX[.]ABB[p/+]
-GVERSIONS = {}
-for sec in sorted(gconf.sections()):
-    if GXX_FORMAT.match(sec):
-        key = sec.lower().replace('.', '').replace('+', 'p')
-        GVERSIONS[key] = {}
-        data = gconf[sec]
-        # Root path
-        if 'FullPath' in data:
-            res = data['FullPath']
-        else:
-            if gconf.get(sec, 'RootPath', fallback=None) is None:
-                print('ERROR: Missing Gaussian root installation dir.')
-                sys.exit(1)
-            if 'BaseDir' in data:
-                res = os.path.join(data['RootPath'], data['BaseDir'])
+# ===================================
+#   CONFIGURATION-RELATED FUNCTIONS
+# ===================================
+def files_signature(files: typing.List[str]
+                    ) -> typing.Tuple[typing.Tuple[str, typing.Optional[int],
+                                                   typing.Optional[int]], ...]:
+    """Returns a signature of a list of files.
+
+    Builds a signature from the path, modification time and size of
+    each file.  Missing files are kept in the signature so that their
+    later creation is detected.
+
+    Parameters
+    ----------
+    files : list
+        List of paths to files.
+
+    Returns
+    -------
+    tuple
+        Tuple of (path, mtime, size) for each file, with mtime and size
+        set to None for missing files.
+    """
+    signature = []
+    for fname in files:
+        path = os.path.abspath(fname)
+        try:
+            info = os.stat(path)
+            signature.append((path, info.st_mtime_ns, info.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+def load_config_cache(label: str,
+                      files: typing.List[str],
+                      builder: typing.Callable[[], typing.Any],
+                      extra: typing.Optional[typing.Tuple] = None
+                      ) -> typing.Any:
+    """Loads configuration data from cache or builds it.
+
+    Returns the data stored in the compiled cache `label` if it is still
+    valid for the source files, otherwise builds the data with `builder`
+    and stores it in the cache.
+    The cache is keyed by the signature of all source files and of this
+    module (holding the parsers), so any change in one of them
+    invalidates the cache.
+
+    Parameters
+    ----------
+    label : str
+        Name of the cache file (without extension).
+    files : list
+        List of source files contributing to the data.
+    builder : function
+        Function building the data from the source files.
+    extra : tuple, optional
+        Additional parameters affecting the data, included in the key.
+
+    Returns
+    -------
+    object
+        Data as returned by `builder`.
+    """
+    if CACHEDIR is None:
+        return builder()
+    # The parsers are defined here, so their changes also invalidate it
+    key = (VERSION, extra, files_signature(list(files) + [__file__]))
+    fname = os.path.join(CACHEDIR, label + '.pickle')
+    try:
+        with open(fname, 'rb') as fobj:
+            cache_key, data = pickle.load(fobj)
+        if cache_key == key:
+            return data
+    except Exception:
+        # Missing, unreadable or outdated cache, simply rebuild it.
+        pass
+    data = builder()
+    # The cache is written in a temporary file, then renamed to avoid
+    #   concurrent submissions reading a partially written file.
+    tmpfile = '{}.{}'.format(fname, jobPID)
+    try:
+        os.makedirs(CACHEDIR, exist_ok=True)
+        with open(tmpfile, 'wb') as fobj:
+            pickle.dump((key, data), fobj, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfile, fname)
+    except (OSError, pickle.PicklingError):
+        try:
+            os.remove(tmpfile)
+        except OSError:
+            pass
+    return data
+
+
+def parse_hpc_ini(fname: str
+                  ) -> typing.Tuple[typing.Dict[str, hpc.NodeFamily],
+                                    typing.Dict[str, str]]:
+    """Parses the HPC ini file.
+
+    Parameters
+    ----------
+    fname : str
+        Path to the HPC ini file.
+
+    Returns
+    -------
+    tuple
+        The following information are returned:
+        - dictionary of node families
+        - dictionary of queues with corresponding node family names
+    """
+    nodes = hpc.parse_ini(fname)
+    return nodes, hpc.list_queues_nodes(nodes)
+
+
+def parse_gxx_ini(files: typing.List[str],
+                  docs: bool = False
+                  ) -> typing.Tuple[typing.Dict[str, typing.Any],
+                                    typing.Dict[str, typing.Any]]:
+    """Parses the Gaussian ini files.
+
+    Parses the Gaussian configuration files and builds the tables of
+    Gaussian installations and working trees.
+
+    Parameters
+    ----------
+    files : list
+        List of Gaussian configuration files.
+    docs : bool
+        Parses the changelogs and documentations of the working trees.
+        Only needed for the help.
+
+    Returns
+    -------
+    tuple
+        The following information are returned:
+        - dictionary of Gaussian installations
+        - dictionary of working trees
+    """
+    # Get Gaussian data file
+    gconf = ConfigParser()
+    gconf.read(files)
+    defvals = gconf.defaults()
+    WorkTags = []
+
+    if 'workinfo' in defvals:
+        WorkInfo = {}
+        for info in defvals['workinfo'].split(','):
+            res = [item.strip() for item in info.split(':', maxsplit=3)]
+            if len(res) == 3:
+                key = res[0] or 'def'
+                name = res[1] or 'System'
+                mail = res[2] or 'N/A'
             else:
-                print('ERROR: Either `BaseDir`+`RootPath` or `FullPath`',
-                      'must be set.')
+                print('ERROR: WorkInfo format must contain 2 ":"')
                 sys.exit(1)
-        GVERSIONS[key]['path'] = res
-        # Gaussian final directory
-        GVERSIONS[key]['gdir'] = gconf.get(sec, 'GDir',
-                                           fallback=sec.split('.')[0].lower())
-        # Machine architectures
-        res = gconf.get(sec, 'Machs', fallback=None)
-        if res.strip() == ' ':
-            res = None
-        if res is not None:
-            res = [item.strip() for item in res.split(',')]
-        GVERSIONS[key]['mach'] = res
-        # Gaussian version label
-        if 'Name' in data:
-            res = data['Name']
-        else:
-            if 'Gaussian' not in data or 'Revision' not in data:
-                print('ERROR: Gaussian/Revision or Name must be provided.')
+            if key in WorkTags:
+                print('ERROR: Duplicate tags "{}"'.format(key))
                 sys.exit(1)
-            res = data['Gaussian'] + ' Rev. ' + data['Revision']
-        GVERSIONS[key]['name'] = res
-        # Gaussian release date
-        GVERSIONS[key]['date'] = gconf.get(sec, 'Date', fallback=None)
-        # Usage restrictions
-        res = gconf.get(sec, 'Shared', fallback=None)
-        if res is not None:
-            items = [x.strip().lower() for x in res.split(',')]
-            if {'any', 'all'} & set(items):
-                res = None
+            WorkTags.append(key)
+            WorkInfo[key] = (name, mail)
+    else:
+        WorkInfo = {'def': ('System', 'N/A')}
+
+    if 'workpath' in defvals:
+        WorkRoots = {0: defvals['workpath']}
+        for info in defvals['workpath'].split(','):
+            res = [item.strip() for item in info.split(':', maxsplit=1)]
+            if len(res) == 2:
+                key = res[0] or 'def'
+                path = res[1]
             else:
-                res = [x.strip() for x in res.split(',')]
-        GVERSIONS[key]['pub'] = res
-        # Available standard/default workings
-        if 'Workings' in data:
-            res = [item.strip() for item in data['Workings'].split(',')]
-            if set(res) - set(WorkTags):
-                for item in res:
-                    if item not in WorkTags:
-                        WorkTags.append(item)
-        else:
-            res = None
-        GVERSIONS[key]['work'] = res
-
-if GDEFAULT not in GVERSIONS:
-    print('ERROR: Default version of Gaussian not present in config files')
-    sys.exit(1)
-
-# Sort Working Tags
-# ^^^^^^^^^^^^^^^^^
-WorkTags.sort()
-scr = [item.lower() for item in WorkTags]
-if len(scr) < len(WorkTags):
-    print('WARNING: Some tags only differ by the case.',
-          'Assuming this is correct.')
-
-# Gaussian Working Trees
-# ^^^^^^^^^^^^^^^^^^^^^^
-WORKINGS = {}
-# We select the working-related sections by complementarity:
-#   everything which does not have the Gaussian version format
-#   is a priori a possible working
-# Gxx_QSub only supports the format "tag.gxx.rev"
-for sec in sorted(gconf.sections()):
-    if not GXX_FORMAT.match(sec):
-        wtags = sec.lower().replace('+', 'p').split('.')
-        if len(wtags) != 3:
-            continue
-        tag, gxx, rev = wtags
-        data = gconf[sec]
-        # Get information on Gaussian version (shortened label and name)
-        # Then compare if part of the versions
-        gver = gxx + rev
-        # Gaussian version label
-        if 'Name' in data:
-            gname = data['Name']
-        else:
-            if 'Gaussian' not in data or 'Revision' not in data:
-                print('ERROR: Gaussian/Revision or Name must be provided.')
+                print('ERROR: WorkPath format must contain 1 ":"')
                 sys.exit(1)
-            gname = data['Gaussian'] + ' Rev. ' + data['Revision']
-        # Check if reference Gaussian version installed
-        gkey = None
-        if gver in GVERSIONS:
-            gkey = gver
-        else:
-            for key in GVERSIONS:
-                if GVERSIONS[key]['name'] == gname:
-                    gkey = key
-        # Check if missing Gaussian installation or working not allowed
-        if gkey is None:
-            print('ERROR: Reference Gaussian version not found.')
-            sys.exit(1)
-        elif not ANY_WORKING:
-            if tag not in GVERSIONS[gkey]['Workings']:
-                break
-        # Build key
-        # For GDV, since rev unique, use tagrev
-        # For Gxx, there may be overlap, so taggxxrev
-        if wtags[1] == 'gdv':
-            key = tag + rev
-        else:
-            key = tag + gxx + rev
-        WORKINGS[key] = {'gref': gkey}
-        # Root path
-        if 'FullPath' in data:
-            res = data['FullPath']
-        else:
-            if gconf.get(sec, 'WorkPath', fallback=None) is None:
-                print('ERROR: Missing working root directory.')
+            if key in WorkRoots:
+                print('ERROR: Duplicate tag in WorkPath')
                 sys.exit(1)
+            WorkRoots[key] = path
+    else:
+        WorkRoots = None
+
+    # Extract Gaussian Installation Versions
+    # ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Supported formax gXX[.]ABB[p/+]
+    gversions = {}
+    for sec in sorted(gconf.sections()):
+        if GXX_FORMAT.match(sec):
+            key = sec.lower().replace('.', '').replace('+', 'p')
+            gversions[key] = {}
+            data = gconf[sec]
+            # Root path
+            if 'FullPath' in data:
+                res = data['FullPath']
             else:
-                # Check if workpath startswith the tag (for DEFAULT)
-                if WorkRoots is not None:
-                    if data['WorkPath'] == WorkRoots[0]:
-                        if tag not in WorkRoots:
-                            fmt = 'ERROR: Missing default WorkPath for "{}"'
-                            print(fmt.format(tag))
-                            sys.exit(1)
-                        wroot = WorkRoots[tag]
-                    else:
-                        wroot = data['WorkPath']
+                if gconf.get(sec, 'RootPath', fallback=None) is None:
+                    print('ERROR: Missing Gaussian root installation dir.')
+                    sys.exit(1)
+                if 'BaseDir' in data:
+                    res = os.path.join(data['RootPath'], data['BaseDir'])
                 else:
-                    wroot = data['WorkPath']
-            if 'BaseDir' in data:
-                res = os.path.join(wroot, data['BaseDir'])
+                    print('ERROR: Either `BaseDir`+`RootPath` or `FullPath`',
+                          'must be set.')
+                    sys.exit(1)
+            gversions[key]['path'] = res
+            # Gaussian final directory
+            gversions[key]['gdir'] = gconf.get(
+                sec, 'GDir', fallback=sec.split('.')[0].lower())
+            # Machine architectures
+            res = gconf.get(sec, 'Machs', fallback=None)
+            if res.strip() == ' ':
+                res = None
+            if res is not None:
+                res = [item.strip() for item in res.split(',')]
+            gversions[key]['mach'] = res
+            # Gaussian version label
+            if 'Name' in data:
+                res = data['Name']
+            else:
+                if 'Gaussian' not in data or 'Revision' not in data:
+                    print('ERROR: Gaussian/Revision or Name must be provided.')
+                    sys.exit(1)
+                res = data['Gaussian'] + ' Rev. ' + data['Revision']
+            gversions[key]['name'] = res
+            # Gaussian release date
+            gversions[key]['date'] = gconf.get(sec, 'Date', fallback=None)
+            # Usage restrictions
+            res = gconf.get(sec, 'Shared', fallback=None)
+            if res is not None:
+                items = [x.strip().lower() for x in res.split(',')]
+                if {'any', 'all'} & set(items):
+                    res = None
+                else:
+                    res = [x.strip() for x in res.split(',')]
+            gversions[key]['pub'] = res
+            # Available standard/default workings
+            if 'Workings' in data:
+                res = [item.strip() for item in data['Workings'].split(',')]
+                if set(res) - set(WorkTags):
+                    for item in res:
+                        if item not in WorkTags:
+                            WorkTags.append(item)
             else:
-                print('ERROR: Either `BaseDir`+`WorkPath` or `FullPath`',
-                      'must be set.')
-                sys.exit(1)
-        WORKINGS[key]['path'] = res
-        # Gaussian version label
-        WORKINGS[key]['name'] = gname
-        # Version
-        WORKINGS[key]['ver'] = gconf.get(sec, 'Version', fallback=None)
-        # Update date
-        WORKINGS[key]['date'] = gconf.get(sec, 'Date', fallback=None)
-        # Machine architectures
-        res = gconf.get(sec, 'Machs', fallback=None)
-        if res.strip() == ' ':
-            res = None
-        if res is not None:
-            res = [item.strip() for item in res.split(',')]
-        WORKINGS[key]['mach'] = res
-        # Usage restrictions
-        res = gconf.get(sec, 'Shared', fallback=None)
-        if res is not None:
-            items = [x.strip().lower() for x in res.split(',')]
-            if {'any', 'all'} & set(items):
                 res = None
+            gversions[key]['work'] = res
+
+    # Sort Working Tags
+    # ^^^^^^^^^^^^^^^^^
+    WorkTags.sort()
+    scr = [item.lower() for item in WorkTags]
+    if len(scr) < len(WorkTags):
+        print('WARNING: Some tags only differ by the case.',
+              'Assuming this is correct.')
+
+    # Gaussian Working Trees
+    # ^^^^^^^^^^^^^^^^^^^^^^
+    workings = {}
+    # We select the working-related sections by complementarity:
+    #   everything which does not have the Gaussian version format
+    #   is a priori a possible working
+    # Gxx_QSub only supports the format "tag.gxx.rev"
+    for sec in sorted(gconf.sections()):
+        if not GXX_FORMAT.match(sec):
+            wtags = sec.lower().replace('+', 'p').split('.')
+            if len(wtags) != 3:
+                continue
+            tag, gxx, rev = wtags
+            data = gconf[sec]
+            # Get information on Gaussian version (shortened label and name)
+            # Then compare if part of the versions
+            gver = gxx + rev
+            # Gaussian version label
+            if 'Name' in data:
+                gname = data['Name']
             else:
-                res = [x.strip() for x in res.split(',')]
-        WORKINGS[key]['pub'] = res
-        # Author information
-        if tag in WorkInfo:
-            WORKINGS[key]['auth'] = WorkInfo[tag][0]
-            WORKINGS[key]['mail'] = WorkInfo[tag][1]
-        else:
-            WORKINGS[key]['auth'] = None
-            WORKINGS[key]['mail'] = None
-        # Changelog
-        if 'changelog' in data:
-            vers = data['changelog'].split(',')
-            WORKINGS[key]['clog'] = []
-            for item in vers:
-                res = item.split(':')
-                if len(res) == 2:
-                    fname, ftype = [s.strip() for s in res]
+                if 'Gaussian' not in data or 'Revision' not in data:
+                    print('ERROR: Gaussian/Revision or Name must be provided.')
+                    sys.exit(1)
+                gname = data['Gaussian'] + ' Rev. ' + data['Revision']
+            # Check if reference Gaussian version installed
+            gkey = None
+            if gver in gversions:
+                gkey = gver
+            else:
+                for key in gversions:
+                    if gversions[key]['name'] == gname:
+                        gkey = key
+            # Check if missing Gaussian installation or working not allowed
+            if gkey is None:
+                print('ERROR: Reference Gaussian version not found.')
+                sys.exit(1)
+            elif not ANY_WORKING:
+                if tag not in gversions[gkey]['Workings']:
+                    break
+            # Build key
+            # For GDV, since rev unique, use tagrev
+            # For Gxx, there may be overlap, so taggxxrev
+            if wtags[1] == 'gdv':
+                key = tag + rev
+            else:
+                key = tag + gxx + rev
+            workings[key] = {'gref': gkey}
+            # Root path
+            if 'FullPath' in data:
+                res = data['FullPath']
+            else:
+                if gconf.get(sec, 'WorkPath', fallback=None) is None:
+                    print('ERROR: Missing working root directory.')
+                    sys.exit(1)
                 else:
-                    fname = res[0].strip()
-                    ftype = os.path.splitext(fname)[0][1:].upper()
-                if fname.strip().startswith('.'):
-                    if fname.count('.') == 1:
-                        if len(WORKINGS[key]['clog']) == 0:
-                            print('ERROR: Changelog alternative format but no',
-                                  'main format.')
-                            sys.exit()
+                    # Check if workpath startswith the tag (for DEFAULT)
+                    if WorkRoots is not None:
+                        if data['WorkPath'] == WorkRoots[0]:
+                            if tag not in WorkRoots:
+                                fmt = 'ERROR: Missing default WorkPath ' \
+                                    + 'for "{}"'
+                                print(fmt.format(tag))
+                                sys.exit(1)
+                            wroot = WorkRoots[tag]
                         else:
-                            fname = None
-                if fname is not None:
-                    fname = fname.format(fullpath=WORKINGS[key]['path'])
-                WORKINGS[key]['clog'].append((fname, ftype))
-        else:
-            WORKINGS[key]['clog'] = None
-        # Other documentations
-        if 'docs' in data:
-            WORKINGS[key]['docs'] = {}
-            docs = data['docs'].split('\n')
-            for item0 in docs:
-                try:
-                    keydoc, paths = item0.split(':', maxsplit=1)
-                except ValueError:
-                    print('ERROR: Format for docs should be:',
-                          'DOCTYPE:path[:format][,[altpath]ext[:format]].')
+                            wroot = data['WorkPath']
+                    else:
+                        wroot = data['WorkPath']
+                if 'BaseDir' in data:
+                    res = os.path.join(wroot, data['BaseDir'])
+                else:
+                    print('ERROR: Either `BaseDir`+`WorkPath` or `FullPath`',
+                          'must be set.')
                     sys.exit(1)
-                WORKINGS[key]['docs'][keydoc] = []
-                vers = paths.split(',')
-                for item1 in vers:
-                    res = item1.split(':')
+            workings[key]['path'] = res
+            # Gaussian version label
+            workings[key]['name'] = gname
+            # Version
+            workings[key]['ver'] = gconf.get(sec, 'Version', fallback=None)
+            # Update date
+            workings[key]['date'] = gconf.get(sec, 'Date', fallback=None)
+            # Machine architectures
+            res = gconf.get(sec, 'Machs', fallback=None)
+            if res.strip() == ' ':
+                res = None
+            if res is not None:
+                res = [item.strip() for item in res.split(',')]
+            workings[key]['mach'] = res
+            # Usage restrictions
+            res = gconf.get(sec, 'Shared', fallback=None)
+            if res is not None:
+                items = [x.strip().lower() for x in res.split(',')]
+                if {'any', 'all'} & set(items):
+                    res = None
+                else:
+                    res = [x.strip() for x in res.split(',')]
+            workings[key]['pub'] = res
+            # Author information
+            if tag in WorkInfo:
+                workings[key]['auth'] = WorkInfo[tag][0]
+                workings[key]['mail'] = WorkInfo[tag][1]
+            else:
+                workings[key]['auth'] = None
+                workings[key]['mail'] = None
+            if not docs:
+                workings[key]['clog'] = None
+                workings[key]['docs'] = None
+                continue
+            # Changelog
+            if 'changelog' in data:
+                vers = data['changelog'].split(',')
+                workings[key]['clog'] = []
+                for item in vers:
+                    res = item.split(':')
                     if len(res) == 2:
                         fname, ftype = [s.strip() for s in res]
                     else:
@@ -429,82 +597,136 @@ for sec in sorted(gconf.sections()):
                         ftype = os.path.splitext(fname)[0][1:].upper()
                     if fname.strip().startswith('.'):
                         if fname.count('.') == 1:
-                            if len(WORKINGS[key]['docs'][keydoc]) == 0:
-                                print('ERROR: {} alternative'.format(keydoc),
-                                      'format but no main format.')
+                            if len(workings[key]['clog']) == 0:
+                                print('ERROR: Changelog alternative format',
+                                      'but no main format.')
                                 sys.exit()
                             else:
                                 fname = None
                     if fname is not None:
-                        fname = fname.format(fullpath=WORKINGS[key]['path'])
-                    WORKINGS[key]['docs'][keydoc].append((fname, ftype))
-        else:
-            WORKINGS[key]['docs'] = None
+                        fname = fname.format(fullpath=workings[key]['path'])
+                    workings[key]['clog'].append((fname, ftype))
+            else:
+                workings[key]['clog'] = None
+            # Other documentations
+            if 'docs' in data:
+                workings[key]['docs'] = {}
+                docs = data['docs'].split('\n')
+                for item0 in docs:
+                    try:
+                        keydoc, paths = item0.split(':', maxsplit=1)
+                    except ValueError:
+                        print('ERROR: Format for docs should be:',
+                              'DOCTYPE:path[:format][,[altpath]ext[:format]].')
+                        sys.exit(1)
+                    workings[key]['docs'][keydoc] = []
+                    vers = paths.split(',')
+                    for item1 in vers:
+                        res = item1.split(':')
+                        if len(res) == 2:
+                            fname, ftype = [s.strip() for s in res]
+                        else:
+                            fname = res[0].strip()
+                            ftype = os.path.splitext(fname)[0][1:].upper()
+                        if fname.strip().startswith('.'):
+                            if fname.count('.') == 1:
+                                if len(workings[key]['docs'][keydoc]) == 0:
+                                    print('ERROR: {}'.format(keydoc),
+                                          'alternative format but no main',
+                                          'format.')
+                                    sys.exit()
+                                else:
+                                    fname = None
+                        if fname is not None:
+                            fname = fname.format(
+                                fullpath=workings[key]['path'])
+                        workings[key]['docs'][keydoc].append((fname, ftype))
+            else:
+                workings[key]['docs'] = None
+
+    return gversions, workings
+
+
+def build_gxx_alias(gversions: typing.Dict[str, typing.Any]
+                    ) -> typing.Dict[str, str]:
+    """Builds the default aliases for Gaussian versions.
+
+    Parameters
+    ----------
+    gversions : dict
+        Gaussian installations.
 
-# Gaussian Keyword Aliases
-# ^^^^^^^^^^^^^^^^^^^^^^^^
-if GXX_ALIAS is None:
-    GXX_ALIAS = {}
-    for gxx in GVERSIONS:
+    Returns
+    -------
+    dict
+        Aliases with the corresponding Gaussian version keyword.
+    """
+    aliases = {}
+    for gxx in gversions:
         # Alias to the latest version
         # This assumes that GVERSIONS is sorted by increasin
         key = gxx[:3]
-        GXX_ALIAS[key] = gxx
-
-# Automatic Documentation
-# ^^^^^^^^^^^^^^^^^^^^^^^
-HELP_GXX = 'Absolute paths or the following keywords are supported:\n'
-# Gaussian versions
-fmt = '+ {kword:7s}: {label:22s} ({date}){extra}\n'
-for gxx in GVERSIONS:
-    gname = GVERSIONS[gxx]['name']
-    gdate = GVERSIONS[gxx]['date'] or 'N/A'
-    if gxx == GDEFAULT:
-        ginfo = ' - default'
-    else:
-        ginfo = ''
-    HELP_GXX += fmt.format(kword=gxx, label=gname, date=gdate, extra=ginfo)
-# Aliases
-fmt = '+ {kword:7s}: Alias for "{gtag}"\n'
-for gxx in GXX_ALIAS:
-    HELP_GXX += fmt.format(kword=gxx, gtag=GXX_ALIAS[gxx])
-# Workings
-fmt = '+ {kword:7s}: Working by {auth} for {label} (updated: {date})\n'
-fmt2 = '    {{dtype:{:d}s}}: {{path}}{{extra}}\n'
-for gxx in WORKINGS:
-    gname = WORKINGS[gxx]['name']
-    gdate = WORKINGS[gxx]['date'] or 'N/A'
-    gauth = WORKINGS[gxx]['auth'] or '<Unknown>'
-    HELP_GXX += fmt.format(kword=gxx, auth=gauth, label=gname, date=gdate)
-    # For a prettier output, try to align the colons between the different docs
-    #   So we calculate first the longest doctype.
-    if WORKINGS[gxx]['clog'] is not None:
-        l_doctype = 9
-    else:
-        l_doctype = 0
-    if WORKINGS[gxx]['docs'] is not None:
-        l_doctype = max(l_doctype, *[len(x) for x in WORKINGS[gxx]['docs']])
-    # Build format only if l_doctype > 0:
-    if l_doctype > 0:
-        dfmt = fmt2.format(l_doctype)
-        if WORKINGS[gxx]['clog'] is not None:
-            prt = []
-            for path, ftype in WORKINGS[gxx]['clog']:
-                if path is not None:
-                    prt.append([path, []])
-                else:
-                    prt[-1][1].append(ftype)
-            for item in prt:
-                if item[1]:
-                    extra = ' ({} available)'.format(', '.join(item[1]))
-                else:
-                    extra = ''
-                HELP_GXX += dfmt.format(dtype='CHANGELOG', path=item[0],
-                                        extra=extra)
-        if WORKINGS[gxx]['docs'] is not None:
-            for dtype in WORKINGS[gxx]['docs']:
+        aliases[key] = gxx
+    return aliases
+
+
+def build_help_gxx(gversions: typing.Dict[str, typing.Any],
+                   aliases: typing.Dict[str, str],
+                   workings: typing.Dict[str, typing.Any]) -> str:
+    """Builds the documentation of the supported Gaussian versions.
+
+    Parameters
+    ----------
+    gversions : dict
+        Gaussian installations.
+    aliases : dict
+        Aliases for Gaussian versions.
+    workings : dict
+        Working trees.
+
+    Returns
+    -------
+    str
+        Help text for the Gaussian version option.
+    """
+    text = 'Absolute paths or the following keywords are supported:\n'
+    # Gaussian versions
+    fmt = '+ {kword:7s}: {label:22s} ({date}){extra}\n'
+    for gxx in gversions:
+        gname = gversions[gxx]['name']
+        gdate = gversions[gxx]['date'] or 'N/A'
+        if gxx == GDEFAULT:
+            ginfo = ' - default'
+        else:
+            ginfo = ''
+        text += fmt.format(kword=gxx, label=gname, date=gdate, extra=ginfo)
+    # Aliases
+    fmt = '+ {kword:7s}: Alias for "{gtag}"\n'
+    for gxx in aliases:
+        text += fmt.format(kword=gxx, gtag=aliases[gxx])
+    # Workings
+    fmt = '+ {kword:7s}: Working by {auth} for {label} (updated: {date})\n'
+    fmt2 = '    {{dtype:{:d}s}}: {{path}}{{extra}}\n'
+    for gxx in workings:
+        gname = workings[gxx]['name']
+        gdate = workings[gxx]['date'] or 'N/A'
+        gauth = workings[gxx]['auth'] or '<Unknown>'
+        text += fmt.format(kword=gxx, auth=gauth, label=gname, date=gdate)
+        # For a prettier output, try to align the colons between the different
+        #   docs.  So we calculate first the longest doctype.
+        if workings[gxx]['clog'] is not None:
+            l_doctype = 9
+        else:
+            l_doctype = 0
+        if workings[gxx]['docs'] is not None:
+            l_doctype = max(l_doctype,
+                            *[len(x) for x in workings[gxx]['docs']])
+        # Build format only if l_doctype > 0:
+        if l_doctype > 0:
+            dfmt = fmt2.format(l_doctype)
+            if workings[gxx]['clog'] is not None:
                 prt = []
-                for path, ftype in WORKINGS[gxx]['docs'][dtype]:
+                for path, ftype in workings[gxx]['clog']:
                     if path is not None:
                         prt.append([path, []])
                     else:
@@ -514,28 +736,494 @@ for gxx in WORKINGS:
                         extra = ' ({} available)'.format(', '.join(item[1]))
                     else:
                         extra = ''
-                    HELP_GXX += dfmt.format(dtype=dtype, path=item[0],
+                    text += dfmt.format(dtype='CHANGELOG', path=item[0],
+                                        extra=extra)
+            if workings[gxx]['docs'] is not None:
+                for dtype in workings[gxx]['docs']:
+                    prt = []
+                    for path, ftype in workings[gxx]['docs'][dtype]:
+                        if path is not None:
+                            prt.append([path, []])
+                        else:
+                            prt[-1][1].append(ftype)
+                    for item in prt:
+                        if item[1]:
+                            extra = ' ({} available)'.format(
+                                ', '.join(item[1]))
+                        else:
+                            extra = ''
+                        text += dfmt.format(dtype=dtype, path=item[0],
                                             extra=extra)
-# End of documentation block
-HELP_GXX += '+ Arbitrary path given by user\n'
+    # End of documentation block
+    text += '+ Arbitrary path given by user\n'
+
+    return text
+
+
+class ClusterContext(object):
+    """Represents the configuration of the cluster.
+
+    Gives access to the node families, queues, Gaussian installations and
+    working trees defined in the configuration files.
+    Each piece of information is only built when first requested, so that
+    the submission process (or any other tool importing this module) only
+    pays for what it actually uses.
+
+    Parameters
+    ----------
+    hpc_file : str, optional
+        HPC ini file.  By default, the user file or the system one.
+    gxx_files : list, optional
+        Gaussian ini files.  By default, the user and system files.
+    """
+    def __init__(self,
+                 hpc_file: typing.Optional[str] = None,
+                 gxx_files: typing.Optional[typing.List[str]] = None):
+        self.__hpc_file = hpc_file
+        self.__gxx_files = gxx_files
+        self.__hpcnodes = None
+        self.__hpcqueues = None
+        self.__gversions = None
+        self.__workings = None
+        self.__gxx_alias = GXX_ALIAS
+        self.__help_gxx = None
+        self.__help_queues = None
+        self.__manifest_file = None
+        self.__manifest = None
+        self.__costmodel_file = None
+        self.__costmodel = None
+
+    # ===================================
+    #   Decorators to access attributes
+    # ===================================
+    @property
+    def hpc_file(self) -> str:
+        """str: HPC ini file."""
+        if self.__hpc_file is None:
+            # We only support one file for HPC ini data, otherwise it would
+            #   risk creating confusion in case of inconsistent data.
+            fname = DEFAULT_PATHS['hpc_inifile']
+            if HPCINIFILE is not None:
+                res = os.path.join(os.getenv('HOME'), HPCINIFILE)
+                if os.path.exists(res):
+                    fname = res
+            if not os.path.exists(fname):
+                print('ERROR: Incorrect path to HPC nodes specification',
+                      'files.')
+                sys.exit()
+            self.__hpc_file = fname
+        return self.__hpc_file
+
+    @property
+    def gxx_files(self) -> typing.List[str]:
+        """list(str): Gaussian ini files."""
+        if self.__gxx_files is None:
+            # The user can set their own file to override what the system is
+            #   providing
+            self.__gxx_files = []
+            if GXXINIFILE is not None:
+                res = os.path.join(os.getenv('HOME'), GXXINIFILE)
+                if os.path.exists(res):
+                    self.__gxx_files.append(res)
+            self.__gxx_files.append(DEFAULT_PATHS['gxx_inifile'])
+        return self.__gxx_files
+
+    @property
+    def gxx_sources(self) -> typing.List[str]:
+        """list(str): Files contributing to the Gaussian configuration.
+
+        Contrary to `gxx_files`, the user file is always included, so its
+        creation can be detected.
+        """
+        files = self.gxx_files[:]
+        if GXXINIFILE is not None:
+            res = os.path.join(os.getenv('HOME'), GXXINIFILE)
+            if res not in files:
+                files.insert(0, res)
+        return files
+
+    @property
+    def hpcnodes(self) -> typing.Dict[str, hpc.NodeFamily]:
+        """dict(str: NodeFamily): Node families."""
+        if self.__hpcnodes is None:
+            fname = self.hpc_file
+            self.__hpcnodes, self.__hpcqueues = load_config_cache(
+                'hpcnodes', [fname, hpc.__file__],
+                lambda: parse_hpc_ini(fname))
+        return self.__hpcnodes
+
+    @property
+    def hpcqueues(self) -> typing.Dict[str, str]:
+        """dict(str: str): Queues with the corresponding node families."""
+        if self.__hpcqueues is None:
+            self.hpcnodes
+        return self.__hpcqueues
+
+    @property
+    def gversions(self) -> typing.Dict[str, typing.Any]:
+        """dict: Gaussian installations."""
+        if self.__gversions is None:
+            files = self.gxx_files
+            self.__gversions, self.__workings = load_config_cache(
+                'gxxconfig', self.gxx_sources, lambda: parse_gxx_ini(files),
+                (ANY_WORKING, ))
+            if GDEFAULT not in self.__gversions:
+                print('ERROR: Default version of Gaussian not present in',
+                      'config files')
+                sys.exit(1)
+        return self.__gversions
+
+    @property
+    def workings(self) -> typing.Dict[str, typing.Any]:
+        """dict: Working trees."""
+        if self.__workings is None:
+            self.gversions
+        return self.__workings
+
+    @property
+    def gxx_alias(self) -> typing.Dict[str, str]:
+        """dict(str: str): Aliases for Gaussian versions."""
+        if self.__gxx_alias is None:
+            self.__gxx_alias = build_gxx_alias(self.gversions)
+        return self.__gxx_alias
+
+    @property
+    def help_gxx(self) -> str:
+        """str: Documentation of the supported Gaussian versions."""
+        if self.__help_gxx is None:
+            # Changelogs and documentations are only relevant here, so they
+            #   are stored separately.
+            files = self.gxx_files
+            _, workings = load_config_cache(
+                'gxxdocs', self.gxx_sources,
+                lambda: parse_gxx_ini(files, docs=True), (ANY_WORKING, ))
+            self.__help_gxx = build_help_gxx(self.gversions, self.gxx_alias,
+                                             workings)
+        return self.__help_gxx
+
+    @property
+    def help_queues(self) -> str:
+        """str: Documentation of the supported queues."""
+        if self.__help_queues is None:
+            self.__help_queues = """Sets the queues.
+Available queues:
+{}
+
+Virtual queues defined as:
+<queue>[:[[nnodes]x][nprocs][+[ngpus]][:nodeid]]
+with:
+    <queue>: one of the queues above
+    nnodes: number of nodes (Linda parallel run)
+    nprocs: choice for number of processing units (per node)
+        - "H" : uses half of the cores of a single CPU
+        - "S" : uses a single core
+        - "0" : auto (same as empty)
+        - positive integer: total number of cores to use.
+        - negative integer: number of CPUs to use
+    ngpus: number of GPUs (all GPUs of the node if empty)
+""".format(', '.join(sorted(self.hpcqueues.keys())))
+        return self.__help_queues
+
+    @property
+    def manifest_file(self) -> typing.Optional[str]:
+        """str or None: Manifest file of the installations."""
+        if self.__manifest_file is None:
+            if MANIFESTFILE is not None:
+                res = os.path.join(os.getenv('HOME'), MANIFESTFILE)
+                if os.path.exists(res):
+                    self.__manifest_file = res
+            if self.__manifest_file is None:
+                self.__manifest_file = DEFAULT_PATHS['manifest']
+        return self.__manifest_file
+
+    @property
+    def manifest(self) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """dict or None: Manifest of the installations, if available."""
+        if self.__manifest is None and self.manifest_file is not None:
+            try:
+                with open(self.manifest_file, 'r') as fobj:
+                    self.__manifest = json.load(fobj)
+            except (OSError, ValueError):
+                # No usable manifest, the file system will be used
+                self.__manifest = {}
+        return self.__manifest or None
+
+    @property
+    def costmodel_file(self) -> typing.Optional[str]:
+        """str or None: Calibration file of the resource cost model."""
+        if self.__costmodel_file is None:
+            if COSTMODELFILE is not None:
+                res = os.path.join(os.getenv('HOME'), COSTMODELFILE)
+                if os.path.exists(res):
+                    self.__costmodel_file = res
+            if self.__costmodel_file is None:
+                self.__costmodel_file = DEFAULT_PATHS['costmodel']
+        return self.__costmodel_file
+
+    @property
+    def costmodel(self) -> typing.Dict[str, float]:
+        """dict: Calibration factors of the cost model, per method class."""
+        if self.__costmodel is None:
+            self.__costmodel = {}
+            if self.costmodel_file is not None:
+                try:
+                    with open(self.costmodel_file, 'r') as fobj:
+                        self.__costmodel = json.load(fobj)['factors']
+                except (OSError, ValueError, KeyError):
+                    # No calibration, the default model is used
+                    pass
+        return self.__costmodel
+
+    # ===========
+    #   Methods
+    # ===========
+
+    def sources(self) -> typing.List[str]:
+        """Returns the list of configuration files.
+
+        Returns
+        -------
+        list
+            Files whose modification would change the configuration.
+        """
+        files = [self.hpc_file] + self.gxx_sources
+        if self.manifest_file is not None:
+            files.append(self.manifest_file)
+        if self.costmodel_file is not None:
+            files.append(self.costmodel_file)
+        return files
+
+
+#  Gaussian-related definitions
+# -----------------------------
+GXX_FORMAT = re.compile(r'g(dv|\d{2})\.?\w\d{2}[p+]?')
+# Directories containing executables in a Gaussian installation and in a
+#   working tree
+GXX_TREE_DIRS = {
+    'gaussian': ('', 'bsd', 'local', 'extras'),
+    'working': ('l1', 'exe-dir'),
+}
+# Here-document used to write an embedded input on the computing node.
+# The delimiter is quoted to prevent any expansion of the input content.
+EMBED_FORMAT = """cat > {gjf} << 'GXX_QSUB_{pid}_{index}'
+{text}GXX_QSUB_{pid}_{index}
+"""
+# Input scanning: lines to process in the body of a Link1 block (Link0
+#   directives, new block) and file references used by links 717/718.
+GJF_BODY_STOP = re.compile(rb'^[ \t]*(?:%|--link1--[ \t]*\r?$)',
+                           re.M | re.I)
+GJF_BLANK = re.compile(rb'^[ \t]*\r?\n', re.M)
+GJF_FILE_REF = re.compile(
+    rb'^[ \t]*([^\s.]\S*\.(?:chk|dat|log|out|fch|rwf)[^\s./]*)[ \t]*\r?$',
+    re.M)
+# Resource cost model
+# Number of basis functions per atom (average over H and 2nd-row atoms)
+COST_BASIS = {
+    'sto-3g': 4, '3-21g': 7, '6-31g': 7, '6-31g(d)': 12, '6-31g(d,p)': 13,
+    '6-31+g(d)': 15, '6-31+g(d,p)': 16, '6-311g(d,p)': 16,
+    '6-311+g(d,p)': 19, '6-311++g(d,p)': 20, '6-311+g(2df,2p)': 30,
+    'cc-pvdz': 14, 'aug-cc-pvdz': 23, 'cc-pvtz': 30, 'aug-cc-pvtz': 46,
+    'cc-pvqz': 55, 'aug-cc-pvqz': 80, 'jun-cc-pvtz': 40, 'def2svp': 14,
+    'def2tzvp': 26, 'def2tzvpp': 30, 'def2qzvp': 55, 'sndzp': 16,
+    'n07d': 16, 'lanl2dz': 8, 'gen': 20, 'genecp': 20,
+}
+# Method classes, checked in order on the keywords of the route section
+COST_METHODS = (
+    ('semi', re.compile(r'(am1|pm3|pm6|pm7|pddg|mndo|indo|cndo|zindo|dftb'
+                        r'|uff|amber|dreiding)')),
+    ('cc', re.compile(r'(ccsd|ccd|qcisd|cisd|mp4|mp5|eom|bd|sac-ci)')),
+    ('cas', re.compile(r'(cas|rasscf)')),
+    ('mp2', re.compile(r'(mp2|mp3|b2plyp|mpw2plyp|dsd|ri-mp2)')),
+    ('hf', re.compile(r'hf$')),
+)
+# Parameters for each class: memory, disk, time coefficients, time power
+COST_PARAMS = {
+    'semi': (1., 1., 1.e-6, 3),
+    'hf': (4., 20., 2.e-7, 3.5),
+    'dft': (6., 20., 4.e-7, 3.5),
+    'mp2': (10., 40., 1.e-8, 4.5),
+    'cc': (20., 80., 1.e-10, 6),
+    'cas': (20., 80., 1.e-9, 5),
+}
+# Default number of atoms if not available and minimum memory (in bytes)
+COST_DEFAULT_ATOMS = 20
+COST_MIN_MEM = 1024**3
+# Gaussian output: data used for the calibration
+LOG_PATTERNS = {
+    'natoms': re.compile(r'NAtoms=\s*(\d+)'),
+    'nbasis': re.compile(r'^\s+(\d+) basis functions'),
+    'mult': re.compile(r'Multiplicity\s*=\s*(\d+)'),
+    'cputime': re.compile(r'Job cpu time:\s*(\d+) days\s*(\d+) hours\s*'
+                          r'(\d+) minutes\s*([\d.]+) seconds'),
+}
+# Copy command for staging: uses copy-on-write (reflink) when available
+STAGE_COPY = 'cp -p --reflink=auto {src} {dst} || cp -p {src} {dst}'
+# Compressed storage of checkpoint and read-write files (--compress).
+# Supported formats, by order of preference: zstd, gzip (pigz, gzip or
+#   Python if no tool is available on the computing node).
+STAGE_ZIP_EXTS = ('.zst', '.gz')
+STAGE_ZIP_FILES = re.compile(r'\.(?:chk|rwf)$', re.I)
+# Shell functions used by the transfers of compressed files:
+# - gxx_get file link: stages in file, decompressed if needed.
+# - gxx_put file dir skip: copies back file compressed, unless unchanged.
+# The modification times are kept to detect unchanged files.
+STAGE_ZIP_FUNCS = """\
+pyzip='import gzip, shutil, sys
+fin, fout = sys.argv[2:]
+if sys.argv[1] == "c":
+    fi, fo = open(fin, "rb"), gzip.open(fout, "wb", 1)
+else:
+    fi, fo = gzip.open(fin, "rb"), open(fout, "wb")
+with fi, fo:
+    shutil.copyfileobj(fi, fo)'
+has() { command -v $1 > /dev/null 2>&1; }
+gxx_get() {
+    b=`basename $1`
+    if test -f $1; then
+        test $2 = 1 && ln -f $1 ./ || cp -p --reflink=auto $1 ./ \\
+            || cp -p $1 ./
+    elif test -f $1.zst; then
+        zstd -q -d -c $1.zst > $b && touch -r $1.zst $b
+    else
+        if has pigz; then pigz -d -c $1.gz > $b
+        elif has gzip; then gzip -d -c $1.gz > $b
+        else python3 -c "$pyzip" d $1.gz $b
+        fi && touch -r $1.gz $b
+    fi
+}
+gxx_put() {
+    b=`basename $1`
+    test -f $1 || return 0
+    if test $3 = 1; then
+        for f in $2/$b $2/$b.zst $2/$b.gz; do
+            if test -f $f && test ! $1 -nt $f; then return 0; fi
+        done
+    fi
+    if has zstd; then e=.zst; zstd -q -T0 -c $1 > $2/$b$e.tmp
+    elif has pigz; then e=.gz; pigz -1 -c $1 > $2/$b$e.tmp
+    elif has gzip; then e=.gz; gzip -1 -c $1 > $2/$b$e.tmp
+    else e=.gz; python3 -c "$pyzip" c $1 $2/$b$e.tmp
+    fi || return 1
+    touch -r $1 $2/$b$e.tmp && mv -f $2/$b$e.tmp $2/$b$e || return 1
+    for f in $2/$b $2/$b.zst $2/$b.gz; do
+        test $f = $2/$b$e || rm -f $f
+    done
+}
+"""
+# Marker left in the scratch directory if some files could not be copied back
+STAGE_FAILED = 'GXX_STAGE.failed'
+# Pilot jobs (bash): each slot claims the tasks of the spool by moving them
+#   (atomic renaming), so concurrent slots and pilots never share a task.
+# {check} is replaced by the check of the wall time budget (PILOT_CHECK).
+PILOT_SLOT = """\
+gxx_slot() {{
+    skip=' '
+    while true; do
+        item=''
+        for task in `ls {spool}/queue 2> /dev/null`; do
+            case "$skip" in *" $task "*) continue;; esac
+            if mv {spool}/queue/$task {spool}/running/$task 2> /dev/null
+            then
+                item=$task
+                break
+            fi
+        done
+        test -z "$item" && break
+        task={spool}/running/$item
+{check}        echo "Slot $1: running $item"
+        if bash $task > {spool}/logs/$item.log 2>&1; then
+            mv $task {spool}/done/
+        else
+            mv $task {spool}/failed/
+        fi
+    done
+}}
+"""
+PILOT_CHECK = """\
+        est=`sed -n 's/^# GXX_WALLTIME=//p' $task`
+        if test $((`date +%s` - GXX_START + ${{est:-0}} + {margin})) \\
+                -gt {budget}; then
+            mv $task {spool}/queue/$item
+            skip="$skip$item "
+            echo "Slot $1: not enough time left for $item"
+            continue
+        fi
+"""
+PILOT_DIRS = ('queue', 'running', 'done', 'failed', 'logs')
+# Multi-node (Linda) jobs, valid in csh and bash: the first node listed in
+#   PBS_NODEFILE runs the job, the others only host Linda workers.
+# - LINDA_NODES: runs a command on each of the other nodes.
+# - LINDA_WORKERS: adds the nodes as Linda workers next to each %NProcShared.
+LINDA_NODES = 'uniq $PBS_NODEFILE | tail -n +2 | xargs -I{{}} ssh -n {{}} ' \
+    + '{}\n'
+LINDA_WORKERS = 'sed -i "/^%[Nn][Pp][Rr][Oo][Cc]/i %LindaWorkers=' \
+    + '`uniq $PBS_NODEFILE | paste -sd, -`" {}\n'
+# Route section: print level, separators around "=", model chemistry
+ROUTE_PRINT = re.compile(r'^#\s*(?P<level>[NPT]\b)?', re.I)
+ROUTE_EQUAL = re.compile(r'\s*([=:])\s*')
+ROUTE_MODEL = re.compile(r'^(?P<method>[^/=():]+)/(?P<basis>[^/=:]+)$')
+ROUTE_KEYWORD = re.compile(
+    r'^(?P<key>[^=():]+?)(?:[=:]?\((?P<opts>.*)\)|[=:](?P<opt>[^()]*))?$')
+
+#  Cluster configuration
+# -----------------------
+# The configuration is only parsed when needed.
+CONTEXT = ClusterContext()
 
 
 # ====================
 #   PARSER DEFINITON
 # ====================
-def build_parser():
+class LazyHelpAction(argparse.Action):
+    """Prints the help message, completing it first.
+
+    Some parts of the help message require to parse the configuration
+    files.  They are only built when the help is actually requested.
+    The functions building the help of each option are given in
+    `builders`, as a dictionary {option action: function}.
+    """
+    def __init__(self,
+                 option_strings: typing.List[str],
+                 dest: str = argparse.SUPPRESS,
+                 default: str = argparse.SUPPRESS,
+                 help: typing.Optional[str] = None):
+        super(LazyHelpAction, self).__init__(
+            option_strings=option_strings, dest=dest, default=default,
+            nargs=0, help=help)
+        self.builders = {}
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        for action, builder in self.builders.items():
+            action.help = builder()
+        parser.print_help()
+        parser.exit()
+
+
+def build_parser(ctx: typing.Optional[ClusterContext] = None
+                 ) -> argparse.ArgumentParser:
     """Builds options parser.
 
     Builds the full option parser.
 
+    Parameters
+    ----------
+    ctx : ClusterContext, optional
+        Cluster configuration, used for the help.
+
     Returns
     -------
     :obj:`ArgumentParser`
         `ArgumentParser` object
     """
+    if ctx is None:
+        ctx = CONTEXT
     parser = argparse.ArgumentParser(
             prog=PROGNAME,
-            formatter_class=argparse.RawTextHelpFormatter)
+            formatter_class=argparse.RawTextHelpFormatter,
+            add_help=False)
+    helper = parser.add_argument(
+        '-h', '--help', action=LazyHelpAction,
+        help='show this help message and exit')
     #  MANDATORY ARGUMENTS
     # ---------------------
     parser.add_argument('infile', help="Gaussian input file(s)", nargs='*')
@@ -557,11 +1245,51 @@ def build_parser():
         '-M', '--mach', dest='mach', action='store_true',
         help='Prints technical info on the machines available in the cluster')
     queue.add_argument(
-        '--multi', choices=('parallel', 'serial'),
-        help='Runs multiple jobs in a single submission')
+        '--multi', choices=('parallel', 'serial', 'pack'),
+        help='''\
+Runs multiple jobs in a single submission.
+"pack" runs them in parallel with resources proportional to their
+  estimated cost, over several submissions if they do not fit on a node.''')
+    queue.add_argument(
+        '--depend', dest='depend', action='store_true',
+        help='''\
+Submits each input file as a separate job, started after the jobs
+producing the files it uses (checkpoint, read-write...).''')
+    queue.add_argument(
+        '--array', dest='array', action='store_true',
+        help='''\
+Submits the input files as a single PBS array job, each sub-job running
+one input. All inputs must need the same resources.''')
+    queue.add_argument(
+        '--pilot', dest='pilot', type=int, nargs='?', const=PILOT_SLOTS,
+        metavar='SLOTS',
+        help='''\
+With input files, adds them to the task queue of pilot jobs, sized to
+  run SLOTS at once on a node (default: %(const)s).
+Without input files, submits a pilot job running the tasks of the queue,
+  SLOTS at once, until the queue is empty.''')
+    queue.add_argument(
+        '--budget', dest='budget', type=float, metavar='HOURS',
+        help='Wall time of a pilot job (no new task started near the end).')
+    queue.add_argument(
+        '--auto-size', dest='autosize', action='store_true',
+        help='''\
+Sets the number of processors and the memory from the resources
+estimated for the calculations in the input file(s).''')
+    queue.add_argument(
+        '--after', dest='after', action='append', metavar='JOBID',
+        help='Starts the job after the successful end of the given job.')
     queue.add_argument(
         '--node', dest='node', type=int,
         help='Name of a specific node (ex: curie01)')
+    queue.add_argument(
+        '--nodes', dest='nodes', type=int, metavar='NUM',
+        help='''\
+Number of nodes, used as Linda workers (processors and memory
+  given per node).''')
+    queue.add_argument(
+        '--gpus', dest='gpus', type=int, metavar='NUM',
+        help='Number of GPUs, each one controlled by a core of the job.')
     queue.add_argument(
         '--group', dest='group', type=str,
         help='User group')
@@ -571,10 +1299,16 @@ def build_parser():
     queue.add_argument(
         '-P', '--print', dest='prtinfo', action='store_true',
         help='Print information about the submission process')
-    queue.add_argument(
+    res = queue.add_argument(
         '-q', '--queue', dest='queue', default='q02zewail',
-        help='{}\n{}'.format('Sets the queue type.', HELP_QUEUES),
-        metavar='QUEUE')
+        help='Sets the queue type.', metavar='QUEUE')
+    helper.builders[res] = lambda: '{}\n{}'.format('Sets the queue type.',
+                                                   ctx.help_queues)
+    queue.add_argument(
+        '--weights', dest='weights', metavar='W1,W2,...',
+        help='''\
+Relative weights of the input files, separated by commas, used instead
+  of the estimated costs by "--multi pack".''')
     queue.add_argument(
         '-S', '--silent', dest='silent', action='store_true',
         help='''\
@@ -583,15 +1317,47 @@ WARNING: The consequence will be a loss of these outputs''')
     # Expert options
     # ^^^^^^^^^^^^^^
     expert = parser.add_argument_group('expert usage')
+    expert.add_argument(
+        '--calibrate', dest='calibrate', nargs='+', metavar='LOGFILE',
+        help='''\
+Calibrates the resource cost model from the output of completed jobs.
+The calibration is stored in the user's home directory.''')
+    expert.add_argument(
+        '--chksync', dest='chksync', type=int, nargs='?',
+        const=CHKSYNC_INTERVAL, metavar='MINUTES',
+        help='''\
+Copies periodically the modified checkpoint files back during the job.
+Default interval: %(const)s min.''')
+    expert.add_argument(
+        '--compress', dest='compress', action='store_true',
+        help='''\
+Stores the checkpoint and read-write files compressed after the job.
+Compressed files are automatically decompressed on the computing node.''')
     expert.add_argument(
         '--cpto', dest='cpto', nargs='+',
         help='Files to be copied to the local scratch (dumb copy, no check)')
     expert.add_argument(
         '--cpfrom', dest='cpfrom', nargs='+',
         help='Files to be copied from the local scratch (dumb copy, no check)')
+    expert.add_argument(
+        '--embed', dest='embed', action='store_true',
+        help='''\
+Embeds the processed input(s) in the job script instead of writing
+temporary input files next to the original ones.''')
+    expert.add_argument(
+        '--mkmanifest', dest='mkmanifest', nargs='?', const='',
+        metavar='MANIFEST',
+        help='''\
+Builds the manifest of the Gaussian installations and working trees.
+By default, the file is stored in the system location.''')
     expert.add_argument(
         '--nojob', dest='nojob', action='store_true',
         help='Do not run job. Simply generate the input sequence.')
+    expert.add_argument(
+        '--scratch', dest='scratch', metavar='SIZE',
+        help='''\
+Scratch storage needed by Gaussian (ex: 200GB), checked on the node
+  with the files to stage in before running Gaussian.''')
     expert.add_argument(
         '-X', '--expert', dest='expert', action='count',
         help='''\
@@ -604,11 +1370,12 @@ Expert use. Can be cumulated.
     gaussian.add_argument(
         '-c', '--chk', dest='gxxchk', metavar='CHK_FILENAME',
         help='Sets the checkpoint filename')
-    gaussian.add_argument(
+    res = gaussian.add_argument(
         '-g', '--gxxroot', dest='gxxver', metavar='GAUSSIAN',
         default=GDEFAULT,
-        help='{}\n{}'.format('Sets the path to the Gaussian executables.',
-                             HELP_GXX))
+        help='Sets the path to the Gaussian executables.')
+    helper.builders[res] = lambda: '{}\n{}'.format(
+        'Sets the path to the Gaussian executables.', ctx.help_gxx)
     gaussian.add_argument(
         '-i', '--ignore', dest='gxxl0I', nargs='+', metavar='L0_IGNORE',
         choices=['c', 'chk', 'r', 'rwf', 'a', 'all'],
@@ -658,70 +1425,536 @@ WARNING: The script expects a working tree structure as intended in the
          Gaussian developer manual.
 ''')
 
+    # Files produced by previous jobs (see --depend), resources of the
+    #   packed inputs (see --multi pack) and sub-jobs of array jobs (see
+    #   --array)
+    parser.set_defaults(produced=None, packing=None, subjob=False)
     return parser
 
 
-# ==========================
-#   PATH-RELATED FUNCTIONS
-# ==========================
-def set_gxx_env(gxxroot: str) -> typing.List[str]:
-    """Sets Gaussian-related environment variables.
+# ==============================
+#   MANIFEST-RELATED FUNCTIONS
+# ==============================
+def scan_tree(rootdir: str,
+              kind: str) -> typing.Dict[str, typing.Any]:
+    """Scans a Gaussian installation or working tree.
 
-    Sets Gaussian-related environment variables and returns the list
-        of environment variables to be passed by PBS.
+    Records the executable directories of a tree, with their modification
+    times and a checksum of their content (names, sizes and modification
+    times of the files).
 
     Parameters
     ----------
-    gxxroot : str
-        Gaussian root directory
+    rootdir : str
+        Root directory of the tree.
+    kind : str
+        Type of tree: "gaussian" or "working".
 
     Returns
     -------
-    list
-        List of environment variables to be passed by PBS to node.
+    dict
+        Description of the tree, with:
+        - valid: True if the tree is usable
+        - dirs: information on each executable directory
     """
-    dirlist = [os.path.join(gxxroot, f)
-               for f in ['bsd', 'local', 'extras', '']]
-    GAUSS_EXEDIR = os.pathsep.join(dirlist)
-    os.environ['GAUSS_EXEDIR'] = GAUSS_EXEDIR
-    os.environ['GAU_ARCHDIR'] = os.path.join(gxxroot, 'arch')
-    if 'PATH' in os.environ:
-        os.environ['PATH'] = os.pathsep.join([GAUSS_EXEDIR,
-                                              os.environ['PATH']])
+    dirs = {}
+    for dname in GXX_TREE_DIRS[kind]:
+        path = os.path.join(rootdir, dname)
+        info = {'path': path, 'exists': os.path.isdir(path)}
+        if info['exists']:
+            checksum = hashlib.sha1()
+            with os.scandir(path) as entries:
+                for entry in sorted(entries, key=lambda x: x.name):
+                    if entry.is_file():
+                        stat = entry.stat()
+                        checksum.update('{}:{}:{}\n'.format(
+                            entry.name, stat.st_size,
+                            int(stat.st_mtime)).encode())
+            info['mtime'] = int(os.stat(path).st_mtime)
+            info['checksum'] = checksum.hexdigest()
+        dirs[dname or '.'] = info
+    if kind == 'gaussian':
+        # The main executable is expected in the root directory
+        gexe = os.path.join(rootdir, os.path.basename(rootdir))
+        valid = os.path.isfile(gexe) and dirs['bsd']['exists']
     else:
-        os.environ['PATH'] = GAUSS_EXEDIR
-    if 'LD_LIBRARY_PATH' in os.environ:
-        os.environ['LD_LIBRARY_PATH'] = \
-            os.pathsep.join([GAUSS_EXEDIR, os.environ['LD_LIBRARY_PATH']])
+        valid = dirs['l1']['exists'] or dirs['exe-dir']['exists']
+    return {'kind': kind, 'valid': valid, 'dirs': dirs}
+
+
+def build_manifest(ctx: typing.Optional[ClusterContext] = None
+                   ) -> typing.Dict[str, typing.Any]:
+    """Builds the manifest of the Gaussian installations and workings.
+
+    Scans once each Gaussian installation and working tree for every
+    supported machine architecture.
+
+    Parameters
+    ----------
+    ctx : ClusterContext, optional
+        Cluster configuration.
+
+    Returns
+    -------
+    dict
+        Manifest, with the trees stored by normalized root directory (see
+        `tree_status`).
+    """
+    if ctx is None:
+        ctx = CONTEXT
+    trees = {}
+    for key, info in ctx.gversions.items():
+        for mach in info['mach'] or [None]:
+            if mach is None:
+                path = os.path.join(info['path'], info['gdir'])
+            else:
+                path = os.path.join(info['path'], mach, info['gdir'])
+            path = os.path.normpath(path)
+            trees[path] = scan_tree(path, 'gaussian')
+            trees[path].update({'key': key, 'mach': mach})
+    for key, info in ctx.workings.items():
+        for mach in info['mach'] or [None]:
+            if mach is None:
+                path = info['path']
+            else:
+                path = os.path.join(info['path'], mach)
+            path = os.path.normpath(path)
+            trees[path] = scan_tree(path, 'working')
+            trees[path].update({'key': key, 'mach': mach})
+    return {'version': VERSION, 'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'trees': trees}
+
+
+def tree_status(path: str,
+                manifest: typing.Optional[typing.Dict[str, typing.Any]]
+                ) -> typing.Optional[bool]:
+    """Returns the status of a tree recorded in the manifest.
+
+    Parameters
+    ----------
+    path : str
+        Root directory of the tree.
+    manifest : dict, optional
+        Manifest of the installations.
+
+    Returns
+    -------
+    bool or None
+        True if the tree is valid, False if broken, None if unknown.
+    """
+    if manifest is None:
+        return None
+    info = manifest['trees'].get(os.path.normpath(path))
+    if info is None:
+        return None
+    return info['valid']
+
+
+# ===========================
+#   ROUTE-RELATED FUNCTIONS
+# ===========================
+class Route(object):
+    """Route specification section of a Gaussian input.
+
+    Stores the route specification as a structured object, with the
+    model chemistry (method and basis set) and the keywords with their
+    options.  Keywords and options are stored in lowercase.
+    Keywords can be queried with their abbreviated forms (ex: "freq" for
+    "frequency").
+
+    Attributes
+    ----------
+    level : str
+        Print level ("n", "p", "t").
+    method : str or None
+        Electronic structure method, if given as "method/basis".
+    basis : str or None
+        Basis set, if given as "method/basis".
+    keywords : dict
+        Options for each keyword, as lists of "name" or "name=value".
+    """
+    def __init__(self, route: str = '') -> None:
+        self.level = 'n'
+        self.method = None
+        self.basis = None
+        self.keywords = {}
+        if route:
+            self.parse(route)
+
+    def __repr__(self) -> str:
+        fmt = 'Route(level={}, method={}, basis={}, keywords={})'
+        return fmt.format(self.level, self.method, self.basis, self.keywords)
+
+    @staticmethod
+    def split(text: str, sep: str = ' ') -> typing.List[str]:
+        """Splits a text on separators outside parentheses.
+
+        Parameters
+        ----------
+        text : str
+            Text to split.
+        sep : str, optional
+            List of separators (single characters).
+
+        Returns
+        -------
+        list
+            Non-empty tokens.
+        """
+        tokens = []
+        depth = 0
+        start = 0
+        for i, char in enumerate(text):
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth = max(depth - 1, 0)
+            elif char in sep and depth == 0:
+                tokens.append(text[start:i])
+                start = i + 1
+        tokens.append(text[start:])
+        return [item.strip() for item in tokens if item.strip()]
+
+    def parse(self, route: str) -> None:
+        """Parses a route specification section.
+
+        Parameters
+        ----------
+        route : str
+            Route specification, possibly spanning several lines.
+        """
+        text = ' '.join(route.split()).lower()
+        res = ROUTE_PRINT.match(text)
+        if res:
+            self.level = res.group('level') or self.level
+            text = text[res.end():]
+        text = ROUTE_EQUAL.sub(r'\1', text)
+        for token in self.split(text, ' \t'):
+            res = ROUTE_MODEL.match(token)
+            if res and not token.startswith('iop'):
+                self.method = res.group('method')
+                self.basis = res.group('basis')
+                continue
+            res = ROUTE_KEYWORD.match(token)
+            if res is None:
+                # Unbalanced parentheses, keep the token as keyword
+                self.keywords.setdefault(token, [])
+                continue
+            opts = self.keywords.setdefault(res.group('key'), [])
+            if res.group('opts') is not None:
+                opts.extend(self.split(res.group('opts'), ','))
+            elif res.group('opt'):
+                opts.append(res.group('opt'))
+
+    def find(self, keyword: str) -> typing.Optional[str]:
+        """Finds a keyword, possibly given in an abbreviated form.
+
+        Parameters
+        ----------
+        keyword : str
+            Shortest accepted form of the keyword (ex: "freq").
+
+        Returns
+        -------
+        str or None
+            Keyword as written in the route section, None if absent.
+        """
+        keyword = keyword.lower()
+        for key in self.keywords:
+            if key.startswith(keyword):
+                return key
+        return None
+
+    def has(self, keyword: str, option: typing.Optional[str] = None
+            ) -> bool:
+        """Checks if a keyword, and optionally an option, is present.
+
+        Parameters
+        ----------
+        keyword : str
+            Shortest accepted form of the keyword.
+        option : str, optional
+            Name of the option (before any "=").
+
+        Returns
+        -------
+        bool
+            True if the keyword (with the option) is present.
+        """
+        key = self.find(keyword)
+        if key is None:
+            return False
+        if option is None:
+            return True
+        return option.lower() in self.option_names(key)
+
+    def options(self, keyword: str) -> typing.List[str]:
+        """Returns the options of a keyword.
+
+        Parameters
+        ----------
+        keyword : str
+            Shortest accepted form of the keyword.
+
+        Returns
+        -------
+        list
+            Options of the keyword, empty if keyword absent.
+        """
+        key = self.find(keyword)
+        if key is None:
+            return []
+        return self.keywords[key]
+
+    def option_names(self, keyword: str) -> typing.Set[str]:
+        """Returns the names of the options of a keyword.
+
+        Parameters
+        ----------
+        keyword : str
+            Shortest accepted form of the keyword.
+
+        Returns
+        -------
+        set
+            Names of the options (without values).
+        """
+        return {item.split('=')[0] for item in self.options(keyword)}
+
+    def mentions(self, word: str) -> bool:
+        """Checks if a word is used as keyword or option.
+
+        Parameters
+        ----------
+        word : str
+            Keyword or option to search.
+
+        Returns
+        -------
+        bool
+            True if the word is used anywhere in the route section.
+        """
+        word = word.lower()
+        if word in self.keywords:
+            return True
+        return any(word in self.option_names(key) for key in self.keywords)
+
+    @property
+    def use717(self) -> bool:
+        """bool: Link 717 (anharmonic treatment) will be used."""
+        return bool(self.option_names('freq') & {'readanh', 'anharm',
+                                                 'anharmonic'})
+
+    @property
+    def opt717(self) -> bool:
+        """bool: Link 717 option section present in input."""
+        return bool(self.option_names('freq') & {'anharm', 'anharmonic'})
+
+    @property
+    def use718(self) -> bool:
+        """bool: Link 718 (vibronic spectra) will be used."""
+        return bool(self.option_names('freq') & {'fc', 'fcht', 'ht',
+                                                 'readfcht'})
+
+    @property
+    def opt718(self) -> bool:
+        """bool: Link 718 option section present in input."""
+        return 'readfcht' in self.option_names('freq')
+
+
+# ==========================
+#   PATH-RELATED FUNCTIONS
+# ==========================
+def set_gxx_env(gxxroot: str,
+                env: typing.Dict[str, str]) -> typing.List[str]:
+    """Sets Gaussian-related environment variables.
+
+    Sets Gaussian-related environment variables of a job and returns
+        the list of environment variables to be passed by PBS.
+    The variables are built from the environment of the process, which
+        is not modified, so jobs built in the same process do not share
+        their settings.
+
+    Parameters
+    ----------
+    gxxroot : str
+        Gaussian root directory
+    env : dict
+        Environment variables of the job, completed in place.
+
+    Returns
+    -------
+    list
+        List of environment variables to be passed by PBS to node.
+    """
+    dirlist = [os.path.join(gxxroot, f)
+               for f in ['bsd', 'local', 'extras', '']]
+    GAUSS_EXEDIR = os.pathsep.join(dirlist)
+    env['GAUSS_EXEDIR'] = GAUSS_EXEDIR
+    env['GAU_ARCHDIR'] = os.path.join(gxxroot, 'arch')
+    if 'PATH' in os.environ:
+        env['PATH'] = os.pathsep.join([GAUSS_EXEDIR, os.environ['PATH']])
     else:
-        os.environ['LD_LIBRARY_PATH'] = GAUSS_EXEDIR
+        env['PATH'] = GAUSS_EXEDIR
+    if 'LD_LIBRARY_PATH' in os.environ:
+        env['LD_LIBRARY_PATH'] = \
+            os.pathsep.join([GAUSS_EXEDIR, os.environ['LD_LIBRARY_PATH']])
+    else:
+        env['LD_LIBRARY_PATH'] = GAUSS_EXEDIR
 
     return ["PATH", "LD_LIBRARY_PATH", "GAUSS_EXEDIR", "GAU_ARCHDIR"]
 
 
-def check_gjf(gjf_ref: str,
-              gjf_new: str,
-              dat_P: typing.Optional[int] = None,
+def load_input_cache(key: str
+                     ) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    """Loads the analysis of an input file from the cache.
+
+    Parameters
+    ----------
+    key : str
+        Hash of the input content and of the analysis parameters.
+
+    Returns
+    -------
+    dict or None
+        Analysis as returned by `parse_gjf`, with the new input (`text`) and
+        the messages (`output`), None if not in cache.
+    """
+    if CACHEDIR is None or INPUT_CACHE_SIZE is None:
+        return None
+    fname = os.path.join(CACHEDIR, 'inputs', key + '.pickle')
+    try:
+        with open(fname, 'rb') as fobj:
+            data = pickle.load(fobj)
+        # The modification time is used to track the last use
+        os.utime(fname)
+    except Exception:
+        return None
+    routes = []
+    for attrs in data['routes']:
+        route = Route()
+        route.__dict__.update(attrs)
+        routes.append(route)
+    data['routes'] = routes
+    return data
+
+
+def save_input_cache(key: str,
+                     data: typing.Dict[str, typing.Any]) -> None:
+    """Stores the analysis of an input file in the cache.
+
+    The least recently used entries are removed when the total size of
+    the cache exceeds `INPUT_CACHE_SIZE`.
+
+    Parameters
+    ----------
+    key : str
+        Hash of the input content and of the analysis parameters.
+    data : dict
+        Analysis as returned by `parse_gjf`.
+    """
+    if CACHEDIR is None or INPUT_CACHE_SIZE is None:
+        return
+    dname = os.path.join(CACHEDIR, 'inputs')
+    fname = os.path.join(dname, key + '.pickle')
+    tmpfile = '{}.{}'.format(fname, os.getpid())
+    try:
+        os.makedirs(dname, exist_ok=True)
+        # Routes are stored as simple dictionaries, so the cache is shared
+        #   by the script and the module (daemon) versions.
+        data = dict(data, routes=[vars(item) for item in data['routes']])
+        with open(tmpfile, 'wb') as fobj:
+            pickle.dump(data, fobj, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfile, fname)
+        entries = []
+        with os.scandir(dname) as items:
+            for item in items:
+                info = item.stat()
+                entries.append((info.st_mtime, info.st_size, item.path))
+        size = sum(item[1] for item in entries)
+        for _, fsize, path in sorted(entries):
+            if size <= INPUT_CACHE_SIZE:
+                break
+            os.remove(path)
+            size -= fsize
+    except (OSError, pickle.PicklingError):
+        try:
+            os.remove(tmpfile)
+        except OSError:
+            pass
+
+
+def scan_molecule(buf: typing.Union[bytes, mmap.mmap],
+                  pos: int,
+                  route: Route) -> typing.Dict[str, typing.Optional[int]]:
+    """Extracts basic information on the molecule of a Link1 block.
+
+    Reads the charge, multiplicity and number of atoms from the
+    molecule specification following the title section.
+
+    Parameters
+    ----------
+    buf : bytes or mmap
+        Content of the input file.
+    pos : int
+        Position of the beginning of the title section.
+    route : Route
+        Route specification of the Link1 block.
+
+    Returns
+    -------
+    dict
+        Charge (`charge`), multiplicity (`mult`) and number of atoms
+        (`natoms`), None if not available in the input.
+    """
+    data = {'charge': None, 'mult': None, 'natoms': None}
+    geom = route.option_names('geom')
+    if geom & {'allcheck', 'allchk'}:
+        return data
+    res = GJF_BLANK.search(buf, pos)
+    if res is None:
+        return data
+    start = res.end()
+    res = GJF_BLANK.search(buf, start)
+    section = buf[start:res.start() if res else len(buf)]
+    items = section.split(b'\n', 1)
+    try:
+        charge, mult = items[0].split()[:2]
+        data['charge'], data['mult'] = int(charge), int(mult)
+    except ValueError:
+        return data
+    if len(items) > 1 and not geom & {'check', 'checkpoint'}:
+        data['natoms'] = len(items[1].splitlines())
+    return data
+
+
+def parse_gjf(buf: typing.Union[bytes, mmap.mmap],
+              fobjw: typing.IO[str],
+              dat_P: typing.Optional[typing.Union[int, str]] = None,
               dat_M: typing.Optional[str] = None,
               file_chk: typing.Optional[typing.Union[str, bool]] = None,
               file_rwf: typing.Optional[typing.Union[str, bool]] = None,
-              rootdir: typing.Optional[str] = None
-              ) -> typing.Tuple[int, str, typing.List[typing.List[str]]]:
-    """Analyses and completes Gaussian input.
+              gpu_cpu: typing.Optional[str] = None
+              ) -> typing.Dict[str, typing.Any]:
+    """Parses and completes the content of a Gaussian input.
 
-    Checks and modifies a Gaussian input file and extracts relevant
-        information for the submission script:
-    - Hardware resources to be be read from the input file
-    - Files to copy.
+    Writes the new input with the Link0 directives and collects the
+        files referenced in the input.
+    The result only depends on the content and the arguments, and does
+        not access the file system.
+    Only the Link0 and route sections are processed line by line.  The
+        rest of each Link1 block is located with byte-level searches and
+        copied in bulk, so large inputs can be memory-mapped.
 
     Parameters
     ----------
-    gjf_ref : str
-        Reference input file
-    gjf_new : str
-        New input file where completed Gaussian directives are stored.
-    dat_P : int, optional
-        Number of processors to request in Gaussian job.
+    buf : bytes or mmap
+        Content of the reference input file.
+    fobjw : file object
+        Text stream where the new input is written.
+    dat_P : int or str, optional
+        Number of processors to request in Gaussian job, or list of
+        cores (ex: "0-5,12-17") to pin the processes (%CPU).
         Otherwise, use the value in reference input file.
     dat_M : str, optional
         Memory requirement.
@@ -732,105 +1965,97 @@ def check_gjf(gjf_ref: str,
     file_rwf : str or bool, optional
         Checkpoint file to use
         If None, do not specify it in input
-    rootdir : str, optional
-        Root directory to look for files
+        A multi-file specification ("dir1/,size1,dir2/,size2") replaces
+        the read-write files of the input and is kept on the node.
+    gpu_cpu : str, optional
+        GPUs and their controlling cores (ex: "0-1=0,6", %GPUCPU).
+        Otherwise, use the value in reference input file.
 
     Returns
     -------
-    tuple
+    dict
         The following information are returned:
-        - number of processors actually requested
-        - actual memory requirements
-        - list of files to copy from/to the computing node
+        - nprocs: number of processors actually requested
+        - mem: actual memory requirements
+        - routes: parsed route sections (one per Link1 block)
+        - molecules: molecule information (see `scan_molecule`)
+        - extra: additional copy operations as [cmd, file]
+        - chks: checkpoint files, as (op, file)
+        - rwfs: read-write files
+        - files: other files referenced in input
     """
 
     def write_hdr(fobj: typing.IO[str],
-                  dat_P: typing.Optional[int] = None,
+                  dat_P: typing.Optional[typing.Union[int, str]] = None,
                   dat_M: typing.Optional[str] = None,
                   file_chk: typing.Optional[typing.Union[str, bool]] = None,
-                  file_rwf: typing.Optional[typing.Union[str, bool]] = None
+                  file_rwf: typing.Optional[typing.Union[str, bool]] = None,
+                  gpu_cpu: typing.Optional[str] = None
                   ) -> None:
         """Small function to write Link0 header.
 
         Parameters
         ----------
-        dat_P : int, optional
-            Number of processors to request in Gaussian job.
+        dat_P : int or str, optional
+            Number of processors or list of cores to request in Gaussian
+            job.
         dat_M : str, optional
             Memory requirement.
         file_chk : str or bool, optional
             Checkpoint file to use.
         file_rwf : str or bool, optional
             Checkpoint file to use
+        gpu_cpu : str, optional
+            GPUs and their controlling cores.
         """
         if dat_M is not None:
             fobj.write('%Mem={}\n'.format(dat_M))
-        if dat_P is not None:
+        if isinstance(dat_P, str):
+            fobj.write('%CPU={}\n'.format(dat_P))
+        elif dat_P is not None:
             fobj.write('%NProcShared={}\n'.format(dat_P))
+        if gpu_cpu is not None:
+            fobj.write('%GPUCPU={}\n'.format(gpu_cpu))
         if file_chk is not None and file_chk:
             fobj.write('%Chk={}\n'.format(file_chk))
         if file_rwf is not None and file_rwf:
             fobj.write('%Rwf={}\n'.format(file_rwf))
 
-    def process_route(route: str
-                      ) -> typing.Union[bool, bool, bool, bool,
-                                        typing.List[str]]:
+    def process_route(route: Route) -> typing.List[typing.List[str]]:
         """Processes Gaussian's route specification section.
 
-        Parses a route specification and checks relevant parameters.
+        Checks relevant parameters of a parsed route specification.
 
         Parameters
         ----------
-        route : str
+        route : Route
             Route specification
 
         Returns
         -------
-        tuple
-            The following information are returned:
-            - bool if Link717 will be used
-            - bool if Link717 option section present in input
-            - bool if Link718 will be used
-            - bool if Link718 option section present in input
-            - list of files to copy from/to the computing node
+        list
+            List of files to copy from/to the computing node
         """
-        fmt_frq = r'\bfreq\w*=?(?P<delim>\()?\S*{}\S*(?(delim)\))\b'
-        # ! fmt_geom = r'\bgeom\w*=?(?P<delim>\()?\S*{}\S*(?(delim)\))\b'
-        # ! key_FC = re.compile(str_FC, re.I)
-        str_FC = r'\b(fc|fcht|ht)\b'
-        key_718 = re.compile(fmt_frq.format(str_FC), re.I)
-        key_718o = re.compile(fmt_frq.format(r'\breadfcht\b'), re.I)
-        key_717 = re.compile(fmt_frq.format(r'\breadanh'), re.I)
-        key_717o = re.compile(fmt_frq.format(r'\banharm(|onic)\b'), re.I)
-        use717, use718, opt717, opt718 = False, False, False, False
         extra_cp = []
         # Check if we need to copy back
-        keyGeomView = re.compile(r'\bgeomview\b')
-        if keyGeomView.search(route):
+        if route.mentions('geomview'):
             extra_cp.append(['cpfrom', 'points.off'])
-        key_fchk = re.compile(r'\b(FChk|FCheck|FormCheck)\b')
-        if key_fchk.search(route):
+        if route.has('fchk') or route.has('fcheck') or route.has('formcheck'):
             extra_cp.append(['cpfrom', 'Test.FChk'])
-        if key_718.search(route):
-            use718 = True
-        if key_718o.search(route):
-            use718 = True
-            opt718 = True
-            if not key_718:
-                s = 'WARNING: It is not yet possible to run FCHT ' \
-                    + 'calculations with ReadFCHT only'
-                print(s)
-        if key_717.search(route):
-            use717 = True
-        if key_717o.search(route):
-            use717 = True
-            opt717 = True
-
-        return use717, opt717, use718, opt718, extra_cp
-
-    nprocs = dat_P
+        if route.opt718 and not route.option_names('freq') & {'fc', 'fcht',
+                                                              'ht'}:
+            s = 'WARNING: It is not yet possible to run FCHT ' \
+                + 'calculations with ReadFCHT only'
+            print(s)
+
+        return extra_cp
+
+    if isinstance(dat_P, str):
+        nprocs = count_cpus(dat_P)
+    else:
+        nprocs = dat_P
     mem = dat_M
-    ops_copy = []
+    extra_cp = []
     ls_exts = ['.chk', '.dat', '.log', '.out', '.fch', '.rwf']
     ls_chks = []
     # ls_chks should be given as tuples (op, file) with:
@@ -842,105 +2067,264 @@ def check_gjf(gjf_ref: str,
     if file_chk:
         ls_chks.append((0, file_chk))
     ls_rwfs = []
-    if file_rwf:
+    # Read-write file split over several disks, not copied
+    rwf_split = isinstance(file_rwf, str) and ',' in file_rwf
+    if file_rwf and not rwf_split:
         ls_rwfs.append(file_rwf)
     ls_files = []
 
     newlnk = True
     inroute = False
-    use717 = [None]
-    use718 = [None]
-    opt717 = [None]
-    opt718 = [None]
     route = ['']
+    routes = [Route()]
+    molecules = [scan_molecule(b'', 0, routes[-1])]
+
+    def decode(data: bytes) -> str:
+        return data.decode(GJF_ENCODING, 'surrogateescape').replace(
+            '\r\n', '\n')
+
+    write_hdr(fobjw, dat_P, dat_M, file_chk, file_rwf, gpu_cpu)
+    pos = 0
+    size = len(buf)
+    while pos < size:
+        if not (newlnk or inroute):
+            # BODY OF BLOCK: copied up to the next relevant line
+            res = GJF_BODY_STOP.search(buf, pos)
+            end = res.start() if res else size
+            if end > pos:
+                if routes[-1].use717 or routes[-1].use718:
+                    for item in GJF_FILE_REF.finditer(buf, pos, end):
+                        fname = decode(item.group(1))
+                        # Same check as for the extension of a real path
+                        if os.path.splitext(fname)[1][:4] in ls_exts:
+                            ls_files.append(fname)
+                fobjw.write(decode(buf[pos:end]))
+                pos = end
+                continue
+        end = buf.find(b'\n', pos) + 1 or size
+        line = decode(buf[pos:end])
+        pos = end
+        line_lo = line.strip().lower()
+        # END-OF-BLOCK
+        if not line_lo:
+            fobjw.write(line)
+            if inroute:
+                routes[-1].parse(route[-1])
+                molecules[-1] = scan_molecule(buf, pos, routes[-1])
+                dat = process_route(routes[-1])
+                if dat:
+                    extra_cp.extend(dat)
+                inroute = False
+            continue
+        # NEW BLOCK
+        if line_lo == '--link1--':
+            fobjw.write(line)
+            newlnk = True
+            route.append('')
+            routes.append(Route())
+            molecules.append(scan_molecule(b'', 0, routes[-1]))
+            write_hdr(fobjw, dat_P, dat_M, file_chk, file_rwf, gpu_cpu)
+        # INSTRUCTIONS
+        else:
+            if line_lo.startswith(r'%'):
+                if line_lo != '%nosave':
+                    keyval = line.split('=')[1].strip()
+                    # LINK0 INSTRUCTION
+                    if line_lo.startswith(r'%chk'):
+                        if file_chk is None:
+                            ls_chks.append((0, keyval))
+                        else:
+                            line = ''
+                    elif line_lo.startswith(r'%oldchk'):
+                        ls_chks.append((1, keyval))
+                    elif line_lo.startswith(r'%rwf'):
+                        if file_rwf is not False and not rwf_split:
+                            ls_rwfs.append(keyval)
+                        else:
+                            line = ''
+                    elif line_lo.startswith('%mem'):
+                        if dat_M is None:
+                            mem = keyval
+                        else:
+                            line = ''
+                    elif line_lo.startswith('%nproc'):
+                        if dat_P is None:
+                            nprocs = int(keyval)
+                        else:
+                            line = ''
+                    elif line_lo.startswith('%cpu'):
+                        if dat_P is None:
+                            nprocs = count_cpus(keyval)
+                        else:
+                            line = ''
+                    elif line_lo.startswith('%gpucpu'):
+                        if gpu_cpu is not None:
+                            line = ''
+            elif (line_lo.startswith('#') and newlnk) or inroute:
+                # ROUTE SECTION
+                newlnk = False
+                inroute = True
+                route[-1] += ' ' + line.strip()
+            else:
+                # REST OF INPUT
+                # The input files should not contain any spaces
+                # We assume that extensions are provided
+                if routes[-1].use717 or routes[-1].use718:
+                    if len(line_lo.split()) == 1 and \
+                            line_lo.find('.') > 0:
+                        ext = os.path.splitext(line.strip())[1]
+                        if ext[:4] in ls_exts:
+                            ls_files.append(line.strip())
+            fobjw.write(line)
+
+    return {'nprocs': nprocs, 'mem': mem, 'routes': routes,
+            'molecules': molecules, 'extra': extra_cp, 'chks': ls_chks,
+            'rwfs': ls_rwfs, 'files': ls_files}
+
+
+def check_gjf(gjf_ref: str,
+              gjf_new: typing.Union[str, typing.IO[str]],
+              dat_P: typing.Optional[typing.Union[int, str]] = None,
+              dat_M: typing.Optional[str] = None,
+              file_chk: typing.Optional[typing.Union[str, bool]] = None,
+              file_rwf: typing.Optional[typing.Union[str, bool]] = None,
+              rootdir: typing.Optional[str] = None,
+              produced: typing.Optional[typing.Set[str]] = None,
+              gpu_cpu: typing.Optional[str] = None
+              ) -> typing.Tuple[int, str, typing.List[typing.List[str]],
+                                typing.List[Route],
+                                typing.List[typing.Dict[str, typing.Any]]]:
+    """Analyses and completes Gaussian input.
+
+    Checks and modifies a Gaussian input file and extracts relevant
+        information for the submission script:
+    - Hardware resources to be be read from the input file
+    - Files to copy.
+    The analysis of the content (see `parse_gjf`) is stored in a cache,
+        keyed by the content and the Link0 parameters, so only the
+        existence of the files to copy is checked again for a known input.
+
+    Parameters
+    ----------
+    gjf_ref : str
+        Reference input file
+    gjf_new : str or file object
+        New input file where completed Gaussian directives are stored.
+        A file object (ex: `io.StringIO`) can be given to keep the new
+        input in memory.  It is not closed.
+    dat_P : int or str, optional
+        Number of processors to request in Gaussian job, or list of
+        cores (ex: "0-5,12-17") to pin the processes (%CPU).
+        Otherwise, use the value in reference input file.
+    dat_M : str, optional
+        Memory requirement.
+        Otherwise, use the value in reference input file.
+    file_chk : str or bool, optional
+        Checkpoint file to use.
+        If None, do not specify it in input
+    file_rwf : str or bool, optional
+        Checkpoint file to use
+        If None, do not specify it in input
+        A multi-file specification ("dir1/,size1,dir2/,size2") replaces
+        the read-write files of the input and is kept on the node.
+    rootdir : str, optional
+        Root directory to look for files
+        Relative paths (input files, checkpoint...) are relative to it.
+    produced : set, optional
+        Full paths of files produced by previous jobs.
+        They are considered as existing.
+    gpu_cpu : str, optional
+        GPUs and their controlling cores (ex: "0-1=0,6", %GPUCPU).
+        Otherwise, use the value in reference input file.
+
+    Returns
+    -------
+    tuple
+        The following information are returned:
+        - number of processors actually requested
+        - actual memory requirements
+        - list of files to copy from/to the computing node
+        - parsed route sections (one per Link1 block)
+        - molecule information (one per Link1 block)
+    """
+
+    # The current directory is not used to be usable in parallel analyses
+    def fullpath(fname: str) -> str:
+        return os.path.join(rootdir or '', fname)
 
-    with open(gjf_new, 'w') as fobjw:
-        write_hdr(fobjw, dat_P, dat_M, file_chk, file_rwf)
-        with open(gjf_ref, 'r') as fobjr:
-            for line in fobjr:
-                line_lo = line.strip().lower()
-                # END-OF-BLOCK
-                if not line_lo:
-                    fobjw.write(line)
-                    if inroute:
-                        use717[-1], opt717[-1], use718[-1], opt718[-1], dat =\
-                            process_route(route[-1])
-                        if dat:
-                            ops_copy.extend(dat)
-                        inroute = False
-                    continue
-                # NEW BLOCK
-                if line_lo == '--link1--':
-                    fobjw.write(line)
-                    newlnk = True
-                    route.append('')
-                    use717.append(None)
-                    use718.append(None)
-                    opt717.append(None)
-                    opt718.append(None)
-                    write_hdr(fobjw, dat_P, dat_M, file_chk, file_rwf)
-                # INSTRUCTIONS
+    def exists(fname: str) -> bool:
+        path = fullpath(fname)
+        return stored_file(path) is not None or path in (produced or ())
+
+    with open(fullpath(gjf_ref), 'rb') as fobjr:
+        fsize = os.fstat(fobjr.fileno()).st_size
+        if MMAP_THRESHOLD is not None and fsize > MMAP_THRESHOLD:
+            # Large input: scanned in place and written directly
+            buf = mmap.mmap(fobjr.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if isinstance(gjf_new, str):
+                    with open(fullpath(gjf_new), 'w', encoding=GJF_ENCODING,
+                              errors='surrogateescape') as fobjw:
+                        data = parse_gjf(buf, fobjw, dat_P, dat_M, file_chk,
+                                         file_rwf, gpu_cpu)
                 else:
-                    if line_lo.startswith(r'%'):
-                        if line_lo != '%nosave':
-                            keyval = line.split('=')[1].strip()
-                            # LINK0 INSTRUCTION
-                            if line_lo.startswith(r'%chk'):
-                                if file_chk is None:
-                                    ls_chks.append((0, keyval))
-                                else:
-                                    line = ''
-                            elif line_lo.startswith(r'%oldchk'):
-                                ls_chks.append((1, keyval))
-                            elif line_lo.startswith(r'%rwf'):
-                                if file_rwf is not False:
-                                    ls_rwfs.append(keyval)
-                                else:
-                                    line = ''
-                            elif line_lo.startswith('%mem'):
-                                if dat_M is None:
-                                    mem = keyval
-                                else:
-                                    line = ''
-                            elif line_lo.startswith('%nproc'):
-                                if dat_P is None:
-                                    nprocs = int(keyval)
-                                else:
-                                    line = ''
-                    elif (line_lo.startswith('#') and newlnk) or inroute:
-                        # ROUTE SECTION
-                        newlnk = False
-                        inroute = True
-                        route[-1] += ' ' + line.strip()
-                    else:
-                        # REST OF INPUT
-                        # The input files should not contain any spaces
-                        # We assume that extensions are provided
-                        if use717[-1] or use718[-1]:
-                            if len(line_lo.split()) == 1 and \
-                                    line_lo.find('.') > 0:
-                                ext = os.path.splitext(line.strip())[1]
-                                if ext[:4] in ls_exts:
-                                    ls_files.append(line.strip())
-                    fobjw.write(line)
+                    data = parse_gjf(buf, gjf_new, dat_P, dat_M, file_chk,
+                                     file_rwf, gpu_cpu)
+            finally:
+                buf.close()
+        else:
+            buf = fobjr.read()
+            data = None
+    if data is None:
+        key = hashlib.sha1(repr((VERSION, INPUT_CACHE_FORMAT, GJF_ENCODING,
+                                 dat_P, dat_M, file_chk, file_rwf,
+                                 gpu_cpu)).encode())
+        key.update(buf)
+        data = load_input_cache(key.hexdigest())
+        if data is None:
+            output = io.StringIO()
+            fobjw = io.StringIO()
+            with redirect_stdout(output):
+                data = parse_gjf(buf, fobjw, dat_P, dat_M, file_chk,
+                                 file_rwf, gpu_cpu)
+            data['output'] = output.getvalue()
+            data['text'] = fobjw.getvalue()
+            save_input_cache(key.hexdigest(), data)
+        sys.stdout.write(data['output'])
+        if isinstance(gjf_new, str):
+            with open(fullpath(gjf_new), 'w', encoding=GJF_ENCODING,
+                      errors='surrogateescape') as fobjw:
+                fobjw.write(data['text'])
+        else:
+            gjf_new.write(data['text'])
+    nprocs = data['nprocs']
+    mem = data['mem']
+    routes = data['routes']
+    ls_chks = data['chks']
+    ls_rwfs = data['rwfs']
+    ls_files = data['files']
+    ops_copy = [[cmd, fname, rootdir] for cmd, fname in data['extra']]
 
     # Copy files for CHK
     if ls_chks:
         # set is there to remove duplicate files
         for oper, chk in set(ls_chks):
-            if oper in [0, 1] and os.path.exists(chk):
+            if oper in [0, 1] and exists(chk):
                 ops_copy.append(['cpto', chk, rootdir])
             if oper in [0, 2]:
                 ops_copy.append(['cpfrom', chk, rootdir])
     if ls_rwfs:
         # set is there to remove duplicate files
         for rwf in set(ls_rwfs):
-            if os.path.exists(rwf):
+            # Multi-file specifications refer to the node's local disks
+            if ',' in rwf:
+                continue
+            if exists(rwf):
                 ops_copy.append(['cpto', rwf, rootdir])
             ops_copy.append(['cpfrom', rwf, rootdir])
     if ls_files:
         for fname in set(ls_files):
-            if os.path.exists(fname):
+            if exists(fname):
                 ops_copy.append(['cpto', fname, rootdir])
 
     if ops_copy:
@@ -952,15 +2336,101 @@ def check_gjf(gjf_ref: str,
                 else:
                     print('Will copy file: {}'.format(what))
 
-    return nprocs, mem, ops_copy
+    return nprocs, mem, ops_copy, routes, data['molecules']
+
+
+def analyse_input(gjf_ref: str,
+                  gjf_new: typing.Optional[str],
+                  dat_P: typing.Optional[typing.Union[int, str]] = None,
+                  dat_M: typing.Optional[str] = None,
+                  file_chk: typing.Optional[typing.Union[str, bool]] = None,
+                  file_rwf: typing.Optional[typing.Union[str, bool]] = None,
+                  rootdir: typing.Optional[str] = None,
+                  produced: typing.Optional[typing.Set[str]] = None,
+                  gpu_cpu: typing.Optional[str] = None
+                  ) -> typing.Tuple[int, str, typing.List[typing.List[str]],
+                                    typing.List[Route], typing.List[dict],
+                                    typing.Optional[str], str]:
+    """Analyses an input file, capturing the messages.
+
+    Wrapper to `check_gjf` which can be run in a separate process.
+
+    Parameters
+    ----------
+    gjf_ref : str
+        Reference input file
+    gjf_new : str, optional
+        New input file.  If None, the new input is returned as text.
+    dat_P, dat_M, file_chk, file_rwf, rootdir, produced, gpu_cpu
+        See `check_gjf`.
+
+    Returns
+    -------
+    tuple
+        Data returned by `check_gjf`, followed by:
+        - new input as text if `gjf_new` is None
+        - messages printed during the analysis
+    """
+    output = io.StringIO()
+    if gjf_new is None:
+        fobj = io.StringIO()
+    else:
+        fobj = gjf_new
+    with redirect_stdout(output):
+        res = check_gjf(gjf_ref, fobj, dat_P, dat_M, file_chk, file_rwf,
+                        rootdir, produced, gpu_cpu)
+    if gjf_new is None:
+        text = fobj.getvalue()
+    else:
+        text = None
+    return res + (text, output.getvalue())
+
+
+def analyse_inputs(tasks: typing.List[typing.Tuple],
+                   workers: int = ANALYSIS_WORKERS
+                   ) -> typing.List[typing.Tuple]:
+    """Analyses a list of input files, possibly in parallel.
+
+    The input files are analysed by a pool of processes if they are
+    numerous enough (see `ANALYSIS_MIN_INPUTS`).
+    The results and the messages are returned in the order of the tasks.
+
+    Parameters
+    ----------
+    tasks : list
+        Arguments of `analyse_input` for each input file.
+    workers : int, optional
+        Maximum number of processes.
+
+    Returns
+    -------
+    list
+        Results of `analyse_input` for each task.
+    """
+    if workers > 1 and len(tasks) >= max(ANALYSIS_MIN_INPUTS, 2):
+        nprocs = min(workers, len(tasks))
+        chunk = max(1, len(tasks)//(4*nprocs))
+        # Only the creation of the pool is checked, errors raised by the
+        #   analyses are passed to the caller.
+        try:
+            pool = ProcessPoolExecutor(max_workers=nprocs)
+        except (OSError, NotImplementedError):
+            # Process pools not supported, run sequentially
+            pool = None
+        if pool is not None:
+            with pool:
+                return list(pool.map(analyse_input, *zip(*tasks),
+                                     chunksize=chunk))
+    return [analyse_input(*task) for task in tasks]
 
 
 # ============================
 #   QUEUES-RELATED FUNCTIONS
 # ============================
 def get_queue_data(full_queue: str,
+                   ctx: typing.Optional[ClusterContext] = None
                    ) -> typing.Tuple[str, hpc.NodeFamily, int,
-                                     typing.Union[str, None]]:
+                                     typing.Union[str, None], int, int]:
     """Returns the queue specification and node-specific information.
 
     Based on the full_queue specification, defines and returns:
@@ -968,11 +2438,16 @@ def get_queue_data(full_queue: str,
     - the node family specifications
     - the number of processing units to use
     - a specific node definition (if relevant)
+    - the number of nodes to use
+    - the number of GPUs to use
 
     Parameters
     ----------
     full_queue : str
-        full queue specifications as "queue[:[nproc_spec]:[node_id]]"
+        full queue specifications as
+        "queue[:[[nnodes]x][nproc_spec][+[ngpus]]:[node_id]]"
+    ctx : ClusterContext, optional
+        Cluster configuration.
 
     Returns
     -------
@@ -980,8 +2455,10 @@ def get_queue_data(full_queue: str,
         Tuple containing the following information
         - actual queue (same as full_queue if not latter not virtual)
         - node family specification (as a `NodeFamily` object)
-        - number of processors actually requested
+        - number of processors actually requested (per node)
         - name of a specific node
+        - number of nodes
+        - number of GPUs (per node)
 
     Raises
     ------
@@ -1008,11 +2485,49 @@ def get_queue_data(full_queue: str,
     else:
         raise ValueError('Too many section in full queue specification.')
 
-    try:
-        family = HPCNODES[HPCQUEUES[queue]]
-    except KeyError:
-        raise KeyError('Unsupported queue.')
-
+    # Number of GPUs, given as suffix of the processors ("6+1"), all the
+    #   GPUs of the node if no number given ("+")
+    ngpus = 0
+    if nprocs is not None and '+' in nprocs:
+        nprocs, value = nprocs.split('+', 1)
+        nprocs = nprocs.strip() or None
+        ngpus = None
+        if value.strip():
+            try:
+                ngpus = int(value)
+            except ValueError:
+                raise ValueError('Unsupported definition of GPUs.')
+            if ngpus < 1:
+                raise ValueError('Number of GPUs must be positive.')
+    # Number of nodes, given as prefix of the processors ("2x-1")
+    nnodes = 1
+    if nprocs is not None and 'x' in nprocs:
+        value, nprocs = nprocs.split('x', 1)
+        nprocs = nprocs.strip() or None
+        if value.strip():
+            try:
+                nnodes = int(value)
+            except ValueError:
+                raise ValueError('Unsupported definition of nodes.')
+            if nnodes < 1:
+                raise ValueError('Number of nodes must be positive.')
+
+    if ctx is None:
+        ctx = CONTEXT
+    try:
+        family = ctx.hpcnodes[ctx.hpcqueues[queue]]
+    except KeyError:
+        raise KeyError('Unsupported queue.')
+    if nnodes > len(family):
+        raise ValueError('More nodes requested than available.')
+    if ngpus is None or ngpus > 0:
+        if family.ngpus == 0:
+            raise ValueError('No GPU available on the nodes.')
+        elif ngpus is None:
+            ngpus = family.ngpus
+        elif ngpus > family.ngpus:
+            raise ValueError('Too many GPUs requested.')
+
     # Definition of number of processors
     # ----------------------------------
     nprocs_avail = family.nprocs(all=USE_LOGICAL_CORE)
@@ -1059,43 +2574,1020 @@ def get_queue_data(full_queue: str,
     #         raise KeyError('Wrong definition of the node ID')
     #     nodeid = value
 
-    return (queue, family, nprocs, nodeid)
+    return (queue, family, nprocs, nodeid, nnodes, ngpus)
 
 
-# ================
-#   MAIN PROGRAM
-# ================
+def count_cpus(spec: str) -> int:
+    """Returns the number of cores in a list of cores (%CPU).
 
+    Parameters
+    ----------
+    spec : str
+        List of cores, as ranges with an optional stride, separated by
+        commas (ex: "0-5,12-17", "0-15/2").
 
-if __name__ == '__main__':
-    #  Option Parsing
-    # ----------------
-    parser = build_parser()
-    opts = parser.parse_args()
-    # Printing cases
-    # ^^^^^^^^^^^^^^
-    if opts.mach:
-        print("""\
-List of available HPC Nodes
----------------------------
-""")
-        for family in sorted(HPCNODES):
-            print(HPCNODES[family])
-        sys.exit()
+    Returns
+    -------
+    int
+        Number of cores.
+    """
+    num = 0
+    for item in spec.split(','):
+        item, _, step = item.partition('/')
+        first, _, last = item.partition('-')
+        num += len(range(int(first), int(last or first)+1, int(step or 1)))
+    return num
+
+
+def format_cpus(cores: typing.List[int]) -> str:
+    """Formats a list of cores for %CPU, grouping consecutive cores.
+
+    Parameters
+    ----------
+    cores : list
+        Core indexes.
+
+    Returns
+    -------
+    str
+        List of cores (ex: "0-5,12-17").
+    """
+    ranges = []
+    for core in sorted(cores):
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ','.join(str(first) if first == last else '{}-{}'.format(first,
+                                                                    last)
+                    for first, last in ranges)
+
+
+def pin_cores(family: hpc.NodeFamily,
+              requests: typing.List[int]
+              ) -> typing.Optional[typing.List[typing.Tuple[typing.List[int],
+                                                            int]]]:
+    """Assigns disjoint sets of cores to concurrent processes.
+
+    The largest processes are placed first, each one on the fullest
+    socket which can hold it, or spread over the sockets with the most
+    free cores otherwise.  With logical cores, each process receives
+    the physical cores and their logical siblings.
+    The memory of each socket is shared by the processes running on it,
+    proportionally to their cores.
+
+    Parameters
+    ----------
+    family : NodeFamily
+        Node family.
+    requests : list
+        Number of processing units of each process.
+
+    Returns
+    -------
+    list or None
+        Cores and local memory (in bytes) of each process, None if the
+        processes cannot be pinned (too many processing units, odd number
+        of logical cores).
+    """
+    num_phys = family.nprocs(all=False)
+    units = family.nprocs(all=USE_LOGICAL_CORE)//num_phys
+    if (any(num % units or num <= 0 for num in requests)
+            or sum(requests) > family.nprocs(all=USE_LOGICAL_CORE)):
+        return None
+    free = [list(range(cpu*family.ncores, (cpu+1)*family.ncores))
+            for cpu in range(family.ncpus)]
+    cores = [[] for _ in requests]
+    for index in sorted(range(len(requests)),
+                        key=lambda i: (-requests[i], i)):
+        need = requests[index]//units
+        fits = [cpu for cpu in range(family.ncpus) if len(free[cpu]) >= need]
+        if fits:
+            sockets = [min(fits, key=lambda cpu: (len(free[cpu]), cpu))]
+        else:
+            sockets = sorted(range(family.ncpus),
+                             key=lambda cpu: (-len(free[cpu]), cpu))
+        for cpu in sockets:
+            take = min(need - len(cores[index]), len(free[cpu]))
+            cores[index].extend(free[cpu][:take])
+            del free[cpu][:take]
+    # Memory of each socket shared between the processes running on it
+    used = [family.ncores - len(cores_free) for cores_free in free]
+    mem_cpu = family.size_mem//family.ncpus
+    result = []
+    for ids in cores:
+        mem = sum(mem_cpu*sum(1 for core in ids
+                              if core//family.ncores == cpu)//used[cpu]
+                  for cpu in range(family.ncpus) if used[cpu])
+        if units > 1:
+            ids = ids + [core + num_phys for core in ids]
+        result.append((sorted(ids), mem))
+    return result
+
+
+def map_gpus(family: hpc.NodeFamily,
+             nprocs: int,
+             ngpus: int
+             ) -> typing.Optional[typing.Tuple[str, str]]:
+    """Maps GPUs to controlling cores (%CPU and %GPUCPU).
+
+    The cores are taken from as few sockets as possible (see
+    `pin_cores`), and each GPU is controlled by one of their physical
+    cores, spread evenly over them.
+    The GPUs are numbered from 0, as seen by the job.
+
+    Parameters
+    ----------
+    family : NodeFamily
+        Node family.
+    nprocs : int
+        Number of processing units.
+    ngpus : int
+        Number of GPUs.
+
+    Returns
+    -------
+    tuple or None
+        List of cores (%CPU) and mapping of the GPUs to their controlling
+        cores (%GPUCPU), None if the GPUs cannot be mapped (not enough
+        physical cores).
+    """
+    pinning = pin_cores(family, [nprocs])
+    if pinning is None:
+        return None
+    cores = pinning[0][0]
+    physical = [core for core in cores if core < family.nprocs(all=False)]
+    if ngpus > len(physical):
+        return None
+    ctrl = [physical[index*len(physical)//ngpus] for index in range(ngpus)]
+    return (format_cpus(cores), '{}={}'.format(
+        format_cpus(list(range(ngpus))), ','.join(str(core) for core in ctrl)))
+
+
+# =========================
+#   RESOURCE COST MODEL
+# =========================
+def method_class(route: Route) -> str:
+    """Returns the class of the electronic structure method.
+
+    The classes are used by the cost model: "semi" (semi-empirical and
+    molecular mechanics), "hf", "dft", "mp2" (including double hybrids),
+    "cc" (coupled-cluster and related), "cas" (multi-configurational).
+
+    Parameters
+    ----------
+    route : Route
+        Route specification.
+
+    Returns
+    -------
+    str
+        Class of the method.
+    """
+    words = set(route.keywords)
+    if route.method is not None:
+        words.add(route.method)
+    words = {re.sub(r'^(r|u|ro)(?=hf|mp|cc|b3|b2|qci)', '', word)
+             for word in words}
+    for label, pattern in COST_METHODS:
+        if any(pattern.match(word) for word in words):
+            return label
+    return 'dft'
+
+
+def estimate_nbasis(route: Route, natoms: int) -> int:
+    """Estimates the number of basis functions.
+
+    Parameters
+    ----------
+    route : Route
+        Route specification.
+    natoms : int
+        Number of atoms.
+
+    Returns
+    -------
+    int
+        Approximate number of basis functions.
+    """
+    basis = (route.basis or '').replace('*', '(d)')
+    if basis.endswith('(d)(d)'):
+        basis = basis[:-6] + '(d,p)'
+    size = COST_BASIS.get(basis, COST_BASIS.get(basis.split('(')[0], 20))
+    return max(1, natoms)*size
+
+
+def estimate_resources(route: Route,
+                       molecule: typing.Dict[str, typing.Optional[int]],
+                       factors: typing.Optional[typing.Dict[str,
+                                                        float]] = None,
+                       nbasis: typing.Optional[int] = None
+                       ) -> typing.Dict[str, typing.Any]:
+    """Estimates the resources needed by a Link1 block.
+
+    The estimates are based on the class of method, the number of basis
+    functions and the job types (optimization, frequencies, anharmonic
+    or vibronic calculations, excited states).
+    The computational time can be calibrated from previous jobs.
+
+    Parameters
+    ----------
+    route : Route
+        Route specification.
+    molecule : dict
+        Molecule information (see `scan_molecule`).
+    factors : dict, optional
+        Calibration factors for the computational time, per class.
+    nbasis : int, optional
+        Number of basis functions, estimated if not given.
+
+    Returns
+    -------
+    dict
+        Estimated resources:
+        - class: method class
+        - nbasis: number of basis functions
+        - mem: memory (in bytes)
+        - disk: scratch storage (in bytes)
+        - cputime: computational time on a single core (in s)
+    """
+    natoms = molecule['natoms'] or COST_DEFAULT_ATOMS
+    label = method_class(route)
+    if nbasis is None:
+        nbasis = estimate_nbasis(route, natoms)
+    coef_mem, coef_disk, coef_time, power = COST_PARAMS[label]
+    mem = coef_mem*8*nbasis**2
+    disk = coef_disk*8*nbasis**2
+    cputime = coef_time*nbasis**power
+    # Open-shell systems roughly double the work
+    if molecule['mult'] is not None and molecule['mult'] > 1:
+        cputime *= 2
+        disk *= 2
+    if route.has('opt'):
+        cputime *= 5 + natoms//2
+    if route.has('td') or route.has('cis'):
+        cputime *= 4
+        mem *= 2
+    if route.has('freq'):
+        cputime *= 2 + natoms//4
+        mem *= 2
+        disk *= 2 + natoms//10
+        if route.use717:
+            cputime *= 6*natoms
+        if route.use718:
+            mem *= 2
+    if label in ('mp2', 'cc', 'cas'):
+        # Integrals transformation stored on disk
+        disk += 8*nbasis**4/16
+        mem = max(mem, min(8*nbasis**3, 64*1024**3))
+    if factors and label in factors:
+        cputime *= factors[label]
+    return {'class': label, 'nbasis': nbasis,
+            'mem': int(max(mem + COST_MIN_MEM, COST_MIN_MEM)),
+            'disk': int(disk), 'cputime': cputime}
+
+
+def autosize_input(routes: typing.List[Route],
+                   molecules: typing.List[typing.Dict[str, typing.Any]],
+                   max_procs: int,
+                   max_mem: int,
+                   factors: typing.Optional[typing.Dict[str, float]] = None
+                   ) -> typing.Dict[str, typing.Any]:
+    """Sizes the resources for an input file.
+
+    Link1 blocks are run sequentially: the memory and storage are the
+    largest among the blocks, the times are summed.
+    The number of processors is the smallest one giving an estimated
+    wall time below `AUTOSIZE_WALLTIME`.
+
+    Parameters
+    ----------
+    routes : list
+        Route specification of each Link1 block.
+    molecules : list
+        Molecule information of each Link1 block.
+    max_procs : int
+        Maximum number of processors.
+    max_mem : int
+        Maximum memory (in bytes).
+    factors : dict, optional
+        Calibration factors of the cost model.
+
+    Returns
+    -------
+    dict
+        Resources: number of processors (`nprocs`), memory (`mem`),
+        storage (`disk`), wall time (`walltime`), computational time on
+        a single core (`cputime`).
+    """
+    mem, disk, cputime = 0, 0, 0.
+    natoms = None
+    for route, molecule in zip(routes, molecules):
+        # Blocks reading the geometry from checkpoint use the last one
+        if molecule['natoms'] is None:
+            molecule = dict(molecule, natoms=natoms)
+        else:
+            natoms = molecule['natoms']
+        res = estimate_resources(route, molecule, factors)
+        mem = max(mem, res['mem'])
+        disk = max(disk, res['disk'])
+        cputime += res['cputime']
+    nprocs = 1
+    while (nprocs < max_procs and
+           cputime/(nprocs*AUTOSIZE_EFFICIENCY) > AUTOSIZE_WALLTIME):
+        nprocs += 1
+    walltime = cputime/(nprocs*(AUTOSIZE_EFFICIENCY if nprocs > 1 else 1.))
+    return {'nprocs': nprocs, 'mem': min(mem, max_mem), 'disk': disk,
+            'walltime': walltime, 'cputime': cputime}
+
+
+def pack_inputs(costs: typing.List[float],
+                mems: typing.List[int],
+                max_procs: int,
+                max_mem: int
+                ) -> typing.List[typing.List[typing.Tuple[int, int, int]]]:
+    """Packs input files on nodes, with resources following their cost.
+
+    The inputs are distributed on as few nodes as possible, each input
+    requiring at least one processor and its estimated memory.
+    The most expensive inputs are placed first, on the least loaded node.
+    On each node, the processors are shared proportionally to the costs
+    and the remaining memory proportionally to the processors.
+
+    Parameters
+    ----------
+    costs : list
+        Cost (or weight) of each input file.
+    mems : list
+        Minimum memory of each input file (in bytes).
+    max_procs : int
+        Number of processors available on a node.
+    max_mem : int
+        Memory available on a node (in bytes).
+
+    Returns
+    -------
+    list
+        Inputs of each node, as tuples with the index of the input, the
+        number of processors and the memory (in bytes).
+    """
+    num = len(costs)
+    mems = [min(mem, max_mem) for mem in mems]
+    order = sorted(range(num), key=lambda i: (-costs[i], i))
+    num_bins = max(1, ceil(num/max_procs), ceil(sum(mems)/max_mem))
+    while True:
+        bins = [[] for _ in range(num_bins)]
+        loads = [0.]*num_bins
+        used = [0]*num_bins
+        for index in order:
+            fits = [b for b in range(num_bins)
+                    if len(bins[b]) < max_procs
+                    and used[b] + mems[index] <= max_mem]
+            if not fits:
+                break
+            ibin = min(fits, key=lambda b: (loads[b], b))
+            bins[ibin].append(index)
+            loads[ibin] += costs[index]
+            used[ibin] += mems[index]
+        else:
+            break
+        num_bins += 1
+    packs = []
+    for items, load, size in zip(bins, loads, used):
+        if not items:
+            continue
+        items.sort()
+        # One processor each, the rest shared by largest remainder
+        free = max_procs - len(items)
+        if load > 0:
+            shares = [free*costs[i]/load for i in items]
+        else:
+            shares = [free/len(items) for _ in items]
+        procs = [1 + int(share) for share in shares]
+        rest = sorted(range(len(items)),
+                      key=lambda k: (int(shares[k]) - shares[k], k))
+        for k in rest[:max_procs - sum(procs)]:
+            procs[k] += 1
+        free = max_mem - size
+        packs.append([(i, nproc, mems[i] + free*nproc//max_procs)
+                      for i, nproc in zip(items, procs)])
+    return packs
+
+
+def parse_gaussian_log(fname: str) -> typing.Optional[typing.Dict]:
+    """Extracts the data needed by the cost model from a Gaussian output.
+
+    Parameters
+    ----------
+    fname : str
+        Gaussian output file.
+
+    Returns
+    -------
+    dict or None
+        Route of the first Link1 block (`route`), number of atoms
+        (`natoms`), basis functions (`nbasis`), multiplicity (`mult`) and
+        total CPU time (`cputime`, in s), None if not usable.
+    """
+    route = None
+    data = {'natoms': None, 'nbasis': None, 'mult': None, 'cputime': 0.}
+    normal = False
+    with open(fname, 'r', errors='replace') as fobj:
+        for line in fobj:
+            if route is None and line.startswith(' #'):
+                route = line.strip()
+                for line in fobj:
+                    if line.startswith(' --'):
+                        break
+                    route += line.strip()
+                continue
+            res = LOG_PATTERNS['cputime'].search(line)
+            if res:
+                days, hours, mins, secs = res.groups()
+                data['cputime'] += ((int(days)*24 + int(hours))*60
+                                    + int(mins))*60 + float(secs)
+                continue
+            for key in ('natoms', 'nbasis', 'mult'):
+                if data[key] is None:
+                    res = LOG_PATTERNS[key].search(line)
+                    if res:
+                        data[key] = int(res.group(1))
+            if line.startswith(' Normal termination'):
+                normal = True
+    if route is None or not normal or not data['natoms']:
+        return None
+    data['route'] = Route(route)
+    return data
+
+
+def calibrate_costmodel(logfiles: typing.List[str]
+                        ) -> typing.Dict[str, typing.Any]:
+    """Calibrates the computational time of the cost model.
+
+    For each method class, the calibration factor is the median ratio
+    between the CPU time of completed jobs and the model estimate.
+
+    Parameters
+    ----------
+    logfiles : list
+        Gaussian output files of completed jobs.
+
+    Returns
+    -------
+    dict
+        Calibration, with the factors (`factors`) and number of jobs used
+        (`count`) per class.
+    """
+    ratios = {}
+    for fname in logfiles:
+        try:
+            data = parse_gaussian_log(fname)
+        except OSError:
+            data = None
+        if data is None or data['cputime'] <= 0:
+            print('NOTE: Skipping {} (incomplete job)'.format(fname))
+            continue
+        res = estimate_resources(data['route'], data, None, data['nbasis'])
+        ratios.setdefault(res['class'], []).append(data['cputime']
+                                                   / res['cputime'])
+    factors = {}
+    for key, values in ratios.items():
+        values.sort()
+        num = len(values)
+        factors[key] = (values[(num-1)//2] + values[num//2])/2
+    return {'version': VERSION, 'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'factors': factors,
+            'count': {key: len(values) for key, values in ratios.items()}}
+
+
+# =============================
+#   STAGING-RELATED FUNCTIONS
+# =============================
+def stored_file(path: str) -> typing.Optional[str]:
+    """Returns the file storing `path`, possibly compressed.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    Returns
+    -------
+    str or None
+        `path` if it exists, otherwise the first compressed version found
+        (see `STAGE_ZIP_EXTS`), or None if the file does not exist.
+    """
+    for ext in ('',) + STAGE_ZIP_EXTS:
+        if os.path.exists(path + ext):
+            return path + ext
+    return None
+
+
+def chain_staging(steps: typing.List[typing.List[typing.List[str]]],
+                  serial: bool = True
+                  ) -> typing.Tuple[typing.List[typing.List[str]],
+                                    typing.List[str]]:
+    """Removes the stage-in of checkpoint files created in scratch.
+
+    For serial multi-jobs, a checkpoint file does not need to be copied
+    to the scratch directory if a previous step produced it there.
+    Only the last version is copied back.
+
+    Parameters
+    ----------
+    steps : list
+        Copy operations (see `check_gjf`) of each input file, in the
+        order of execution.
+    serial : bool, optional
+        The input files are run sequentially.
+
+    Returns
+    -------
+    tuple
+        The following information are returned:
+        - list of the copy operations to do
+        - list of files reused from previous steps
+    """
+    ops_copy = []
+    reused = []
+    created = set()
+    for ops in steps:
+        writes = {os.path.join(where or DEFAULTDIR, what)
+                  for cmd, what, where in ops if cmd == 'cpfrom'}
+        for cmd, what, where in ops:
+            path = os.path.join(where or DEFAULTDIR, what)
+            if (cmd == 'cpto' and what.lower().endswith('.chk')
+                    and path in created):
+                if path not in reused:
+                    reused.append(path)
+                continue
+            ops_copy.append([cmd, what, where])
+        if serial:
+            created |= writes
+    return ops_copy, reused
+
+
+def plan_staging(ops_copy: typing.List[typing.List[str]],
+                 tmpdir: str,
+                 cpto: typing.Optional[typing.List[str]] = None,
+                 cpfrom: typing.Optional[typing.List[str]] = None,
+                 compress: bool = False
+                 ) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Plans the transfers between the storage and the scratch directory.
+
+    Records the size and modification time of the files to stage in and
+    chooses the transfer method:
+    - link: hard link, for files only read by Gaussian, if the source and
+      the scratch directory are known to be on the same file system.
+    - copy: copy, possibly as reflink (copy-on-write) if supported.
+    Files staged in and copied back are only copied back if modified.
+    Checkpoint and read-write files stored compressed are decompressed
+    when staged in.  With `compress`, they are also compressed when copied
+    back.
+
+    Parameters
+    ----------
+    ops_copy : list
+        Copy operations, as [cmd, file, directory] (see `check_gjf`).
+    tmpdir : str
+        Scratch directory.
+    cpto : list, optional
+        Additional files to stage in (paths relative to STARTDIR).
+    cpfrom : list, optional
+        Additional files to copy back (to STARTDIR).
+    compress : bool, optional
+        Stores the checkpoint and read-write files compressed.
+
+    Returns
+    -------
+    list
+        Transfers as dictionaries with the direction (`dir`: "in", "out"),
+        the source (`src`), the destination (`dst`), the method (`mode`),
+        the size (`size`) and modification time (`mtime`) if known, if
+        the transfer can be skipped when the file is unchanged (`skip`)
+        and if the file is stored compressed (`zip`).
+    """
+    # The scratch directory may be visible from the submission host if
+    #   it is on a shared file system.
+    try:
+        scr_dev = os.stat(os.path.dirname(tmpdir)).st_dev
+    except OSError:
+        scr_dev = None
+    staged = set()
+    written = set()
+    for cmd, what, where in ops_copy:
+        path = os.path.join(where or DEFAULTDIR, what)
+        if cmd == 'cpto':
+            staged.add(path)
+        else:
+            written.add(path)
+    plan = []
+    done = set()
+    for cmd, what, where in ops_copy:
+        path = os.path.join(where or DEFAULTDIR, what)
+        if (cmd, path) in done:
+            continue
+        done.add((cmd, path))
+        zipped = STAGE_ZIP_FILES.search(what) is not None
+        stored = stored_file(path)
+        if cmd == 'cpto':
+            # Files not available yet (dependencies) are checked by the job
+            item = {'dir': 'in', 'src': path, 'dst': './', 'mode': 'copy',
+                    'size': None, 'mtime': None, 'skip': False,
+                    'zip': zipped and (compress or stored != path)}
+            if stored is not None:
+                info = os.stat(stored)
+                item['size'] = info.st_size
+                item['mtime'] = info.st_mtime
+                # Read-only files can be shared with the original one
+                if path not in written and info.st_dev == scr_dev \
+                        and stored == path:
+                    item['mode'] = 'link'
+        else:
+            item = {'dir': 'out', 'src': what, 'dst': where or DEFAULTDIR,
+                    'mode': 'copy', 'size': None, 'mtime': None,
+                    'skip': path in staged, 'zip': zipped and compress}
+            if stored is not None:
+                info = os.stat(stored)
+                item['size'] = info.st_size
+                item['mtime'] = info.st_mtime
+        plan.append(item)
+    # Files already planned are not transferred twice (concurrent copies)
+    planned = {(item['dir'], item['src'], item['dst']) for item in plan}
+    for fname in cpto or []:
+        path = os.path.join(STARTDIR, fname)
+        if ('in', path, './') not in planned:
+            planned.add(('in', path, './'))
+            plan.append({'dir': 'in', 'src': path, 'dst': './',
+                         'mode': 'copy', 'size': None, 'mtime': None,
+                         'skip': False, 'zip': False})
+    for fname in cpfrom or []:
+        if ('out', fname, STARTDIR) not in planned:
+            planned.add(('out', fname, STARTDIR))
+            plan.append({'dir': 'out', 'src': fname, 'dst': STARTDIR,
+                         'mode': 'copy', 'size': None, 'mtime': None,
+                         'skip': False, 'zip': False})
+    return plan
+
+
+def render_staging(plan: typing.List[typing.Dict[str, typing.Any]],
+                   direction: str,
+                   max_transfers: int = 1) -> str:
+    """Generates the shell commands for the transfers.
+
+    The transfers are run by `/bin/sh`, independently of the shell of the
+    job, by waves of at most `max_transfers` concurrent copies.
+    Failed transfers are reported in the output of the job.  If a file
+    cannot be copied back, the marker `STAGE_FAILED` is created in the
+    scratch directory, which is then kept.
+
+    Parameters
+    ----------
+    plan : list
+        Transfers (see `plan_staging`).
+    direction : str
+        Direction of the transfers to render: "in" or "out".
+    max_transfers : int, optional
+        Maximum number of concurrent transfers.
+
+    Returns
+    -------
+    str
+        Shell commands.
+    """
+    items = [item for item in plan if item['dir'] == direction]
+    if not items:
+        return ''
+    cmds = []
+    for item in items:
+        if item['zip']:
+            # Compressed storage, handled by the functions of STAGE_ZIP_FUNCS
+            if direction == 'in':
+                cmd = 'gxx_get {} {:d}'.format(item['src'],
+                                               item['mode'] == 'link')
+            else:
+                cmd = 'gxx_put {} {} {:d}'.format(item['src'], item['dst'],
+                                                  item['skip'])
+        elif direction == 'in':
+            # Timestamps are preserved to detect unchanged files at the end
+            copy = STAGE_COPY.format(src=item['src'], dst=item['dst'])
+            if item['mode'] == 'link':
+                cmd = 'ln -f {} {} || {}'.format(item['src'], item['dst'],
+                                                 copy)
+            else:
+                cmd = copy
+        else:
+            # Files not produced by the calculation are ignored
+            cond = 'test -f {}'.format(item['src'])
+            if item['skip']:
+                # Only copied back if modified by the calculation or missing
+                dst = os.path.join(item['dst'], os.path.basename(item['src']))
+                cond += ' && {{ test ! -f {1} || test {0} -nt {1}; }}'.format(
+                    item['src'], dst)
+            cmd = 'if {}; then {}; fi'.format(
+                cond, STAGE_COPY.format(src=item['src'], dst=item['dst']))
+        cmds.append((item['src'], cmd))
+    label = 'GXX_STAGE_{}_{}'.format(jobPID, direction.upper())
+    text = "/bin/sh << '{}'\n".format(label)
+    if any(item['zip'] for item in items):
+        text += STAGE_ZIP_FUNCS
+    text += 'nerr=0\n'
+    fmt_err = 'wait $p{} || {{ echo \'ERROR: Transfer failed: {}\'; ' \
+        + 'nerr=`expr $nerr + 1`; }}\n'
+    step = max(max_transfers, 1)
+    for first in range(0, len(cmds), step):
+        wave = cmds[first:first+step]
+        for index, (_, cmd) in enumerate(wave):
+            text += '({}) > /dev/null 2>&1 &\np{}=$!\n'.format(cmd, index)
+        for index, (src, _) in enumerate(wave):
+            text += fmt_err.format(index, src)
+    if direction == 'out':
+        text += 'test $nerr -eq 0 || touch {}\n'.format(STAGE_FAILED)
+    text += '{}\n'.format(label)
+    return text
+
+
+def render_chksync(plan: typing.List[typing.Dict[str, typing.Any]],
+                   interval: int,
+                   quiet: int = CHKSYNC_QUIET) -> typing.Tuple[str, str]:
+    """Generates the shell commands for the periodic checkpoint copies.
+
+    A background process, run with a low priority, copies every
+    `interval` minutes the checkpoint files to copy back which were
+    modified since the last copy and not in the last `quiet` seconds.
+    The copies are done in a temporary file renamed at the end, so the
+    stored file is never partially written.
+
+    Parameters
+    ----------
+    plan : list
+        Transfers (see `plan_staging`).
+    interval : int
+        Interval between synchronizations (in minutes).
+    quiet : int, optional
+        Minimum time without modification (in seconds).
+
+    Returns
+    -------
+    tuple
+        Commands to start the synchronization before running Gaussian,
+        and to stop it before the final copy-back.
+    """
+    items = [item for item in plan
+             if item['dir'] == 'out' and item['src'].lower().endswith('.chk')]
+    if not items:
+        return '', ''
+    label = 'GXX_SYNC_{}'.format(jobPID)
+    start = "cat > GXX_SYNC.sh << '{}'\n".format(label)
+    if any(item['zip'] for item in items):
+        start += STAGE_ZIP_FUNCS
+    start += 'echo $$ > GXX_SYNC.pid\nelapsed=0\n' \
+        + 'while test ! -f GXX_SYNC.stop; do\n' \
+        + '    sleep 10\n    elapsed=`expr $elapsed + 10`\n' \
+        + '    test $elapsed -lt {} && continue\n'.format(interval*60) \
+        + '    elapsed=0\n' \
+        + "    touch -d '-{} seconds' GXX_SYNC.ref\n".format(quiet)
+    for item in items:
+        src = item['src']
+        if item['zip']:
+            copy = 'gxx_put {} {} 1'.format(src, item['dst'])
+        else:
+            dst = os.path.join(item['dst'], os.path.basename(src))
+            tmp = os.path.join(item['dst'],
+                               '.{}.sync'.format(os.path.basename(src)))
+            copy = '{{ test ! -f {dst} || test {src} -nt {dst}; }} && ' \
+                '{{ cp -p {src} {tmp} && mv -f {tmp} {dst}; }}'.format(
+                    src=src, dst=dst, tmp=tmp)
+        start += '    if test -f {0} && test ! {0} -nt GXX_SYNC.ref; ' \
+            'then\n        {1}\n    fi\n'.format(src, copy)
+    start += 'done\n{}\n'.format(label)
+    # Detached to not be waited for by parallel multi-jobs
+    start += '(nice -n 19 /bin/sh GXX_SYNC.sh >& /dev/null &)\n'
+    # The last copy in progress is completed before stopping
+    stop = 'touch GXX_SYNC.stop\n' \
+        + "/bin/sh -c 'while kill -0 `cat GXX_SYNC.pid` 2> /dev/null; " \
+        + "do sleep 1; done'\n"
+    return start, stop
+
+
+def split_rwf(disks: typing.List[typing.Tuple[str, int]],
+              share: float
+              ) -> typing.Tuple[str, typing.List[typing.Tuple[
+                  str, typing.Optional[int]]]]:
+    """Builds a read-write file specification split over several disks.
+
+    Gaussian fills the files in order, so each disk but the last one is
+    limited to the share of its capacity corresponding to the job, the
+    last one taking the rest.
+
+    Parameters
+    ----------
+    disks : list
+        Scratch disks, as (path, size in bytes) tuples.
+    share : float
+        Fraction of the node used by the job.
+
+    Returns
+    -------
+    tuple
+        The following information are returned:
+        - %RWF specification
+        - directories to create for the job, with the maximum size of the
+          file they contain (in bytes, None for no limit)
+    """
+    dirs = []
+    spec = []
+    for index, (path, size) in enumerate(disks):
+        dname = os.path.join(path.format(username=USERNAME),
+                             'gaurun'+jobPID)
+        if index == len(disks) - 1:
+            dirs.append((dname, None))
+            spec.append('{}/,-1'.format(dname))
+        else:
+            limit = max(int(size*share/1000**2), 1)
+            dirs.append((dname, limit*1000**2))
+            spec.append('{}/,{}MB'.format(dname, limit))
+    return ','.join(spec), dirs
+
+
+def render_preflight(needs: typing.List[typing.Tuple[str, int]],
+                     fatal: bool = False) -> str:
+    """Generates the shell commands checking the free space.
+
+    A warning is printed if a directory does not have enough free space.
+    If the check is fatal, the marker `GXX_SPACE.failed` is also created,
+    so that the job can stop before running Gaussian.
+
+    Parameters
+    ----------
+    needs : list
+        Directories and space needed (in bytes), as tuples.
+    fatal : bool, optional
+        The lack of space is an error.
+
+    Returns
+    -------
+    str
+        Shell commands.
+    """
+    label = 'GXX_SPACE_{}'.format(jobPID)
+    text = "/bin/sh << '{}'\n".format(label)
+    text += 'for item in {}; do\n'.format(' '.join(
+        '{}:{}'.format(dname, ceil(size/1024)) for dname, size in needs))
+    text += """\
+    dir=${item%:*}
+    need=${item##*:}
+    free=`df -Pk $dir | awk 'NR == 2 {print $4}'`
+    if test "$free" -lt $need; then
+"""
+    text += '        echo "{}: Not enough space in $dir: $free kB free, ' \
+        '$need kB needed."\n'.format(fatal and 'ERROR' or 'WARNING')
+    if fatal:
+        text += '        touch GXX_SPACE.failed\n'
+    text += """\
+    fi
+done
+"""
+    text += '{}\n'.format(label)
+    return text
+
+
+def staging_report(plan: typing.List[typing.Dict[str, typing.Any]]) -> str:
+    """Summarizes the data to transfer.
+
+    Parameters
+    ----------
+    plan : list
+        Transfers (see `plan_staging`).
+
+    Returns
+    -------
+    str
+        Summary of the transfers.
+    """
+    lines = []
+    for direction, label in (('in', 'Stage-in'), ('out', 'Copy-back')):
+        items = [item for item in plan if item['dir'] == direction]
+        if not items:
+            continue
+        size = sum(item['size'] or 0 for item in items
+                   if item['mode'] != 'link')
+        num_link = len([item for item in items if item['mode'] == 'link'])
+        num_skip = len([item for item in items if item['skip']])
+        num_zip = len([item for item in items if item['zip']])
+        fmt = '{}: {} file(s), {} to copy'
+        line = fmt.format(label, len(items),
+                          hpc.bytes_units(size, 1, False))
+        if direction == 'out':
+            line += ' (current size)'
+        if num_link:
+            line += ', {} hard-linked'.format(num_link)
+        if num_skip:
+            line += ', {} skipped if unchanged'.format(num_skip)
+        if num_zip:
+            line += ', {} compressed'.format(num_zip)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+# ===========================
+#   PILOT-RELATED FUNCTIONS
+# ===========================
+def pilot_spool(qname: str) -> str:
+    """Returns the spool of the tasks run by pilot jobs on a queue."""
+    return os.path.join(PILOT_SPOOL, qname)
+
+
+def render_pilot(spool: str,
+                 slots: int,
+                 budget: typing.Optional[float] = None) -> str:
+    """Builds the commands of a pilot job.
+
+    The pilot runs `slots` loops concurrently, each one claiming the
+    next task of the spool and running it, until no task is left.
+    With a wall time budget, a task is only started if its estimated
+    wall time fits in the remaining time, minus `PILOT_MARGIN`.
+
+    Parameters
+    ----------
+    spool : str
+        Spool directory of the tasks.
+    slots : int
+        Number of tasks run concurrently.
+    budget : float, optional
+        Wall time budget of the pilot (in h).
+
+    Returns
+    -------
+    str
+        Shell commands (bash).
+    """
+    if budget:
+        check = PILOT_CHECK.format(spool=spool, margin=PILOT_MARGIN,
+                                   budget=int(budget*3600))
+    else:
+        check = ''
+    cmds = 'GXX_START=`date +%s`\n'
+    cmds += 'mkdir -p {}\n'.format(' '.join(
+        os.path.join(spool, dname) for dname in PILOT_DIRS))
+    cmds += PILOT_SLOT.format(spool=spool, check=check)
+    cmds += 'for slot in `seq 1 {}`; do\n'.format(slots)
+    cmds += '    gxx_slot $slot &\ndone\nwait\n'
+    cmds += 'echo "Tasks left in the queue: `ls {} | wc -l`"\n'.format(
+        os.path.join(spool, 'queue'))
+    return cmds
+
+
+# ================================
+#   SUBMISSION-RELATED FUNCTIONS
+# ================================
+def build_job(opts: argparse.Namespace,
+              ctx: typing.Optional[ClusterContext] = None
+              ) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    """Builds a Gaussian job.
+
+    Resolves the Gaussian version and the queue, analyses the input
+    file(s) and builds the PBS script, without submitting it.
+
+    Parameters
+    ----------
+    opts : argparse.Namespace
+        Options, as returned by the parser.
+    ctx : ClusterContext, optional
+        Cluster configuration.
+
+    Returns
+    -------
+    dict or None
+        Job, None if no job is to be submitted (`--nojob`):
+        - name: job name
+        - queue: PBS queue
+        - nprocs: number of processors (per node)
+        - mem: memory (per node)
+        - nodes: number of nodes
+        - gpus: number of GPUs
+        - inputs: input files
+        - tmpdir: scratch directory
+        - qsub: qsub command
+        - script: PBS script
+        - env: environment variables passed to the job
+    """
+    if ctx is None:
+        ctx = CONTEXT
     # Gaussian Version
     # ^^^^^^^^^^^^^^^^
     gxxroot = None
     gxxwork = None
-    if opts.gxxver in GXX_ALIAS:
-        gver = GXX_ALIAS[opts.gxxver]
+    if opts.gxxver in ctx.gxx_alias:
+        gver = ctx.gxx_alias[opts.gxxver]
     else:
         gver = opts.gxxver
-    if gver in WORKINGS:
-        WrkInfo = WORKINGS[gver]
-        GxxInfo = GVERSIONS[WrkInfo['gref']]
-    elif gver in GVERSIONS:
+    if gver in ctx.workings:
+        WrkInfo = ctx.workings[gver]
+        GxxInfo = ctx.gversions[WrkInfo['gref']]
+    elif gver in ctx.gversions:
         WrkInfo = None
-        GxxInfo = GVERSIONS[gver]
+        GxxInfo = ctx.gversions[gver]
     else:
         WrkInfo = None
         GxxInfo = None
@@ -1135,7 +3627,8 @@ List of available HPC Nodes
     # Queue data
     # ^^^^^^^^^^
     try:
-        qname, qnode, nprocs, nodeid = get_queue_data(opts.queue)
+        qname, qnode, nprocs, nodeid, nnodes, ngpus = get_queue_data(
+            opts.queue, ctx)
     except KeyError:
         print('ERROR: Unsupported queue')
         sys.exit(2)
@@ -1157,6 +3650,49 @@ List of available HPC Nodes
             sys.exit(2)
         else:
             nodeid = opts.node
+    # Same check for the number of nodes
+    if opts.nodes is not None:
+        if nnodes != 1 and nnodes != opts.nodes:
+            msg = 'ERROR: Different numbers of nodes selected through ' \
+                + 'virtual queue and option'
+            print(msg)
+            sys.exit(2)
+        elif opts.nodes < 1 or opts.nodes > len(qnode):
+            print('ERROR: Unsupported number of nodes')
+            sys.exit(2)
+        nnodes = opts.nodes
+    if nnodes > 1:
+        if nodeid is not None:
+            print('ERROR: A specific node cannot be used with several nodes')
+            sys.exit(2)
+        if multi_gjf and opts.multi == 'parallel':
+            print('ERROR: Parallel multi-jobs cannot run on several nodes')
+            sys.exit(2)
+    # Same check for the GPUs
+    if opts.gpus is not None:
+        value = opts.gpus
+        if ngpus and ngpus != value:
+            msg = 'ERROR: Different numbers of GPUs selected through ' \
+                + 'virtual queue and option'
+            print(msg)
+            sys.exit(2)
+        elif qnode.ngpus == 0:
+            print('ERROR: No GPU available on the chosen queue')
+            sys.exit(2)
+        elif value < 1 or value > qnode.ngpus:
+            print('ERROR: Unsupported number of GPUs')
+            sys.exit(2)
+        ngpus = value
+    if ngpus:
+        if nnodes > 1:
+            print('ERROR: GPUs cannot be used on several nodes')
+            sys.exit(2)
+        if multi_gjf and opts.multi == 'parallel':
+            print('ERROR: GPUs cannot be shared by parallel multi-jobs')
+            sys.exit(2)
+        if qnode.gpu_maker is not None \
+                and qnode.gpu_maker.lower() != 'nvidia':
+            print('WARNING: Gaussian only supports NVIDIA GPUs.')
     # Check if only some groups authorized to run on node family
     if qnode.user_groups is not None:
         if opts.group is not None:
@@ -1191,14 +3727,30 @@ List of available HPC Nodes
         else:
             gxxroot = os.path.join(GxxInfo['path'], GxxInfo['gdir'])
     gxx = os.path.split(gxxroot)[1]
+    # The manifest, if present, lets us catch broken installations before
+    #   submitting without accessing the (network) file system.
+    manifest = ctx.manifest
+    if tree_status(gxxroot, manifest) is False:
+        fmt = 'ERROR: Gaussian installation "{}" is broken (see manifest).'
+        print(fmt.format(gxxroot))
+        sys.exit(2)
     # Gaussian working definition
     # ^^^^^^^^^^^^^^^^^^^^^^^^^^^
     gxx_works = []
     if gxxwork:
-        gxx_works.append(gxxwork)
+        status = tree_status(gxxwork, manifest)
+        if status is False:
+            fmt = 'ERROR: Working tree "{}" is broken (see manifest).'
+            print(fmt.format(gxxwork))
+            sys.exit(2)
+        elif status or os.path.exists(gxxwork):
+            gxx_works.append(gxxwork)
     if opts.gxxwrk:
         for workdir in opts.gxxwrk:
-            if os.path.exists(workdir):
+            status = tree_status(workdir, manifest)
+            if status is None:
+                status = os.path.exists(workdir)
+            if status:
                 gxx_works.append(workdir)
             else:
                 fmt = 'ERROR: working tree directory "{}" does not exits'
@@ -1254,6 +3806,17 @@ List of available HPC Nodes
         grwf_files = None
     else:
         grwf_files = False
+    # Read-write file split over the local disks of the node, unless the
+    #   user chose the files or the scratch directory.
+    rwf_dirs = []
+    if len(qnode.scratch_disks) > 1 and grwf_files is False \
+            and opts.tmpdir is None and not opts.expert:
+        if nprocs:
+            share = min(nprocs/qnode.nprocs(all=USE_LOGICAL_CORE), 1)
+        else:
+            share = 1/len(qnode.scratch_disks)
+        rwf_spec, rwf_dirs = split_rwf(qnode.scratch_disks, share)
+        grwf_files = [rwf_spec]*num_infiles
     # Job name
     # ^^^^^^^^
     if opts.job:
@@ -1283,7 +3846,7 @@ List of available HPC Nodes
     # Define NProcs and Mem
     if set(['p', 'proc', 'a', 'all']) & set(opts.gxxl0K):
         nprocs = None
-    elif multi_gjf and opts.multi == 'parallel':
+    elif multi_gjf and opts.multi == 'parallel' and not opts.packing:
         nprocs = nprocs//num_infiles
         if nprocs == 0:
             msg = 'ERROR: Too many parallel jobs for the number of ' \
@@ -1307,14 +3870,25 @@ List of available HPC Nodes
         mem = hpc.bytes_units(mem_byte, 0, False, 'g')
         if mem.startswith('0'):
             mem = hpc.bytes_units(mem_byte, 0, False, 'm')
+    # Scratch storage given by the user, only used to check the free space
+    scratch = 0
+    if opts.scratch:
+        try:
+            scratch = hpc.convert_storage(opts.scratch)
+        except ValueError:
+            print('ERROR: Unsupported scratch size "{}"'.format(opts.scratch))
+            sys.exit(2)
     # Check input and build list of relevant data
     # ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # The input files are only analysed once all the tasks are known, to
+    #   possibly run the analyses in parallel.
     rootdirs = []
     gjf_files = []
-    ops_copy = []
+    gjf_texts = []
+    tasks = []
+    steps = []
     full_P, full_M = 0, 0
     for index, infile in enumerate(opts.infile):
-        outfile = glog_files[index]
         filebase = filebases[index]
         if gchk_files:
             chkfile = gchk_files[index]
@@ -1328,23 +3902,115 @@ List of available HPC Nodes
         rootdir = os.path.abspath(reldir)
         # A new, temporary input is created
         gjf_new = '{}_{}.gjf'.format(filebase, jobPID)
-        # The script works in the directory where the input file is stored
-        os.chdir(rootdir)
-        if not opts.expert:
-            dat_P, dat_M, data = check_gjf(ginfile, gjf_new, nprocs, mem,
-                                           chkfile, rwffile, rootdir)
-            if opts.multi == 'parallel':
-                full_P += dat_P
-                full_M += hpc.convert_storage(dat_M)
+        rootdirs.append(rootdir)
+        gjf_files.append(gjf_new)
+        # With --embed, the new input is kept in memory and written in the
+        #   job script, so nothing is written on the shared file system.
+        if opts.embed:
+            gjf_new = None
+        tasks.append((ginfile, gjf_new, nprocs, mem, chkfile, rwffile,
+                      rootdir, opts.produced, None))
+    # Packed inputs: resources chosen by submit_packed (kept parameters
+    #   are not changed).
+    if opts.packing:
+        for index, (task_P, task_M) in enumerate(opts.packing):
+            task = list(tasks[index])
+            if nprocs is not None:
+                task[2] = task_P
+            if mem is not None:
+                task[3] = '{}MB'.format(task_M//1000**2)
+            tasks[index] = tuple(task)
+    # Automatic sizing: the resources estimated from a first analysis
+    #   replace the default ones (kept parameters are not changed).
+    if opts.autosize and not opts.expert and not opts.packing:
+        max_mem = qnode.size_mem
+        if qnode.mem_limits['hard'] is not None:
+            max_mem = min(max_mem, qnode.mem_limits['hard'])
+        max_mem = int(max_mem*MEM_OCCUPATION)
+        pretasks = [task[:2] + (None, None) + task[4:] for task in tasks]
+        for index, result in enumerate(analyse_inputs(pretasks)):
+            res = autosize_input(result[3], result[4], nprocs or 1,
+                                 max_mem, ctx.costmodel)
+            task = list(tasks[index])
+            if nprocs is not None:
+                task[2] = res['nprocs']
+            if mem is not None:
+                task[3] = '{}GB'.format(ceil(res['mem']/1000**3))
+            tasks[index] = tuple(task)
+            fmt = 'NOTE: Estimated for {}: {} cores, {} memory, {} ' \
+                + 'scratch, {:.1f} h wall time'
+            print(fmt.format(opts.infile[index], res['nprocs'],
+                             hpc.bytes_units(res['mem'], 1, False, 'g'),
+                             hpc.bytes_units(res['disk'], 1, False, 'g'),
+                             res['walltime']/3600))
+            if res['disk'] > qnode.size_disk:
+                print('WARNING: Estimated scratch exceeds node storage.')
+    # Processes of parallel multi-jobs pinned to their own cores, with the
+    #   memory local to their socket(s).
+    if (PIN_PARALLEL and multi_gjf and opts.multi == 'parallel'
+            and nprocs is not None and not opts.expert):
+        pinning = pin_cores(qnode, [task[2] for task in tasks])
+        if pinning is None:
+            print('NOTE: Processes cannot be pinned to sockets.')
+        else:
+            for index, (cores, local_mem) in enumerate(pinning):
+                task = list(tasks[index])
+                task[2] = format_cpus(cores)
+                if mem is not None:
+                    local_mem = int(local_mem*MEM_OCCUPATION)
+                    if local_mem < hpc.convert_storage(task[3]):
+                        task[3] = '{}MB'.format(local_mem//1000**2)
+                tasks[index] = tuple(task)
+    # GPUs controlled by cores of the job (%GPUCPU), all cores listed
+    #   explicitly (%CPU)
+    if ngpus:
+        # Without the mapping, the GPUs would be reserved but not used
+        if nprocs is None or opts.expert:
+            print('ERROR: GPUs need the processors to be set by {} '
+                  '(not with "-k p" or "-X")'.format(PROGNAME))
+            sys.exit(2)
+        for index, task in enumerate(tasks):
+            mapping = map_gpus(qnode, task[2], ngpus)
+            if mapping is None:
+                print('ERROR: Not enough physical cores to control the GPUs')
+                sys.exit(2)
+            task = list(task)
+            task[2], task[8] = mapping
+            tasks[index] = tuple(task)
+        fmt = 'NOTE: {} GPU(s){} controlled by cores {}'
+        print(fmt.format(ngpus, qnode.gpu_model and ' ({})'.format(
+            qnode.gpu_model) or '', mapping[1].split('=')[1]))
+    if not opts.expert:
+        results = analyse_inputs(tasks)
+    else:
+        results = []
+    for index, result in enumerate(results):
+        dat_P, dat_M, data, routes, molecules, text, output = result
+        sys.stdout.write(output)
+        if opts.multi == 'parallel':
+            full_P += dat_P
+            full_M += hpc.convert_storage(dat_M)
+        else:
+            if dat_P > full_P:
+                full_P = dat_P
+            val = hpc.convert_storage(dat_M)
+            if val > full_M:
+                full_M = hpc.convert_storage(dat_M)
+        steps.append(data)
+        gjf_texts.append(text)
+    # Checkpoint files created in scratch are not staged in
+    ops_copy, reused = chain_staging(steps, opts.multi != 'parallel')
+    for path in reused:
+        print('NOTE: {} reused from a previous step.'.format(path))
+    if opts.expert:
+        for index, task in enumerate(tasks):
+            if opts.embed:
+                with open(os.path.join(rootdirs[index], task[0]), 'r',
+                          encoding=GJF_ENCODING,
+                          errors='surrogateescape') as fobj:
+                    gjf_texts.append(fobj.read())
             else:
-                if dat_P > full_P:
-                    full_P = dat_P
-                val = hpc.convert_storage(dat_M)
-                if val > full_M:
-                    full_M = hpc.convert_storage(dat_M)
-        ops_copy.extend(data)
-        rootdirs.append(rootdir)
-        gjf_files.append(gjf_new)
+                gjf_texts.append(None)
     if not opts.expert:
         if full_P > qnode.nprocs(all=USE_LOGICAL_CORE):
             print('ERROR: Too many processors required for the chosen queue')
@@ -1353,12 +4019,16 @@ List of available HPC Nodes
               full_P > qnode.cpu_limits['hard']):
             print('ERROR: number of processors exceeds hard limit')
             sys.exit()
+        nprocs = full_P
+        if opts.packing:
+            # Rounded up, to cover the memory of all the packed inputs
+            mem = '{}MB'.format(ceil(full_M/1000**2))
+        else:
+            mem = hpc.bytes_units(full_M, 0, False, 'g')
         if (qnode.mem_limits['hard'] is not None and
-                full_M > qnode.mem_limits['hard']):
+                hpc.convert_storage(mem) > qnode.mem_limits['hard']):
             print('ERROR: Requested memory exceeds hard limit')
             sys.exit()
-        nprocs = full_P
-        mem = hpc.bytes_units(full_M, 0, False, 'g')
     if (qnode.cpu_limits['soft'] is not None and
             nprocs > qnode.cpu_limits['soft']):
         print('NOTE: Number of processors exceeds soft limit.')
@@ -1400,30 +4070,67 @@ echo "----------------------------------------"
     pbs_cmds += '[ ! -d "{}" ] && exit -1\n'.format(tmpdir)
     # Move to temporary directory
     pbs_cmds += 'cd {}\n'.format(tmpdir)
+    if rwf_dirs:
+        pbs_cmds += 'mkdir -p {}\n'.format(
+            ' '.join(dname for dname, _ in rwf_dirs))
     # Move temporary input file(s) to temp dir
+    # Embedded inputs are written from here-documents, whose content is only
+    #   inserted at submission (see EMBED_FORMAT).
     for index, gjf_file in enumerate(gjf_files):
         rootdir = rootdirs[index]
-        pbs_cmds += 'mv {} ./\n'.format(os.path.join(rootdir, gjf_file))
+        if gjf_texts[index] is None:
+            pbs_cmds += 'mv {} ./\n'.format(os.path.join(rootdir, gjf_file))
+        else:
+            pbs_cmds += EMBED_FORMAT.format(gjf=gjf_file, index=index,
+                                            pid=jobPID, text='')
     # Copy files listed in input file(s) or given by user if available
-    fmt = '(cp {} ./) >& /dev/null\n'
-    for cmd, what, where in ops_copy:
-        if (cmd == 'cpto'):
-            if where:
-                pbs_cmds += fmt.format(os.path.join(where, what))
-            else:
-                pbs_cmds += fmt.format(data[1])
-    if opts.cpto:
-        for data in opts.cpto:
-            pbs_cmds += fmt.format(os.path.join(STARTDIR, data))
+    stage_plan = plan_staging(ops_copy, tmpdir, opts.cpto, opts.cpfrom,
+                              opts.compress)
+    max_transfers = qnode.max_transfers or STAGE_TRANSFERS
+    # Check the free space before running Gaussian
+    if SCRATCH_PREFLIGHT:
+        needs = [(tmpdir, sum(item['size'] or 0 for item in stage_plan
+                              if item['dir'] == 'in'))]
+        if rwf_dirs:
+            # Filled in order by Gaussian
+            for dname, limit in rwf_dirs:
+                size = scratch if limit is None else min(scratch, limit)
+                needs.append((dname, size))
+                scratch -= size
+        else:
+            needs[0] = (tmpdir, needs[0][1] + scratch)
+        needs = [item for item in needs if item[1] > 0]
+        if needs:
+            fatal = SCRATCH_PREFLIGHT == 'stop'
+            pbs_cmds += render_preflight(needs, fatal)
+            if fatal:
+                pbs_cmds += '[ -f GXX_SPACE.failed ] && cd .. && rm -rf {} ' \
+                    '&& exit 1\n'.format(' '.join(
+                        [tmpdir] + [dname for dname, _ in rwf_dirs]))
+    pbs_cmds += render_staging(stage_plan, 'in', max_transfers)
+    if stage_plan:
+        print('NOTE: ' + staging_report(stage_plan).replace('\n', '\n      '))
+    # Periodic copy of the checkpoint files
+    if opts.chksync:
+        sync_start, sync_stop = render_chksync(stage_plan, opts.chksync)
+        pbs_cmds += sync_start
+    else:
+        sync_stop = ''
     # Generate Gaussian command(s)
     gxx_args = ''
     if gxx_works:
         fmt = '{0}/l1:{0}/exe-dir:'
         gxx_args += ' -exedir="'
         for rootdir in gxx_works:
-            if os.path.exists(rootdir):
-                gxx_args += fmt.format(rootdir)
+            gxx_args += fmt.format(rootdir)
         gxx_args += '$GAUSS_EXEDIR"'
+    # Linda workers set from the nodes actually allocated, next to the
+    #   processors of each Link1 block, with the same scratch directory on
+    #   their nodes
+    if nnodes > 1:
+        pbs_cmds += LINDA_NODES.format('mkdir -p {}'.format(tmpdir))
+        for gjf_file in gjf_files:
+            pbs_cmds += LINDA_WORKERS.format(gjf_file)
     fmt = '{gexe} {gargs} {gin} {gout}'
     if multi_gjf and opts.multi == 'parallel':
         fmt += ' &'
@@ -1435,21 +4142,20 @@ echo "----------------------------------------"
                                gout=os.path.join(rootdir, log_file))
     if multi_gjf and opts.multi == 'parallel':
         pbs_cmds += 'wait\n'
+    pbs_cmds += sync_stop
     # Copy back relevant file(s)
-    fmt = '(cp {} {}) >& /dev/null\n'
-    for cmd, what, where in ops_copy:
-        if (cmd == 'cpfrom'):
-            if where:
-                pbs_cmds += fmt.format(what, where)
-            else:
-                pbs_cmds += fmt.format(what, DEFAULTDIR)
-    if opts.cpfrom:
-        for data in opts.cpfrom:
-            pbs_cmds += fmt.format(data, STARTDIR)
+    pbs_cmds += render_staging(stage_plan, 'out', max_transfers)
     # TODO (ugly patch) Get any cube which may have been generated
     pbs_cmds += '(cp *.{{cub,cube}} {}) >& /dev/null\n'.format(STARTDIR)
-    # Cleaning
-    pbs_cmds += 'cd .. \nrm -rf {}\n'.format(tmpdir)
+    # Cleaning, unless some files could not be copied back
+    fmt = 'cd .. \n[ -f {0}/{1} ] && echo "ERROR: Scratch directory {0} kept."'
+    fmt += '\n[ -f {0}/{1} ] || rm -rf {0}\n'
+    pbs_cmds += fmt.format(tmpdir, STAGE_FAILED)
+    if rwf_dirs:
+        pbs_cmds += 'rm -rf {}\n'.format(
+            ' '.join(dname for dname, _ in rwf_dirs))
+    if nnodes > 1:
+        pbs_cmds += LINDA_NODES.format('rm -rf {}'.format(tmpdir))
 
     #  SUBMISSION JOB
     # ----------------
@@ -1463,6 +4169,9 @@ echo "----------------------------------------"
     if opts.mail and EMAILSERVER is not None:
         # Flag to send email in case at beginning, end and aborting of job
         fmt = ' -m abe'
+        if opts.subjob:
+            # Emails also sent for each sub-job of an array job
+            fmt += 'j'
         ls_env.append("MAIL")
         # Recipient
         if opts.mailto:  # Full recipient address given
@@ -1474,22 +4183,35 @@ echo "----------------------------------------"
     # Sets the reference project
     if opts.project:
         qsub_cmd += "-P '{}' ".format(opts.project)
+    # Dependencies: the job only starts if the previous ones succeeded
+    if opts.after:
+        qsub_args.append('-W depend=afterok:{}'.format(':'.join(opts.after)))
     # Nodes-related option: fixes the number of nodes to use (nodes=), and the
     #   number of processors per node (ncpus=)
     # Reserve logical cores if present even if only physical cores used.
     ncpus = int(nprocs*qnode.nprocs()/qnode.nprocs(all=USE_LOGICAL_CORE))
     if nodeid is None:
-        fmt = '-l select=1:ncpus={ncpus}:mem={mem}:Qlist={family}'
+        fmt = '-l select={nnodes}:ncpus={ncpus}{gpus}:mem={mem}' \
+            + ':Qlist={family}'
     else:
-        fmt = '-l select=1:host={node}:ncpus={ncpus}'
-    qsub_args.append(fmt.format(ncpus=ncpus, mem=mem, family=qnode.queue_name,
-                                node=nodeid))
+        fmt = '-l select=1:host={node}:ncpus={ncpus}{gpus}'
+    qsub_args.append(fmt.format(
+        nnodes=nnodes, ncpus=ncpus, gpus=ngpus and ':ngpus={}'.format(ngpus)
+        or '', mem=mem, family=qnode.queue_name, node=nodeid))
+    # One chunk per node for the Linda workers
+    if nnodes > 1:
+        qsub_args.append('-l place=scatter')
     # Queue name
     qsub_args.append('-q {queue}'.format(queue=qname))
     # Silent mode: all output redirected to /dev/null
     if (opts.silent):
         qsub_args.append('-o localhost:/dev/null -e localhost:/dev/null')
-    ls_env.extend(set_gxx_env(gxxroot))
+    job_env = {var: os.environ.get(var, '') for var in ls_env}
+    ls_env.extend(set_gxx_env(gxxroot, job_env))
+    # The Linda workers use the same scratch directory on their nodes
+    if nnodes > 1:
+        job_env['GAUSS_SCRDIR'] = tmpdir
+        ls_env.append('GAUSS_SCRDIR')
     # Add for environment variables
     if ls_env:
         qsub_args.append('-v {}'.format(','.join(ls_env)))
@@ -1500,13 +4222,797 @@ echo "----------------------------------------"
         print(qsub_cmd)
         print(pbs_header)
         print(pbs_cmds)
-    if not opts.nojob:
-        pbs_header += 'echo "\n   === LIST OF COMMANDS ===\n"\necho "' \
-                + pbs_cmds.replace('\n', '"\necho "') + '"\n'
-        process = Popen(args=qsub_cmd, shell=True, stdin=PIPE, stdout=PIPE)
-        result = (pbs_header+pbs_cmds).encode()
-        output, _ = process.communicate(result)
-        fmt = 'QSub submission job: "{}"'
-        print(fmt.format(output.decode().strip()))
+    if opts.nojob:
+        return None
+    # The commands are listed verbatim (no expansion) through a here-doc
+    fmt = 'echo "\n   === LIST OF COMMANDS ===\n"\n' \
+        + "cat << 'GXX_QSUB_{pid}_LIST'\n{cmds}GXX_QSUB_{pid}_LIST\n"
+    pbs_header += fmt.format(pid=jobPID, cmds=pbs_cmds)
+    for index, text in enumerate(gjf_texts):
+        if text is not None:
+            if not text.endswith('\n'):
+                text += '\n'
+            pbs_cmds = pbs_cmds.replace(
+                EMBED_FORMAT.format(gjf=gjf_files[index], index=index,
+                                    pid=jobPID, text=''),
+                EMBED_FORMAT.format(gjf=gjf_files[index], index=index,
+                                    pid=jobPID, text=text))
+    return {'name': qjobname, 'queue': qname, 'nprocs': nprocs, 'mem': mem,
+            'nodes': nnodes, 'gpus': ngpus, 'inputs': list(opts.infile),
+            'tmpdir': tmpdir, 'qsub': qsub_cmd,
+            'script': pbs_header+pbs_cmds,
+            'env': job_env}
+
+
+def run_qsub(job: typing.Dict[str, typing.Any]) -> str:
+    """Submits a job to PBS.
+
+    The variables passed to the job (`-v`) are taken from the environment
+    of the job, so jobs can be submitted concurrently.
+
+    Parameters
+    ----------
+    job : dict
+        Job, as returned by `build_job`.
+
+    Returns
+    -------
+    str
+        PBS job ID.
+    """
+    env = dict(os.environ)
+    env.update(job.get('env') or {})
+    process = Popen(args=job['qsub'], shell=True, stdin=PIPE, stdout=PIPE,
+                    env=env)
+    # Embedded inputs may contain undecodable bytes, written back as is
+    output, _ = process.communicate(
+        job['script'].encode(GJF_ENCODING, 'surrogateescape'))
+    return output.decode().strip()
+
+
+def submit(opts: argparse.Namespace,
+           ctx: typing.Optional[ClusterContext] = None
+           ) -> typing.Optional[str]:
+    """Submits a Gaussian job.
+
+    Builds the job (see `build_job`) and submits it.
+
+    Parameters
+    ----------
+    opts : argparse.Namespace
+        Options, as returned by the parser.
+    ctx : ClusterContext, optional
+        Cluster configuration.
+
+    Returns
+    -------
+    str or None
+        PBS job ID, None if no job has been submitted.
+    """
+    job = build_job(opts, ctx)
+    if job is None:
+        return None
+    jobid = run_qsub(job)
+    fmt = 'QSub submission job: "{}"'
+    print(fmt.format(jobid))
+    return jobid
+
+
+def submit_many(argvs: typing.List[typing.List[str]],
+                ctx: typing.Optional[ClusterContext] = None,
+                workers: int = QSUB_WORKERS
+                ) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Submits a batch of jobs.
+
+    The jobs are built one after the other, each one from its own
+    command-line arguments, then submitted by a pool of threads.
+    Errors only affect the corresponding job.
+
+    Parameters
+    ----------
+    argvs : list
+        Command-line arguments of each job.
+    ctx : ClusterContext, optional
+        Cluster configuration.
+    workers : int, optional
+        Maximum number of qsub commands run concurrently.
+
+    Returns
+    -------
+    list
+        Result of each job:
+        - argv: command-line arguments
+        - status: exit status (0 if the job was built)
+        - output: messages printed while building the job
+        - job: job (see `build_job`), None if not built
+        - jobid: PBS job ID, None if not submitted
+    """
+    if ctx is None:
+        ctx = CONTEXT
+    parser = build_parser(ctx)
+    mainpid = jobPID
+    results = []
+    try:
+        for index, argv in enumerate(argvs):
+            # Each job needs its own files and scratch directory
+            init_environment('{}-{}'.format(mainpid, index+1))
+            output = io.StringIO()
+            res = {'argv': argv, 'status': 0, 'job': None, 'jobid': None}
+            try:
+                with redirect_stdout(output), redirect_stderr(output):
+                    opts = parser.parse_args(argv)
+                    if (opts.depend or opts.array or opts.pilot is not None
+                            or opts.multi == 'pack'):
+                        print('ERROR: Option not supported in batches.')
+                        sys.exit(2)
+                    res['job'] = build_job(opts, ctx)
+            except SystemExit as err:
+                if isinstance(err.code, str):
+                    output.write(err.code + '\n')
+                    res['status'] = 1
+                else:
+                    res['status'] = err.code or 0
+            res['output'] = output.getvalue()
+            results.append(res)
+    finally:
+        init_environment(mainpid)
+    todo = [res for res in results if res['job'] is not None]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for res, jobid in zip(todo, pool.map(run_qsub,
+                                             [res['job'] for res in todo])):
+            res['jobid'] = jobid
+    return results
+
+
+def build_dependencies(opts: argparse.Namespace
+                       ) -> typing.Tuple[typing.List[int],
+                                         typing.List[typing.Set[int]],
+                                         typing.List[typing.Set[str]]]:
+    """Builds the dependency graph between input files.
+
+    An input depends on another one if it reads a file (checkpoint,
+    read-write file, files used by links 717/718) written by the latter.
+    If several inputs write the same file, they are run in the order
+    given on the command line.
+
+    Parameters
+    ----------
+    opts : argparse.Namespace
+        Options, as returned by the parser.
+
+    Returns
+    -------
+    tuple
+        The following information are returned:
+        - order of submission (indexes of `opts.infile`)
+        - set of parents for each input file
+        - set of files written by each input file
+
+    Raises
+    ------
+    ValueError
+        Circular dependency between input files.
+    """
+    keep_chk = set(['c', 'chk', 'a', 'all']) & set(opts.gxxl0K)
+    keep_rwf = set(['r', 'rwf', 'a', 'all']) & set(opts.gxxl0K)
+    reads = []
+    writes = []
+    for infile in opts.infile:
+        rootdir = os.path.dirname(os.path.abspath(infile))
+        base = os.path.splitext(os.path.basename(infile))[0]
+        # Same definitions as for the submission
+        if keep_chk:
+            file_chk = None
+        else:
+            file_chk = base + '.chk'
+        if opts.gxxrwf and opts.gxxrwf.lower() == 'auto':
+            file_rwf = base + '.rwf'
+        elif keep_rwf:
+            file_rwf = None
+        else:
+            file_rwf = False
+        with open(infile, 'rb') as fobj:
+            with redirect_stdout(io.StringIO()):
+                data = parse_gjf(fobj.read(), io.StringIO(), None, None,
+                                 file_chk, file_rwf)
+        files_r = set()
+        files_w = set()
+        for oper, fname in data['chks']:
+            if oper in (0, 2):
+                files_w.add(fname)
+            if oper in (0, 1):
+                files_r.add(fname)
+        files_w.update(data['rwfs'])
+        files_r.update(data['rwfs'])
+        files_r.update(data['files'])
+        reads.append({os.path.join(rootdir, item) for item in files_r})
+        writes.append({os.path.join(rootdir, item) for item in files_w})
+    num = len(opts.infile)
+    parents = [set() for _ in range(num)]
+    for i in range(num):
+        for j in range(num):
+            if i == j:
+                continue
+            # j reads a file produced by i without producing it itself
+            if writes[i] & (reads[j] - writes[j]):
+                parents[j].add(i)
+            # both produce the same file: command-line order
+            elif i < j and writes[i] & writes[j]:
+                parents[j].add(i)
+    # Topological sort, keeping the command-line order when possible
+    order = []
+    done = set()
+    while len(order) < num:
+        ready = [i for i in range(num)
+                 if i not in done and parents[i] <= done]
+        if not ready:
+            raise ValueError('Circular dependency between input files.')
+        order.append(ready[0])
+        done.add(ready[0])
+    return order, parents, writes
+
+
+def submit_depend(opts: argparse.Namespace,
+                  ctx: typing.Optional[ClusterContext] = None
+                  ) -> typing.Optional[str]:
+    """Submits input files as separate jobs with dependencies.
+
+    Each input file is submitted as its own job, which only starts when
+    the jobs producing the files it needs have successfully ended.
+    Independent inputs can then run concurrently.
+
+    Parameters
+    ----------
+    opts : argparse.Namespace
+        Options, as returned by the parser.
+    ctx : ClusterContext, optional
+        Cluster configuration.
+
+    Returns
+    -------
+    str or None
+        PBS job IDs, separated by colons, None if no job was submitted.
+    """
+    if opts.multi:
+        print('ERROR: Dependencies not compatible with multi-jobs.')
+        sys.exit(2)
+    if opts.job and len(opts.infile) > 1:
+        print('ERROR: Job name not supported with dependencies.')
+        sys.exit(2)
+    for infile in opts.infile:
+        if not os.path.exists(infile):
+            fmt = 'ERROR: Cannot find Gaussian input file "{}"'
+            print(fmt.format(infile))
+            sys.exit()
+    try:
+        order, parents, writes = build_dependencies(opts)
+    except ValueError as err:
+        print('ERROR: {}'.format(err))
+        sys.exit(2)
+    mainpid = jobPID
+    jobids = {}
+    try:
+        for index in order:
+            sub_opts = argparse.Namespace(**vars(opts))
+            sub_opts.infile = [opts.infile[index]]
+            sub_opts.depend = False
+            sub_opts.after = list(opts.after or [])
+            sub_opts.after.extend(jobids[i] for i in sorted(parents[index]))
+            # Files from the parents will be present when the job starts
+            sub_opts.produced = set()
+            for i in parents[index]:
+                sub_opts.produced.update(writes[i])
+            # Each job needs its own files and scratch directory
+            init_environment('{}-{}'.format(mainpid, index))
+            fmt = 'Input file: {}, depends on: {}'
+            print(fmt.format(opts.infile[index], ', '.join(
+                opts.infile[i] for i in sorted(parents[index])) or 'none'))
+            jobid = submit(sub_opts, ctx)
+            if opts.nojob:
+                # Placeholder, no job is submitted
+                jobid = 'job{}'.format(index)
+            elif not jobid:
+                # The jobs depending on it could never start
+                fmt = 'ERROR: Submission of "{}" failed, remaining ' \
+                    + 'inputs not submitted.'
+                print(fmt.format(opts.infile[index]))
+                if jobids:
+                    print('Submitted jobs: {}'.format(', '.join(
+                        jobids[i] for i in order if i in jobids)))
+                sys.exit()
+            jobids[index] = jobid
+    finally:
+        init_environment(mainpid)
+    if opts.nojob:
+        return None
+    return ':'.join(jobids[index] for index in order)
+
+
+def submit_packed(opts: argparse.Namespace,
+                  ctx: typing.Optional[ClusterContext] = None
+                  ) -> typing.Optional[str]:
+    """Submits input files packed on nodes, sized by their cost.
+
+    The input files run in parallel, with processors and memory
+    proportional to their estimated cost (or the weights given by the
+    user).  If they do not fit on a single node, they are split over
+    several submissions.
+
+    Parameters
+    ----------
+    opts : argparse.Namespace
+        Options, as returned by the parser.
+    ctx : ClusterContext, optional
+        Cluster configuration.
+
+    Returns
+    -------
+    str or None
+        PBS job IDs, separated by colons, None if no job was submitted.
+    """
+    if ctx is None:
+        ctx = CONTEXT
+    num_infiles = len(opts.infile)
+    if num_infiles == 0:
+        print('ERROR: Missing Gaussian input file')
+        sys.exit(2)
+    # The resources are set in the inputs, which are not modified in
+    #   expert mode
+    if opts.expert:
+        print('ERROR: Packing not compatible with the expert mode.')
+        sys.exit(2)
+    weights = None
+    if opts.weights:
+        try:
+            weights = [float(item) for item in opts.weights.split(',')]
+        except ValueError:
+            print('ERROR: Weights must be numbers separated by commas.')
+            sys.exit(2)
+        if len(weights) != num_infiles:
+            print('ERROR: Number of weights and input files differ.')
+            sys.exit(2)
+        if min(weights) < 0:
+            print('ERROR: Weights must be positive.')
+            sys.exit(2)
+    for infile in opts.infile:
+        if not os.path.exists(infile):
+            fmt = 'ERROR: Cannot find Gaussian input file "{}"'
+            print(fmt.format(infile))
+            sys.exit()
+    try:
+        _, qnode, max_procs, _, nnodes, ngpus = get_queue_data(opts.queue,
+                                                               ctx)
+    except KeyError:
+        print('ERROR: Unsupported queue')
+        sys.exit(2)
+    except ValueError as err:
+        print('ERROR: Wrong virtual queue specification')
+        print('Reason: {}'.format(err))
+        sys.exit(2)
+    if max(nnodes, opts.nodes or 1) > 1:
+        print('ERROR: Packed inputs cannot run on several nodes')
+        sys.exit(2)
+    if ngpus or opts.gpus is not None:
+        print('ERROR: GPUs cannot be shared by packed inputs')
+        sys.exit(2)
+    # Same memory as a normal submission on the requested processors
+    factor = min(1., max_procs/qnode.nprocs(all=USE_LOGICAL_CORE))
+    if qnode.mem_limits['soft'] is not None:
+        max_mem = qnode.mem_limits['soft']
+    elif qnode.mem_limits['hard'] is not None:
+        max_mem = qnode.mem_limits['hard']
+    else:
+        max_mem = inf
+    max_mem = int(min(qnode.size_mem*factor, max_mem)*MEM_OCCUPATION)
+    tasks = []
+    for infile in opts.infile:
+        reldir, ginfile = os.path.split(infile)
+        tasks.append((ginfile, None, None, None, None, None,
+                      os.path.abspath(reldir), opts.produced))
+    costs, mems = [], []
+    for result in analyse_inputs(tasks):
+        res = autosize_input(result[3], result[4], 1, max_mem,
+                             ctx.costmodel)
+        costs.append(res['cputime'])
+        mems.append(res['mem'])
+    if weights:
+        costs = weights
+    packs = pack_inputs(costs, mems, max_procs, max_mem)
+    mainpid = jobPID
+    jobids = []
+    try:
+        for ipack, pack in enumerate(packs):
+            sub_opts = argparse.Namespace(**vars(opts))
+            sub_opts.infile = [opts.infile[item[0]] for item in pack]
+            sub_opts.packing = [item[1:] for item in pack]
+            sub_opts.multi = 'parallel' if len(pack) > 1 else None
+            sub_opts.weights = None
+            if len(packs) > 1:
+                if opts.job:
+                    sub_opts.job = '{}-{}'.format(opts.job, ipack+1)
+                # Each job needs its own files and scratch directory
+                init_environment('{}-{}'.format(mainpid, ipack))
+                print('Submission {} of {}'.format(ipack+1, len(packs)))
+            for index, task_P, task_M in pack:
+                fmt = 'NOTE: Packed {}: {} cores, {} memory'
+                print(fmt.format(opts.infile[index], task_P,
+                                 hpc.bytes_units(task_M, 1, False, 'g')))
+            jobid = submit(sub_opts, ctx)
+            if jobid:
+                jobids.append(jobid)
+    finally:
+        init_environment(mainpid)
+    if opts.nojob or not jobids:
+        return None
+    return ':'.join(jobids)
+
+
+def submit_array(opts: argparse.Namespace,
+                 ctx: typing.Optional[ClusterContext] = None
+                 ) -> typing.Optional[str]:
+    """Submits input files as a PBS array job.
+
+    The script of each input file is built as for a normal submission,
+    and all of them are gathered in a single script, where each sub-job
+    selects its own from `PBS_ARRAY_INDEX`.  The script is run by bash.
+
+    Parameters
+    ----------
+    opts : argparse.Namespace
+        Options, as returned by the parser.
+    ctx : ClusterContext, optional
+        Cluster configuration.
+
+    Returns
+    -------
+    str or None
+        PBS job ID of the array job, None if no job was submitted.
+    """
+    if opts.multi or opts.depend:
+        print('ERROR: Array jobs not compatible with multi-jobs or '
+              'dependencies.')
+        sys.exit(2)
+    if len(opts.infile) < 2:
+        print('ERROR: Array jobs need at least 2 input files.')
+        sys.exit(2)
+    for infile in opts.infile:
+        if not os.path.exists(infile):
+            fmt = 'ERROR: Cannot find Gaussian input file "{}"'
+            print(fmt.format(infile))
+            sys.exit()
+    mainpid = jobPID
+    parts = []
+    try:
+        for index, infile in enumerate(opts.infile):
+            sub_opts = argparse.Namespace(**vars(opts))
+            sub_opts.infile = [infile]
+            sub_opts.array = False
+            sub_opts.subjob = True
+            # Common job name, so that the qsub commands can be compared
+            sub_opts.job = opts.job or 'array-job'
+            # Each sub-job needs its own files and scratch directory
+            init_environment('{}-{}'.format(mainpid, index+1))
+            parts.append(build_job(sub_opts, ctx))
+    finally:
+        init_environment(mainpid)
+    if opts.nojob:
+        return None
+    if len(set(part['qsub'] for part in parts)) > 1:
+        # Temporary inputs are not used
+        for index, infile in enumerate(opts.infile):
+            base = os.path.splitext(infile)[0]
+            gjf_new = '{}_{}-{}.gjf'.format(base, mainpid, index+1)
+            if os.path.exists(gjf_new):
+                os.remove(gjf_new)
+        print('ERROR: Input files of an array job need the same resources.')
+        sys.exit(2)
+    qsub_cmd = parts[0]['qsub'].rpartition(' - ')[0]
+    qsub_cmd += ' -J 1-{} -S /bin/bash - '.format(len(parts))
+    script = 'case "$PBS_ARRAY_INDEX" in\n'
+    for index, part in enumerate(parts):
+        script += '{})\n{}\n;;\n'.format(index+1, part['script'])
+    script += 'esac\n'
+    jobid = run_qsub({'qsub': qsub_cmd, 'script': script,
+                      'env': parts[0]['env']})
+    fmt = 'QSub submission job: "{}"'
+    print(fmt.format(jobid))
+    return jobid
+
+
+def enqueue_inputs(opts: argparse.Namespace,
+                   ctx: typing.Optional[ClusterContext] = None) -> None:
+    """Adds input files to the task queue of the pilot jobs.
+
+    Each input file is processed as for a normal submission, with the
+    processors and memory of a slot of the pilot (a fraction of the node
+    given by the queue), and its commands are stored in the spool of the
+    queue, with the estimated wall time.
+
+    Parameters
+    ----------
+    opts : argparse.Namespace
+        Options, as returned by the parser.
+    ctx : ClusterContext, optional
+        Cluster configuration.
+    """
+    if ctx is None:
+        ctx = CONTEXT
+    if opts.multi or opts.depend or opts.array:
+        print('ERROR: Pilot tasks not compatible with multi-jobs, '
+              'dependencies or arrays.')
+        sys.exit(2)
+    for infile in opts.infile:
+        if not os.path.exists(infile):
+            fmt = 'ERROR: Cannot find Gaussian input file "{}"'
+            print(fmt.format(infile))
+            sys.exit()
+    try:
+        qname, qnode, nprocs, _, nnodes, ngpus = get_queue_data(opts.queue,
+                                                                ctx)
+    except KeyError:
+        print('ERROR: Unsupported queue')
+        sys.exit(2)
+    except ValueError as err:
+        print('ERROR: Wrong virtual queue specification')
+        print('Reason: {}'.format(err))
+        sys.exit(2)
+    if max(nnodes, opts.nodes or 1) > 1:
+        print('ERROR: Pilot tasks cannot run on several nodes')
+        sys.exit(2)
+    if ngpus or opts.gpus is not None:
+        print('ERROR: GPUs cannot be shared by pilot tasks')
+        sys.exit(2)
+    if opts.pilot < 1 or nprocs//opts.pilot == 0:
+        print('ERROR: Too many pilot slots for the number of processing units')
+        sys.exit(2)
+    slot_procs = nprocs//opts.pilot
+    # Estimated wall times, used by the pilots with a budget
+    walltimes = [None]*len(opts.infile)
+    if not opts.expert:
+        tasks = []
+        for infile in opts.infile:
+            reldir, ginfile = os.path.split(infile)
+            tasks.append((ginfile, None, None, None, None, None,
+                          os.path.abspath(reldir), opts.produced))
+        for index, result in enumerate(analyse_inputs(tasks)):
+            res = autosize_input(result[3], result[4], 1, inf,
+                                 ctx.costmodel)
+            eff = AUTOSIZE_EFFICIENCY if slot_procs > 1 else 1.
+            walltimes[index] = int(res['cputime']/(slot_procs*eff))
+    mainpid = jobPID
+    parts = []
+    try:
+        for index, infile in enumerate(opts.infile):
+            sub_opts = argparse.Namespace(**vars(opts))
+            sub_opts.infile = [infile]
+            sub_opts.queue = '{}:{}'.format(qname, slot_procs)
+            sub_opts.pilot = None
+            sub_opts.mail = False
+            # Each task needs its own files and scratch directory
+            init_environment('{}-{}'.format(mainpid, index+1))
+            parts.append(build_job(sub_opts, ctx))
+    finally:
+        init_environment(mainpid)
+    if opts.nojob:
+        return None
+    spool = pilot_spool(qname)
+    os.makedirs(os.path.join(spool, 'queue'), exist_ok=True)
+    stamp = time.strftime('%Y%m%d%H%M%S')
+    for index, part in enumerate(parts):
+        name = '{}-{}-{:05d}.sh'.format(stamp, mainpid, index+1)
+        lines = ['#!/bin/bash',
+                 '# GXX_INPUT={}'.format(os.path.abspath(opts.infile[index]))]
+        if walltimes[index] is not None:
+            lines.append('# GXX_WALLTIME={}'.format(walltimes[index]))
+        for var in sorted(part['env']):
+            lines.append('export {}={}'.format(var, quote(part['env'][var])))
+        # Hidden while written, so that pilots do not see partial tasks
+        fname = os.path.join(spool, 'queue', '.' + name)
+        with open(fname, 'w', encoding=GJF_ENCODING,
+                  errors='surrogateescape') as fobj:
+            fobj.write('\n'.join(lines) + '\n' + part['script'])
+        os.rename(fname, os.path.join(spool, 'queue', name))
+    fmt = 'NOTE: {} task(s) added to {} ({} cores each)'
+    print(fmt.format(len(parts), spool, slot_procs))
+    return None
+
+
+def submit_pilot(opts: argparse.Namespace,
+                 ctx: typing.Optional[ClusterContext] = None
+                 ) -> typing.Optional[str]:
+    """Submits a pilot job running the tasks of the queue.
+
+    The pilot uses the processors of the queue specification and the
+    corresponding memory, and runs `opts.pilot` tasks at once (see
+    `enqueue_inputs`).
+
+    Parameters
+    ----------
+    opts : argparse.Namespace
+        Options, as returned by the parser.
+    ctx : ClusterContext, optional
+        Cluster configuration.
+
+    Returns
+    -------
+    str or None
+        PBS job ID, None if no job has been submitted.
+    """
+    if ctx is None:
+        ctx = CONTEXT
+    try:
+        qname, qnode, nprocs, nodeid, nnodes, ngpus = get_queue_data(
+            opts.queue, ctx)
+    except KeyError:
+        print('ERROR: Unsupported queue')
+        sys.exit(2)
+    except ValueError as err:
+        print('ERROR: Wrong virtual queue specification')
+        print('Reason: {}'.format(err))
+        sys.exit(2)
+    if max(nnodes, opts.nodes or 1) > 1:
+        print('ERROR: Pilot jobs cannot run on several nodes')
+        sys.exit(2)
+    if ngpus or opts.gpus is not None:
+        print('ERROR: GPUs cannot be shared by pilot tasks')
+        sys.exit(2)
+    if opts.pilot < 1 or nprocs//opts.pilot == 0:
+        print('ERROR: Too many pilot slots for the number of processing units')
+        sys.exit(2)
+    spool = pilot_spool(qname)
+    # Same memory as a normal submission on the requested processors
+    factor = min(1., nprocs/qnode.nprocs(all=USE_LOGICAL_CORE))
+    if qnode.mem_limits['soft'] is not None:
+        def_mem = qnode.mem_limits['soft']
+    elif qnode.mem_limits['hard'] is not None:
+        def_mem = qnode.mem_limits['hard']
+    else:
+        def_mem = inf
+    mem_byte = int(min(qnode.size_mem*factor, def_mem)*MEM_OCCUPATION)
+    pbs_cmds = """
+echo "----------------------------------------"
+echo "PBS queue:     "$PBS_O_QUEUE
+echo "PBS node:      "$HOSTNAME
+echo "PBS jobid:     "$PBS_JOBID
+echo "Pilot spool:   {spool}"
+echo "Pilot slots:   {slots}"
+echo "----------------------------------------"
+""".format(spool=spool, slots=opts.pilot)
+    pbs_cmds += render_pilot(spool, opts.pilot, opts.budget)
+    qsub_cmd = "qsub -r n -N '{}' ".format(opts.job or 'pilot')
+    qsub_args = []
+    if opts.mail and EMAILSERVER is not None:
+        fmt = ' -m abe'
+        if opts.mailto:
+            fmt += ' -M {addr}'
+        else:
+            fmt += ' -M {user}@{server}'
+        qsub_args.append(fmt.format(addr=opts.mailto, user=USERNAME,
+                                    server=EMAILSERVER))
+    if opts.project:
+        qsub_cmd += "-P '{}' ".format(opts.project)
+    if opts.after:
+        qsub_args.append('-W depend=afterok:{}'.format(':'.join(opts.after)))
+    ncpus = int(nprocs*qnode.nprocs()/qnode.nprocs(all=USE_LOGICAL_CORE))
+    if nodeid is None:
+        fmt = '-l select=1:ncpus={ncpus}:mem={mem}:Qlist={family}'
+    else:
+        fmt = '-l select=1:host={node}:ncpus={ncpus}'
+    qsub_args.append(fmt.format(ncpus=ncpus, family=qnode.queue_name,
+                                mem='{}GB'.format(ceil(mem_byte/1000**3)),
+                                node=nodeid))
+    if opts.budget:
+        minutes = int(opts.budget*60)
+        qsub_args.append('-l walltime={}:{:02d}:00'.format(minutes//60,
+                                                           minutes % 60))
+    qsub_args.append('-q {queue}'.format(queue=qname))
+    if (opts.silent):
+        qsub_args.append('-o localhost:/dev/null -e localhost:/dev/null')
+    # Tasks are run by bash
+    qsub_args.append('-S /bin/bash')
+    qsub_cmd += ' '.join(qsub_args) + ' - '
+    if opts.prtinfo:
+        print(qsub_cmd)
+        print(pbs_cmds)
+    if opts.nojob:
+        return None
+    os.makedirs(os.path.join(spool, 'queue'), exist_ok=True)
+    jobid = run_qsub({'qsub': qsub_cmd, 'script': pbs_cmds})
+    fmt = 'QSub submission job: "{}"'
+    print(fmt.format(jobid))
+    return jobid
+
+
+# ================
+#   MAIN PROGRAM
+# ================
+
+
+def main(argv: typing.Optional[typing.List[str]] = None,
+         ctx: typing.Optional[ClusterContext] = None
+         ) -> typing.Optional[str]:
+    """Main submission program.
+
+    Parses the command-line arguments and submits the job(s).
+
+    Parameters
+    ----------
+    argv : list, optional
+        Command-line arguments.  By default, taken from `sys.argv`.
+    ctx : ClusterContext, optional
+        Cluster configuration.
+
+    Returns
+    -------
+    str or None
+        PBS job ID, None if no job has been submitted.
+    """
+    if ctx is None:
+        ctx = CONTEXT
+    #  Option Parsing
+    # ----------------
+    parser = build_parser(ctx)
+    opts = parser.parse_args(argv)
+    # Printing cases
+    # ^^^^^^^^^^^^^^
+    if opts.mach:
+        print("""\
+List of available HPC Nodes
+---------------------------
+""")
+        for family in sorted(ctx.hpcnodes):
+            print(ctx.hpcnodes[family])
+        sys.exit()
+    if opts.calibrate:
+        fname = os.path.join(os.getenv('HOME'), COSTMODELFILE)
+        data = calibrate_costmodel(opts.calibrate)
+        if not data['count']:
+            print('ERROR: No usable job found in the log files.')
+            sys.exit(2)
+        with open(fname, 'w') as fobj:
+            json.dump(data, fobj, indent=1, sort_keys=True)
+        print('Calibration of the cost model written in {}'.format(fname))
+        for key in sorted(data['factors']):
+            fmt = '- {:8s}: factor {:8.3f} ({} jobs)'
+            print(fmt.format(key, data['factors'][key], data['count'][key]))
+        sys.exit()
+    if opts.mkmanifest is not None:
+        fname = opts.mkmanifest or DEFAULT_PATHS['manifest']
+        if fname is None:
+            print('ERROR: No default location for the manifest.')
+            sys.exit(2)
+        manifest = build_manifest(ctx)
+        try:
+            with open(fname, 'w') as fobj:
+                json.dump(manifest, fobj, indent=1, sort_keys=True)
+        except OSError as err:
+            fmt = 'ERROR: Cannot write the manifest in "{}": {}'
+            print(fmt.format(fname, err.strerror))
+            sys.exit(2)
+        broken = sorted(path for path, info in manifest['trees'].items()
+                        if not info['valid'])
+        fmt = 'Manifest of {} trees written in {}'
+        print(fmt.format(len(manifest['trees']), fname))
+        for path in broken:
+            print('WARNING: Broken or missing tree: {}'.format(path))
+        sys.exit()
+    if opts.pilot is not None:
+        if opts.infile:
+            return enqueue_inputs(opts, ctx)
+        return submit_pilot(opts, ctx)
+    if opts.array:
+        return submit_array(opts, ctx)
+    if opts.depend:
+        return submit_depend(opts, ctx)
+    if opts.multi == 'pack':
+        return submit_packed(opts, ctx)
+    if opts.weights:
+        print('ERROR: Weights only supported with "--multi pack".')
+        sys.exit(2)
+    return submit(opts, ctx)
+
+
+if __name__ == '__main__':
+    main()
 
 # vim: ft=python foldmethod=indent
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""Resident submission daemon for gxx_qsub
+
+Keeps the cluster configuration of `gxx_qsub` (node families, queues,
+Gaussian installations and workings) in memory and runs submissions sent
+by thin clients through a Unix domain socket.
+This avoids paying the interpreter start-up, module import and parsing
+of the configuration files for each job, which dominates when submitting
+large campaigns.
+
+The configuration is reloaded automatically when any of the ini files is
+modified.  Submissions are processed one at a time, in the environment
+(variables, working directory, process ID) of the client.
+
+Usage:
+    gxx_qsubd.py start [--detach]
+    gxx_qsubd.py submit [gxx_qsub options] input.gjf
+    gxx_qsubd.py status
+    gxx_qsubd.py stop
+
+If the daemon is not running, `submit` falls back to `gxx_qsub.py`.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import stat
+import struct
+try:
+    import typing
+except ModuleNotFoundError:
+    print('ERROR: Python 3.5 or later needed.')
+    sys.exit()
+
+# ==============
+#   PARAMETERS
+# ==============
+
+# The socket is stored in a directory only accessible by the user, in the
+#   runtime directory of the user if available ($XDG_RUNTIME_DIR).
+# {rundir} refers to the runtime directory (/tmp otherwise), {uid} to the
+#   user ID.
+SOCKET_PATH = os.path.join('{rundir}', 'gxx_qsubd-{uid}', 'gxx_qsubd.sock')
+# Log file for the detached daemon (None: no log)
+LOGFILE = os.path.join(os.getenv('HOME'), '.cache', 'gxx_qsub',
+                       'gxx_qsubd.log')
+# Directory containing the submission script
+GXX_QSUB_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROGNAME = os.path.basename(sys.argv[0])
+USAGE = """\
+Usage: {0} start [--detach]
+       {0} submit [gxx_qsub options] input(s)
+       {0} status
+       {0} stop""".format(PROGNAME)
+
+
+# =================
+#   COMMUNICATION
+# =================
+def socket_path() -> str:
+    """Returns the path to the socket of the current user."""
+    return SOCKET_PATH.format(rundir=os.getenv('XDG_RUNTIME_DIR') or '/tmp',
+                              uid=os.getuid())
+
+
+def check_private(path: str, mode: int = 0o700) -> None:
+    """Checks that a file or directory is private to the user.
+
+    The file must belong to the user, not be a symbolic link, and not be
+    accessible to other users beyond `mode`, so that nobody else can
+    intercept the messages (environment of the client) or answer them.
+
+    Parameters
+    ----------
+    path : str
+        Path to check.
+    mode : int, optional
+        Maximum permissions.
+
+    Raises
+    ------
+    OSError
+        Missing file or file not private to the user.
+    """
+    info = os.lstat(path)
+    if (stat.S_ISLNK(info.st_mode) or info.st_uid != os.getuid()
+            or stat.S_IMODE(info.st_mode) & ~mode):
+        raise PermissionError('{} is not private to the user.'.format(path))
+
+
+def send_msg(sock: socket.socket, data: typing.Dict[str, typing.Any]
+             ) -> None:
+    """Sends a message as length-prefixed JSON.
+
+    Parameters
+    ----------
+    sock : socket
+        Connected socket.
+    data : dict
+        Message to send.
+    """
+    payload = json.dumps(data).encode()
+    sock.sendall(struct.pack('!Q', len(payload)) + payload)
+
+
+def recv_msg(sock: socket.socket) -> typing.Dict[str, typing.Any]:
+    """Receives a length-prefixed JSON message.
+
+    Parameters
+    ----------
+    sock : socket
+        Connected socket.
+
+    Returns
+    -------
+    dict
+        Received message.
+
+    Raises
+    ------
+    ConnectionError
+        Connection closed before the end of the message.
+    """
+    def recv_exactly(size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('Incomplete message.')
+            data += chunk
+        return data
+
+    size = struct.unpack('!Q', recv_exactly(8))[0]
+    return json.loads(recv_exactly(size).decode())
+
+
+def connect(path: typing.Optional[str] = None) -> socket.socket:
+    """Connects to the daemon.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path to the socket.
+
+    Returns
+    -------
+    socket
+        Socket connected to the daemon.
+
+    Raises
+    ------
+    OSError
+        Daemon not running or not reachable.
+    """
+    path = path or socket_path()
+    check_private(os.path.dirname(path))
+    check_private(path, 0o777)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def request(data: typing.Dict[str, typing.Any],
+            path: typing.Optional[str] = None
+            ) -> typing.Dict[str, typing.Any]:
+    """Sends a request to the daemon and returns its answer.
+
+    Parameters
+    ----------
+    data : dict
+        Request.
+    path : str, optional
+        Path to the socket.
+
+    Returns
+    -------
+    dict
+        Answer of the daemon.
+
+    Raises
+    ------
+    OSError
+        Daemon not running or not reachable, or connection lost.
+    """
+    with connect(path) as sock:
+        send_msg(sock, data)
+        return recv_msg(sock)
+
+
+# ==========
+#   DAEMON
+# ==========
+def valid_submission(data: typing.Dict[str, typing.Any]) -> bool:
+    """Checks that a submission request is complete and well-formed.
+
+    Parameters
+    ----------
+    data : dict
+        Submission request.
+
+    Returns
+    -------
+    bool
+        True if the request can be run.
+    """
+    try:
+        return (all(isinstance(arg, str) for arg in data['argv'])
+                and isinstance(data['cwd'], str)
+                and isinstance(data['pid'], int)
+                and all(isinstance(key, str) and isinstance(val, str)
+                        for key, val in data['env'].items()))
+    except (KeyError, TypeError, AttributeError):
+        return False
+
+
+def log(message: str) -> None:
+    """Prints a message with a timestamp."""
+    print('[{}] {}'.format(time.strftime('%Y-%m-%d %H:%M:%S'), message),
+          flush=True)
+
+
+def run_submission(gxx: typing.Any,
+                   ctx: typing.Any,
+                   data: typing.Dict[str, typing.Any]
+                   ) -> typing.Dict[str, typing.Any]:
+    """Runs a submission in the environment of the client.
+
+    Parameters
+    ----------
+    gxx : module
+        `gxx_qsub` module.
+    ctx : ClusterContext
+        Cluster configuration.
+    data : dict
+        Submission request, with the command-line arguments (`argv`),
+        the working directory (`cwd`), the environment variables (`env`)
+        and the process ID (`pid`) of the client.
+
+    Returns
+    -------
+    dict
+        Answer with the exit status (`status`), the output (`output`) and
+        the PBS job ID (`jobid`).
+    """
+    import io
+    import traceback
+    from contextlib import redirect_stdout, redirect_stderr
+    saved_env = dict(os.environ)
+    saved_cwd = os.getcwd()
+    output = io.StringIO()
+    status = 0
+    jobid = None
+    try:
+        os.environ.clear()
+        os.environ.update(data['env'])
+        os.chdir(data['cwd'])
+        gxx.init_environment(data['pid'])
+        with redirect_stdout(output), redirect_stderr(output):
+            try:
+                jobid = gxx.main(data['argv'], ctx)
+            except SystemExit as err:
+                if isinstance(err.code, str):
+                    print(err.code)
+                    status = 1
+                else:
+                    status = err.code or 0
+            except Exception:
+                traceback.print_exc()
+                status = 1
+    except OSError as err:
+        output.write('ERROR: {}\n'.format(err))
+        status = 1
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_env)
+        os.chdir(saved_cwd)
+    return {'status': status, 'output': output.getvalue(), 'jobid': jobid}
+
+
+def serve(path: typing.Optional[str] = None) -> None:
+    """Runs the submission daemon.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path to the socket.
+    """
+    sys.path.insert(0, GXX_QSUB_DIR)
+    import gxx_qsub as gxx
+    gxx.PROGNAME = 'gxx_qsub.py'
+
+    def load_context() -> typing.Tuple[typing.Any, typing.Tuple]:
+        # All the information needed for a submission are loaded upfront
+        ctx = gxx.ClusterContext()
+        ctx.hpcqueues
+        ctx.workings
+        ctx.gxx_alias
+        return ctx, gxx.files_signature(ctx.sources())
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    path = path or socket_path()
+    ctx, signature = load_context()
+    sockdir = os.path.dirname(path)
+    os.makedirs(sockdir, mode=0o700, exist_ok=True)
+    try:
+        check_private(sockdir)
+    except OSError as err:
+        print('ERROR: {}'.format(err))
+        sys.exit(1)
+    # Check if a daemon is already running, otherwise remove stale socket
+    try:
+        request({'cmd': 'status'}, path)
+        print('ERROR: Daemon already running.')
+        sys.exit(1)
+    except OSError:
+        if os.path.exists(path):
+            os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(64)
+    signal.signal(signal.SIGTERM, terminate)
+    log('Daemon started (PID {}), listening on {}'.format(os.getpid(), path))
+    start = time.time()
+    num_jobs = 0
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                # Only the owner of the daemon can submit through it.
+                if hasattr(socket, 'SO_PEERCRED'):
+                    creds = conn.getsockopt(socket.SOL_SOCKET,
+                                            socket.SO_PEERCRED,
+                                            struct.calcsize('3i'))
+                    if struct.unpack('3i', creds)[1] != os.getuid():
+                        log('Connection from another user refused.')
+                        continue
+                try:
+                    data = recv_msg(conn)
+                except (ConnectionError, ValueError):
+                    continue
+                cmd = data.get('cmd') if isinstance(data, dict) else None
+                if cmd == 'submit' and not valid_submission(data):
+                    answer = {'status': 1,
+                              'output': 'Incomplete submission request.\n'}
+                elif cmd == 'submit':
+                    res = gxx.files_signature(ctx.sources())
+                    if res != signature:
+                        log('Configuration files changed. Reloading.')
+                        ctx, signature = load_context()
+                    tstart = time.time()
+                    answer = run_submission(gxx, ctx, data)
+                    num_jobs += 1
+                    log('{} in {}: status {}, job "{}" ({:.3f} s)'.format(
+                        ' '.join(data['argv']), data['cwd'],
+                        answer['status'], answer['jobid'],
+                        time.time() - tstart))
+                elif cmd == 'status':
+                    answer = {'pid': os.getpid(), 'uptime': time.time()-start,
+                              'jobs': num_jobs, 'sources': ctx.sources()}
+                elif cmd == 'stop':
+                    send_msg(conn, {'status': 0})
+                    break
+                else:
+                    answer = {'status': 1, 'output': 'Unknown command.\n'}
+                try:
+                    send_msg(conn, answer)
+                except OSError:
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+        log('Daemon stopped.')
+
+
+def detach(logfile: typing.Optional[str]) -> None:
+    """Detaches the current process from the terminal.
+
+    Parameters
+    ----------
+    logfile : str, optional
+        File where the output is redirected.
+    """
+    if os.fork() > 0:
+        os._exit(0)
+    os.setsid()
+    if os.fork() > 0:
+        os._exit(0)
+    if logfile is not None:
+        os.makedirs(os.path.dirname(logfile), exist_ok=True)
+        fd = os.open(logfile, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    else:
+        fd = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(fd, sys.stdout.fileno())
+    os.dup2(fd, sys.stderr.fileno())
+    null = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null, sys.stdin.fileno())
+
+
+# ================
+#   MAIN PROGRAM
+# ================
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] in ('-h', '--help'):
+        print(USAGE)
+        sys.exit()
+    cmd = sys.argv[1]
+    if cmd == 'submit':
+        data = {'cmd': 'submit', 'argv': sys.argv[2:], 'cwd': os.getcwd(),
+                'env': dict(os.environ), 'pid': os.getpid()}
+        try:
+            sock = connect()
+        except OSError:
+            # No daemon available, run directly the submission script.
+            script = os.path.join(GXX_QSUB_DIR, 'gxx_qsub.py')
+            os.execv(sys.executable, [sys.executable, script] + sys.argv[2:])
+        # Once sent, the job may have been submitted by the daemon, so the
+        #   submission must not be repeated.
+        with sock:
+            try:
+                send_msg(sock, data)
+                answer = recv_msg(sock)
+            except (OSError, ValueError) as err:
+                print('ERROR: Connection to the daemon lost: {}'.format(err))
+                print('The job may have been submitted, check with qstat.')
+                sys.exit(1)
+        sys.stdout.write(answer['output'])
+        sys.exit(answer['status'])
+    elif cmd == 'start':
+        if '--detach' in sys.argv[2:]:
+            detach(LOGFILE)
+        serve()
+    elif cmd == 'status':
+        try:
+            answer = request({'cmd': 'status'})
+        except OSError:
+            print('Daemon not running.')
+            sys.exit(1)
+        print('Daemon running (PID {pid}), up for {uptime:.0f} s'.format(
+            **answer))
+        print('Jobs submitted: {}'.format(answer['jobs']))
+        print('Configuration files: {}'.format(', '.join(answer['sources'])))
+    elif cmd == 'stop':
+        try:
+            request({'cmd': 'stop'})
+        except OSError:
+            print('Daemon not running.')
+            sys.exit(1)
+        print('Daemon stopped.')
+    else:
+        print(USAGE)
+        sys.exit(2)
+
+# vim: ft=python foldmethod=indent
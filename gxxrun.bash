@@ -36,5 +36,7 @@ fi
 
 #  Run Gaussian
 # --------------
-gxx_qsub.py -m -q $queue -g $gxx -j "$job" $mygjf
+# GXX_QSUB can be set to use the resident daemon, e.g.
+#   GXX_QSUB="gxx_qsubd.py submit"
+${GXX_QSUB:-gxx_qsub.py} -m -q $queue -g $gxx -j "$job" $mygjf
 
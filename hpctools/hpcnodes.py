@@ -85,6 +85,10 @@ class NodeFamily(object):
         Hard and Soft limits on the number of processors
     mem_limit : dict, optional
         Hard and Soft limits on the memory
+    max_transfers : int, optional
+        Maximum number of concurrent file transfers per job.
+    scratch_disks : list, optional
+        Local disks available for scratch files, as (path, size) tuples.
     """
     def __init__(self,
                  name: str,
@@ -109,6 +113,9 @@ class NodeFamily(object):
                         typing.Dict[str, typing.Optional[int]]] = None,
                  mem_lim: typing.Optional[
                         typing.Dict[str, typing.Optional[int]]] = None,
+                 max_xfer: typing.Optional[int] = None,
+                 disks: typing.Optional[
+                        typing.List[typing.Tuple[str, int]]] = None,
                  ):
         self.name = name
         # __num_nodes could be connected to a a class variable to count
@@ -132,6 +139,8 @@ class NodeFamily(object):
         self.user_groups = user_grps
         self.cpu_limits = cpu_lim
         self.mem_limits = mem_lim
+        self.max_transfers = max_xfer
+        self.scratch_disks = disks
 
     # ===================================
     #   Decorators to access attributes
@@ -359,6 +368,34 @@ class NodeFamily(object):
                 else:
                     raise KeyError('Unrecognized type of mem limit.')
 
+    @property
+    def max_transfers(self) -> typing.Optional[int]:
+        """int or None: Maximum number of concurrent file transfers."""
+        return self.__max_transfers
+
+    @max_transfers.setter
+    def max_transfers(self, num: typing.Optional[int]) -> None:
+        if num is not None and num < 1:
+            raise ValueError('At least 1 transfer expected!')
+        self.__max_transfers = num
+
+    @property
+    def scratch_disks(self) -> typing.List[typing.Tuple[str, int]]:
+        """list(tuple): Scratch disks, as (path, size in bytes).
+
+        Note
+        ----
+        For paths dependent on username, the format specification
+        `{username}` can be specified.
+        """
+        return self.__scratch_disks
+
+    @scratch_disks.setter
+    def scratch_disks(self,
+                      disks: typing.Optional[
+                          typing.List[typing.Tuple[str, int]]]) -> None:
+        self.__scratch_disks = list(disks or [])
+
     # ===========
     #   Methods
     # ===========
@@ -425,6 +462,16 @@ class NodeFamily(object):
         GPU model: {} (maker: {}, family: {})
 """
                 text += fmt_gpu.format(self.cpu_model, txt_maker, txt_arch)
+        if self.max_transfers is not None:
+            text += """\
+    At most {} concurrent file transfers per job.
+""".format(self.max_transfers)
+        if self.scratch_disks:
+            txt_disks = ', '.join('{} ({})'.format(path, bytes_units(size))
+                                  for path, size in self.scratch_disks)
+            text += """\
+    Scratch disks: {}
+""".format(txt_disks)
         return text
 
 
@@ -711,12 +758,38 @@ def parse_ini(fname: str = PATH_INIFILE) -> typing.List[NodeFamily]:
                         fmt = 'Unsupported definition of the {} CPU limit.'
                         msg = fmt.format(key)
                         raise ValueError(msg)
+            # Concurrent transfers to/from the local storage
+            optname = 'MaxTransfers'
+            if optname in sec_data:
+                try:
+                    max_xfer = sec_data.getint(optname)
+                    if max_xfer < 1:
+                        raise ValueError
+                except ValueError:
+                    msg = 'MaxTransfers should be a positive number.'
+                    raise ValueError(msg)
+            else:
+                max_xfer = None
+            # Scratch disks, as "path:size" separated by commas
+            disks = []
+            value = sec_data.get('ScratchDisks')
+            if value is not None:
+                for item in value.split(','):
+                    path, _, size = item.strip().rpartition(':')
+                    try:
+                        if not path:
+                            raise ValueError
+                        disks.append((path, convert_storage(size)))
+                    except ValueError:
+                        msg = 'Unsupported definition of the scratch disks.'
+                        raise ValueError(msg)
             # Build node object
             nodes_list[name] = \
                 NodeFamily(name, nnodes, nprocs, ncores, size_mem, size_disk,
                            virt_core, cpumodel, cpuarch, cpumaker, ngpus,
                            gpumodel, gpuarch, gpumaker, qname, queues,
-                           path_tmp, user_groups, cpu_lim, mem_lim)
+                           path_tmp, user_groups, cpu_lim, mem_lim,
+                           max_xfer, disks)
 
     return nodes_list
 